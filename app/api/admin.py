@@ -0,0 +1,153 @@
+"""
+Admin API endpoints (answer key corrections, regrades, analytics maintenance)
+"""
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from uuid import UUID
+import hmac
+import logging
+
+from app.config import settings
+from app.database import get_db
+from app.models import Quiz
+from app.schemas.admin import QuestionPatch, RegradeAccepted, AdminJobAccepted
+from app.services.attempt_stats_service import attempt_stats, BACKFILL_JOB, REBUILD_JOB
+from app.services.rollup_service import ROLLUP_JOB
+from app.services.regrade_service import regrade_service
+from app.utils.job_queue import job_queue
+
+
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    """Allow the request only with a valid X-Admin-Key header"""
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not x_admin_key or not hmac.compare_digest(x_admin_key, settings.ADMIN_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+logger = logging.getLogger(__name__)
+
+
+@router.patch(
+    "/quizzes/{quiz_id}/questions/{q_id}",
+    response_model=RegradeAccepted,
+    status_code=202,
+)
+async def patch_question(
+    quiz_id: UUID,
+    q_id: str,
+    patch: QuestionPatch,
+    db: Session = Depends(get_db)
+):
+    """
+    Correct a quiz question and regrade every attempt that answered it
+    
+    - The question is patched in the quiz, in every other quiz of the
+      chapter carrying it (sliced or bank-assembled quizzes, matched by
+      content hash) and in the chapter question bank
+    - A background job regrades completed attempts of every patched quiz in
+      batches; MCQ and numerical answers are recomputed locally, subjective
+      answers are only re-sent to Gemini if the answer key changed
+    - Attempts still pending deferred grading complete against the patched key
+    - Scores, totals, weak topics and feedback of each attempt are updated
+    
+    Track the job at `GET /api/quizzes/jobs/{job_id}` (`progress` shows
+    attempts processed/changed).
+    """
+    if not job_queue.available:
+        raise HTTPException(status_code=503, detail="Job queue unavailable (Redis not connected)")
+
+    quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    try:
+        key_changed, patched = regrade_service.patch_question(
+            db, quiz, q_id, patch.model_dump(exclude_unset=True)
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Question not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job_id = regrade_service.enqueue_regrade(patched, key_changed)
+    logger.info(f"Regrade queued for quiz {quiz_id} question {q_id} ({len(patched)} quizzes): job {job_id}")
+
+    accepted = RegradeAccepted(
+        quiz_id=quiz_id,
+        q_id=q_id,
+        key_version=quiz.key_version,
+        key_changed=key_changed,
+        patched_quizzes=patched,
+        job_id=job_id,
+        status_url=f"/api/quizzes/jobs/{job_id}",
+    )
+    return JSONResponse(status_code=202, content=accepted.model_dump(mode="json"))
+
+
+@router.post("/analytics/backfill", response_model=AdminJobAccepted, status_code=202)
+async def backfill_analytics():
+    """
+    Populate quiz_attempt_items from attempts stored before it existed
+    
+    Runs as a background job in batches; existing rows are kept, so it is
+    safe to run more than once.
+    """
+    if not job_queue.available:
+        raise HTTPException(status_code=503, detail="Job queue unavailable (Redis not connected)")
+
+    job_id = attempt_stats.enqueue_backfill()
+    logger.info(f"Analytics backfill queued: job {job_id}")
+
+    accepted = AdminJobAccepted(
+        job_id=job_id,
+        job_type=BACKFILL_JOB,
+        status_url=f"/api/quizzes/jobs/{job_id}",
+    )
+    return JSONResponse(status_code=202, content=accepted.model_dump(mode="json"))
+
+
+@router.post("/analytics/rebuild", response_model=AdminJobAccepted, status_code=202)
+async def rebuild_analytics():
+    """
+    Rebuild the incrementally maintained stats tables (user_topic_stats,
+    question_stats, chapter_user_sketches) from quiz_attempt_items
+    
+    Submissions arriving during the rebuild wait for it and are applied on
+    top, so nothing is lost or counted twice.
+    """
+    if not job_queue.available:
+        raise HTTPException(status_code=503, detail="Job queue unavailable (Redis not connected)")
+
+    job_id = attempt_stats.enqueue_rebuild()
+    logger.info(f"Analytics rebuild queued: job {job_id}")
+
+    accepted = AdminJobAccepted(
+        job_id=job_id,
+        job_type=REBUILD_JOB,
+        status_url=f"/api/quizzes/jobs/{job_id}",
+    )
+    return JSONResponse(status_code=202, content=accepted.model_dump(mode="json"))
+
+
+@router.post("/analytics/rollup", response_model=AdminJobAccepted, status_code=202)
+async def run_analytics_rollup():
+    """
+    Roll up queued hourly buckets now instead of waiting for the next
+    periodic run (ANALYTICS_ROLLUP_INTERVAL)
+    """
+    if not job_queue.available:
+        raise HTTPException(status_code=503, detail="Job queue unavailable (Redis not connected)")
+
+    job_id = job_queue.enqueue(ROLLUP_JOB, {})
+    logger.info(f"Analytics rollup queued: job {job_id}")
+
+    accepted = AdminJobAccepted(
+        job_id=job_id,
+        job_type=ROLLUP_JOB,
+        status_url=f"/api/quizzes/jobs/{job_id}",
+    )
+    return JSONResponse(status_code=202, content=accepted.model_dump(mode="json"))
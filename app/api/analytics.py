@@ -1,23 +1,63 @@
 """
 Performance analytics API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
+from typing import Optional, Tuple
+from datetime import datetime
 from uuid import UUID
 import logging
 
 from app.database import get_db
 from app.schemas.analytics import UserPerformance, ChapterAnalytics
 from app.services.analytics_service import analytics_service
+from app.utils.analytics_cache import analytics_cache, SCOPE_USER, SCOPE_CHAPTER
 
 router = APIRouter(prefix="/api", tags=["analytics"])
 logger = logging.getLogger(__name__)
 
+# Clients may reuse a response only after revalidating it with If-None-Match
+CACHE_HEADERS = {"Cache-Control": "private, no-cache"}
+
+
+def _etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    if not if_none_match or not etag:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, **CACHE_HEADERS})
+
+
+def _window(
+    start: Optional[datetime],
+    end: Optional[datetime]
+) -> Tuple[Optional[Tuple[datetime, datetime]], str]:
+    """Normalized (start, end) window, or None, plus its cache key/ETag variant"""
+    if not start and not end:
+        return None, ""
+    try:
+        window = analytics_service.window(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return window, f"{window[0]:%Y%m%d%H}-{window[1]:%Y%m%d%H}"
+
+
+def _cached_json(body: dict, etag: Optional[str]) -> JSONResponse:
+    headers = {"ETag": etag, **CACHE_HEADERS} if etag else {}
+    return JSONResponse(content=body, headers=headers)
+
 
 @router.get("/users/{user_id}/performance", response_model=UserPerformance)
 async def get_user_performance(
     user_id: UUID,
-    db: Session = Depends(get_db)
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (ISO 8601)"),
+    to: Optional[datetime] = Query(None, description="Window end, exclusive (default: now)"),
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Get comprehensive performance analytics for a user
@@ -28,14 +68,31 @@ async def get_user_performance(
     - Chapter-wise progress
     - Weak areas identification
     - Personalized recommendations
+    
+    With `from`/`to`, quiz metrics (attempts, average, topic mastery, weak
+    areas) only count attempts in that window, rounded out to whole hours.
+    
+    Responses are cached until the user's next quiz attempt or progress
+    update and carry an ETag; send it back in If-None-Match to get a 304.
     """
     
+    window, variant = _window(from_, to)
+    cache_key = f"{user_id}:{variant}" if variant else user_id
+    
     try:
-        logger.info(f"Fetching performance analytics for user {user_id}")
+        version = analytics_cache.version(SCOPE_USER, user_id)
+        etag = analytics_cache.etag(SCOPE_USER, version, variant)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified(etag)
         
-        performance = analytics_service.get_user_performance(db, user_id)
+        body = analytics_cache.get(SCOPE_USER, cache_key, version)
+        if body is None:
+            logger.info(f"Fetching performance analytics for user {user_id}")
+            performance = analytics_service.get_user_performance(db, user_id, *(window or ()))
+            body = UserPerformance(**performance).model_dump(mode="json")
+            analytics_cache.set(SCOPE_USER, cache_key, version, body)
         
-        return UserPerformance(**performance)
+        return _cached_json(body, etag)
         
     except Exception as e:
         logger.error(f"Failed to fetch user performance: {str(e)}")
@@ -48,7 +105,11 @@ async def get_user_performance(
 @router.get("/chapters/{chapter_id}/analytics", response_model=ChapterAnalytics)
 async def get_chapter_analytics(
     chapter_id: UUID,
-    db: Session = Depends(get_db)
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (ISO 8601)"),
+    to: Optional[datetime] = Query(None, description="Window end, exclusive (default: now)"),
+    approximate: bool = Query(False, description="Estimate unique users (~0.81% standard error)"),
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Get analytics for a specific chapter
@@ -59,17 +120,48 @@ async def get_chapter_analytics(
     - Difficult questions (low avg scores)
     - Common weak topics
     - Completion rate
+    
+    With `from`/`to` (rounded out to whole hours), metrics cover only that
+    window and are merged from pre-aggregated daily and hourly rollups.
+    Rollups trail writes by up to ANALYTICS_ROLLUP_INTERVAL seconds. With
+    or without a window, attempts count once graded: deferred attempts
+    still pending are left out until grading completes.
+    
+    `unique_users` is an exact COUNT(DISTINCT) by default (use it for
+    audits). With `approximate=true` it is estimated from HyperLogLog
+    sketches instead: a relative standard error of ~0.81%
+    (`unique_users_error`), so ~95% of estimates are within 1.6%.
+    
+    Responses are cached until the chapter's next quiz attempt, progress
+    update or rollup and carry an ETag; send it back in If-None-Match to
+    get a 304.
     """
     
+    window, variant = _window(from_, to)
+    if approximate:
+        variant = f"{variant}-approx" if variant else "approx"
+    cache_key = f"{chapter_id}:{variant}" if variant else chapter_id
+    
     try:
-        logger.info(f"Fetching analytics for chapter {chapter_id}")
-        
-        analytics = analytics_service.get_chapter_analytics(db, chapter_id)
+        version = analytics_cache.version(SCOPE_CHAPTER, chapter_id)
+        etag = analytics_cache.etag(SCOPE_CHAPTER, version, variant)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified(etag)
         
-        if analytics is None:
-            raise HTTPException(status_code=404, detail="Chapter not found")
+        body = analytics_cache.get(SCOPE_CHAPTER, cache_key, version)
+        if body is None:
+            logger.info(f"Fetching analytics for chapter {chapter_id}")
+            analytics = analytics_service.get_chapter_analytics(
+                db, chapter_id, *(window or ()), approximate=approximate
+            )
+            
+            if analytics is None:
+                raise HTTPException(status_code=404, detail="Chapter not found")
+            
+            body = ChapterAnalytics(**analytics).model_dump(mode="json")
+            analytics_cache.set(SCOPE_CHAPTER, cache_key, version, body)
         
-        return ChapterAnalytics(**analytics)
+        return _cached_json(body, etag)
         
     except HTTPException:
         raise
@@ -18,6 +18,7 @@ from app.schemas.chapter import (
 from app.services.gemini_service import gemini_service
 from app.services.completion_service import completion_service
 from app.utils.rate_limiter import rate_limiter
+from app.utils.events import event_bus, PROGRESS_UPDATED
 
 router = APIRouter(prefix="/api/chapters", tags=["chapters"])
 logger = logging.getLogger(__name__)
@@ -59,7 +60,7 @@ async def upload_chapter(
         logger.info(f"Uploading chapter PDF: {file.filename}")
         
         # Upload to Gemini and extract topics
-        gemini_file_id, topics = gemini_service.upload_and_index_pdf(
+        gemini_file_id, topics = await gemini_service.upload_and_index_pdf_async(
             temp_path,
             display_name=f"{subject}_{class_level}_{title}"
         )
@@ -148,6 +149,7 @@ async def update_progress(
     user_progress.completion_method = method_used
     
     db.commit()
+    event_bus.publish(PROGRESS_UPDATED, chapter_id=chapter_id, user_id=progress.user_id)
     
     logger.info(
         f"Progress updated: user={progress.user_id}, chapter={chapter_id}, "
@@ -2,39 +2,57 @@
 Quiz generation and submission API endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from uuid import UUID
+import asyncio
 import logging
-from app.database import get_db
+from app.config import settings
+from app.database import get_db, SessionLocal
 from app.models import Chapter, Quiz, QuizAttempt
 from app.schemas.quiz import (
     QuizGenerateRequest,
     QuizResponse,
+    QuizJobAccepted,
+    QuizJobStatus,
     QuizSubmission,
     QuizGradingResponse,
-    QuestionGrading,
+    BulkQuizSubmission,
+    BulkQuizGradingResponse,
 )
-from app.services.gemini_service import gemini_service
-from app.services.grading_service import grading_service
-from app.utils.cache import cache_service    
+from app.services.quiz_service import quiz_service
+from app.services.submission_service import submission_service, SubmissionService
+from app.utils.job_queue import job_queue, JobQueue
+from app.utils.sse import format_sse, SSE_HEADERS
 
 
 router = APIRouter(prefix="/api/quizzes", tags=["quizzes"])
 logger = logging.getLogger(__name__)
 
 
-@router.post("/generate/{chapter_id}", response_model=QuizResponse, status_code=201)
+@router.post(
+    "/generate/{chapter_id}",
+    response_model=QuizResponse,
+    status_code=201,
+    responses={202: {"model": QuizJobAccepted, "description": "Generation queued (async mode)"}},
+)
 async def generate_quiz(
-    chapter_id: UUID, request: QuizGenerateRequest, db: Session = Depends(get_db)
+    chapter_id: UUID,
+    request: QuizGenerateRequest,
+    async_mode: bool = Query(False, description="Queue generation and return a job id (202)"),
+    db: Session = Depends(get_db),
 ):
     """
     Generate a quiz for a chapter using Gemini AI
 
     - Checks cache first (1-hour TTL)
+    - Coalesces concurrent identical requests into one generation
     - Uses Gemini File API for context-aware questions
     - Generates MCQs, short answers, and numerical problems
     - Stores quiz in database
+    - With `async_mode=true`, returns 202 + job id immediately; poll
+      `GET /api/quizzes/jobs/{job_id}` or subscribe to `.../events` (SSE)
     """
 
     # Verify chapter exists
@@ -42,114 +60,141 @@ async def generate_quiz(
     if not chapter:
         raise HTTPException(status_code=404, detail="Chapter not found")
 
-    # Generate cache key and variant hash
-    cache_key = cache_service.generate_cache_key(
-        str(chapter_id),
-        request.difficulty,
-        request.num_mcq,
-        request.num_short,
-        request.num_numerical,
-    )
+    if async_mode:
+        try:
+            job_id = quiz_service.enqueue_generation(chapter_id, request)
+        except RuntimeError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+        accepted = QuizJobAccepted(
+            job_id=job_id,
+            status=JobQueue.STATUS_QUEUED,
+            status_url=f"{router.prefix}/jobs/{job_id}",
+            events_url=f"{router.prefix}/jobs/{job_id}/events",
+        )
+        return JSONResponse(status_code=202, content=accepted.model_dump(mode="json"))
 
-    variant_hash = cache_service.generate_variant_hash(
-        str(chapter_id),
-        request.difficulty,
-        request.num_mcq,
-        request.num_short,
-        request.num_numerical,
-    )
+    try:
+        response_data = await quiz_service.get_or_create_quiz(db, chapter, request)
+        return QuizResponse(**response_data)
 
-    # Check cache first
-    cached_quiz = cache_service.get(cache_key)
-    if cached_quiz:
-        logger.info(f"Returning cached quiz for {cache_key}")
-        return QuizResponse(**cached_quiz)
+    except Exception as e:
+        logger.error(f"Failed to generate quiz: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Failed to generate quiz: {str(e)}"
+        )
 
-    # Check database for existing quiz with same variant
-    existing_quiz = db.query(Quiz).filter(Quiz.variant_hash == variant_hash).first()
 
-    if existing_quiz:
-        logger.info(f"Found existing quiz in database: {existing_quiz.id}")
-        response_data = {
-            "quiz_id": existing_quiz.id,
-            "questions": existing_quiz.questions,
-            "total_questions": len(existing_quiz.questions),
-            "total_points": sum(q.get("points", 1.0) for q in existing_quiz.questions),
-        }
+@router.post("/generate/{chapter_id}/stream")
+async def stream_quiz(
+    chapter_id: UUID, request: QuizGenerateRequest, db: Session = Depends(get_db)
+):
+    """
+    Generate a quiz, streaming questions as Server-Sent Events
 
-        # Cache it
-        cache_service.set(cache_key, response_data)
+    Events:
+    - `question`: one question, as soon as it is complete
+    - `complete`: quiz_id, total_questions, total_points (quiz is stored and cached)
+    - `error`: generation failed
+    """
 
-        return QuizResponse(**response_data)
+    # Verify chapter exists
+    if not db.query(Chapter.id).filter(Chapter.id == chapter_id).first():
+        raise HTTPException(status_code=404, detail="Chapter not found")
 
-    try:
-        # Generate new quiz using Gemini
-        logger.info(f"Generating new quiz for chapter {chapter_id}")
-
-        questions = gemini_service.generate_quiz(
-            gemini_file_id=chapter.gemini_file_id,
-            chapter_title=chapter.title,
-            topics=chapter.topics or [],
-            difficulty=request.difficulty,
-            num_mcq=request.num_mcq,
-            num_short=request.num_short,
-            num_numerical=request.num_numerical,
-        )
+    async def event_stream():
+        # Own session: the request-scoped one is released before streaming starts
+        stream_db = SessionLocal()
+        try:
+            chapter = stream_db.query(Chapter).filter(Chapter.id == chapter_id).first()
+            async for event, data in quiz_service.stream_quiz(stream_db, chapter, request):
+                yield format_sse(event, data)
+        except Exception as e:
+            logger.error(f"Failed to stream quiz: {str(e)}")
+            yield format_sse("error", {"message": f"Failed to generate quiz: {str(e)}"})
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
 
-        # Calculate total points
-        total_points = sum(q.get("points", 1.0) for q in questions)
 
-        # Create quiz record
-        quiz = Quiz(
-            chapter_id=chapter_id,
-            difficulty=request.difficulty,
-            questions=questions,
-            variant_hash=variant_hash,
-        )
+@router.get("/jobs/{job_id}", response_model=QuizJobStatus)
+async def get_generation_job(job_id: UUID):
+    """
+    Get the status of a background quiz generation job
 
-        db.add(quiz)
-        db.commit()
-        db.refresh(quiz)
+    The quiz payload is in `result` once `status` is `completed`.
+    """
+    job = job_queue.get(str(job_id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
 
-        logger.info(f"Quiz created: {quiz.id}")
+    return QuizJobStatus(**job)
 
-        # Prepare response
-        response_data = {
-            "quiz_id": quiz.id,
-            "questions": questions,
-            "total_questions": len(questions),
-            "total_points": total_points,
-        }
 
-        # Cache the response
-        cache_service.set(cache_key, response_data)
+@router.get("/jobs/{job_id}/events")
+async def stream_generation_job(job_id: UUID):
+    """
+    Stream job status changes as Server-Sent Events
 
-        return QuizResponse(**response_data)
+    Emits a `status` event on every change and closes once the job
+    is completed or failed.
+    """
+    if not job_queue.get(str(job_id)):
+        raise HTTPException(status_code=404, detail="Job not found")
 
-    except Exception as e:
-        logger.error(f"Failed to generate quiz: {str(e)}")
-        db.rollback()
-        raise HTTPException(
-            status_code=500, detail=f"Failed to generate quiz: {str(e)}"
-        )
+    async def event_stream():
+        last_status = None
+        while True:
+            job = job_queue.get(str(job_id))
+            if job is None:
+                yield format_sse("error", {"message": "Job expired"})
+                return
+
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield format_sse("status", QuizJobStatus(**job).model_dump(mode="json"))
+
+            if job["status"] in JobQueue.FINAL_STATUSES:
+                return
 
+            await asyncio.sleep(settings.JOB_EVENTS_POLL_INTERVAL)
 
-@router.post("/{quiz_id}/submit", response_model=QuizGradingResponse)
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+@router.post(
+    "/{quiz_id}/submit",
+    response_model=QuizGradingResponse,
+    responses={202: {"model": QuizGradingResponse, "description": "Partial result, grading pending (deferred mode)"}},
+)
 async def submit_quiz(
-    quiz_id: UUID, submission: QuizSubmission, db: Session = Depends(get_db)
+    quiz_id: UUID,
+    submission: QuizSubmission,
+    deferred: bool = Query(False, description="Return objective scores now and grade subjective answers in the background (202)"),
+    db: Session = Depends(get_db),
 ):
     """
     Submit and grade a quiz
 
     Grading strategy:
     - MCQ: Exact match
-    - Short Answer: Gemini semantic grading
-    - Numerical: Tolerance (±2%) + Gemini fallback
+    - Short Answer: Lexical pre-grader + Gemini semantic grading
+    - Numerical: Local numeric engine + Gemini for ambiguous answers
 
     Returns:
     - Total score and breakdown
     - Weak topics identification
     - Personalized feedback
+
+    With `deferred=true`, the attempt is stored immediately with MCQ (and
+    other locally graded) scores; items needing Gemini are marked `pending`
+    and the response is 202. Poll `GET /api/quizzes/attempts/{attempt_id}`
+    or subscribe to `.../events` (SSE) for the final result.
     """
 
     # Verify quiz exists
@@ -166,52 +211,121 @@ async def submit_quiz(
         # Grade the quiz
         logger.info(f"Grading quiz {quiz_id} for user {submission.user_id}")
 
-        total_score, breakdown, weak_topics, feedback = (
-            await grading_service.grade_quiz(
-                questions=quiz.questions,
-                answers=submission.answers,
-                gemini_file_id=chapter.gemini_file_id,
-            )
-        )
+        if deferred and job_queue.available:
+            response_data = await submission_service.submit_deferred(db, quiz, chapter, submission)
+        else:
+            response_data = await submission_service.submit(db, quiz, chapter, submission)
 
-        # Calculate max score
-        max_score = sum(q.get("points", 1.0) for q in quiz.questions)
-        percentage = (total_score / max_score * 100) if max_score > 0 else 0.0
-
-        # Store quiz attempt
-        attempt = QuizAttempt(
-            user_id=submission.user_id,
-            quiz_id=quiz_id,
-            answers=submission.answers,
-            scores=breakdown,
-            total_score=total_score,
-            weak_topics=weak_topics,
-        )
+    except Exception as e:
+        logger.error(f"Failed to grade quiz: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to grade quiz: {str(e)}")
 
-        db.add(attempt)
-        db.commit()
+    if response_data["grading_status"] == SubmissionService.STATUS_PENDING:
+        attempt_id = response_data["attempt_id"]
+        response_data["status_url"] = f"{router.prefix}/attempts/{attempt_id}"
+        response_data["events_url"] = f"{router.prefix}/attempts/{attempt_id}/events"
+        response = QuizGradingResponse(**response_data)
+        return JSONResponse(status_code=202, content=response.model_dump(mode="json"))
+
+    return QuizGradingResponse(**response_data)
 
-        logger.info(
-            f"Quiz attempt saved: {attempt.id}, score: {total_score}/{max_score}"
-        )
 
-        # Format breakdown for response
-        formatted_breakdown = [QuestionGrading(**item) for item in breakdown]
+@router.post("/{quiz_id}/submit/bulk", response_model=BulkQuizGradingResponse)
+async def submit_quiz_bulk(
+    quiz_id: UUID, bulk: BulkQuizSubmission, db: Session = Depends(get_db)
+):
+    """
+    Submit and grade many answer sheets for one quiz (e.g. a whole class)
 
-        # Create score display in "X/Y" format (as per assignment)
-        score_display = f"{total_score:.1f}/{max_score:.1f}"
+    - Quiz and chapter are loaded once
+    - Identical normalized answers to a question are graded once; the
+      unique answers needing Gemini are graded in batch calls
+    - All attempts are stored with a single bulk insert
 
-        return QuizGradingResponse(
-            score=round(total_score, 2),
-            max_score=round(max_score, 2),
-            score_display=score_display,
-            percentage=round(percentage, 2),
-            breakdown=formatted_breakdown,
-            weak_topics=weak_topics,
-            feedback=feedback,
+    Results are returned in submission order.
+    """
+    if len(bulk.submissions) > settings.BULK_SUBMIT_MAX_SUBMISSIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many submissions (max {settings.BULK_SUBMIT_MAX_SUBMISSIONS})",
         )
 
+    # Verify quiz exists
+    quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    # Get chapter for context
+    chapter = db.query(Chapter).filter(Chapter.id == quiz.chapter_id).first()
+    if not chapter:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+
+    try:
+        logger.info(f"Bulk grading quiz {quiz_id}: {len(bulk.submissions)} submissions")
+        results = await submission_service.submit_bulk(db, quiz, chapter, bulk.submissions)
+
     except Exception as e:
-        logger.error(f"Failed to grade quiz: {str(e)}")
+        logger.error(f"Failed to grade bulk submission: {str(e)}")
         db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to grade quiz: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to grade submissions: {str(e)}")
+
+    return BulkQuizGradingResponse(
+        quiz_id=quiz_id,
+        total_submissions=len(results),
+        results=results,
+    )
+
+
+@router.get("/attempts/{attempt_id}", response_model=QuizGradingResponse)
+async def get_attempt(attempt_id: UUID, db: Session = Depends(get_db)):
+    """
+    Get the grading result of a quiz attempt
+
+    `grading_status` is `pending` until deferred grading finishes.
+    """
+    attempt = db.query(QuizAttempt).filter(QuizAttempt.id == attempt_id).first()
+    if not attempt:
+        raise HTTPException(status_code=404, detail="Quiz attempt not found")
+
+    return QuizGradingResponse(**submission_service.attempt_response_data(db, attempt))
+
+
+@router.get("/attempts/{attempt_id}/events")
+async def stream_attempt(attempt_id: UUID, db: Session = Depends(get_db)):
+    """
+    Stream the grading result of a quiz attempt as Server-Sent Events
+
+    Emits a `result` event with the current result, another one when
+    grading status changes, and closes once grading is completed or failed.
+    """
+    if not db.query(QuizAttempt.id).filter(QuizAttempt.id == attempt_id).first():
+        raise HTTPException(status_code=404, detail="Quiz attempt not found")
+
+    async def event_stream():
+        last_status = None
+        while True:
+            # Fresh session per poll so each read sees the worker's commits
+            poll_db = SessionLocal()
+            try:
+                attempt = poll_db.query(QuizAttempt).filter(QuizAttempt.id == attempt_id).first()
+                if attempt is None:
+                    yield format_sse("error", {"message": "Quiz attempt not found"})
+                    return
+
+                status = attempt.grading_status or SubmissionService.STATUS_COMPLETED
+                if status != last_status:
+                    last_status = status
+                    data = submission_service.attempt_response_data(poll_db, attempt)
+                    yield format_sse("result", QuizGradingResponse(**data).model_dump(mode="json"))
+            finally:
+                poll_db.close()
+
+            if status != SubmissionService.STATUS_PENDING:
+                return
+
+            await asyncio.sleep(settings.JOB_EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
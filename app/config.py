@@ -31,6 +31,48 @@ class Settings(BaseSettings):
     DEFAULT_QUIZ_CACHE_TTL: int = 3600  # 1 hour
     MAX_QUIZ_QUESTIONS: int = 20
     MIN_COMPLETION_THRESHOLD: float = 0.75
+    QUIZ_GENERATION_LOCK_TTL: int = 120  # seconds; must exceed a Gemini round trip
+    SINGLE_FLIGHT_POLL_INTERVAL: float = 0.25  # seconds between cross-worker checks
+    SINGLE_FLIGHT_WAIT_TIMEOUT: float = 120.0  # seconds before a waiter generates itself
+    
+    # Gemini
+    GEMINI_MAX_WORKERS: int = 16  # Threads reserved for blocking Gemini SDK calls
+    GEMINI_MAX_CONCURRENT_CALLS: int = 16  # Global cap on in-flight Gemini calls per process
+    GEMINI_FILE_CACHE_TTL: int = 3600  # File handle cache lifetime (seconds)
+    GEMINI_FILE_REFRESH_MARGIN: int = 600  # Refresh this long before File API expiry (seconds)
+    
+    # Grading
+    GRADING_BATCH_ENABLED: bool = True  # Grade all subjective answers in one model call
+    GRADING_BATCH_MAX_ITEMS: int = 25  # Answers per batch call; larger sets are split
+    BULK_SUBMIT_MAX_SUBMISSIONS: int = 500  # Answer sheets per bulk submission request
+    GRADING_MAX_CONCURRENT_CALLS: int = 8  # Grading calls in flight per process (fair-scheduled)
+    GRADING_SCHEDULER_MAX_WAIT: float = 30.0  # Queued calls older than this skip lane priority (seconds)
+    GRADING_CACHE_TTL: int = 30 * 86400  # Memoized model grades in Redis (seconds)
+    GRADING_CACHE_LOCAL_SIZE: int = 10000  # In-process LRU entries
+    GRADING_PLAN_CACHE_SIZE: int = 1000  # Compiled quiz answer keys kept in-process
+    NUMERICAL_REL_TOLERANCE: float = 0.02  # ±2% of the expected value
+    NUMERICAL_ABS_TOLERANCE: float = 1e-9  # Floor for expected values near zero
+    NUMERICAL_MIN_SIG_FIGS: int = 3  # Accept answers correctly rounded to >= this many sig figs
+    NUMERICAL_REVIEW_BAND: float = 0.10  # Relative error below which a miss goes to Gemini
+    LEXICAL_PREGRADE_ENABLED: bool = True  # Score short answers locally before Gemini
+    LEXICAL_ACCEPT_THRESHOLD: float = 0.9  # In-order content-word similarity to auto-accept
+    LEXICAL_REJECT_THRESHOLD: float = 0.05  # Coverage at or below which off-topic answers are auto-rejected
+    
+    # Admin
+    ADMIN_API_KEY: str = ""  # Required in X-Admin-Key for /api/admin; empty disables admin endpoints
+    REGRADE_BATCH_SIZE: int = 200  # Attempts regraded per database batch
+    
+    # Analytics
+    ANALYTICS_BACKFILL_BATCH_SIZE: int = 1000  # Attempts per batch when backfilling analytics tables
+    ANALYTICS_CACHE_TTL: int = 3600  # Cached analytics responses (seconds); writes invalidate them immediately
+    ANALYTICS_ROLLUP_INTERVAL: float = 60.0  # Seconds between incremental rollup runs
+    ANALYTICS_ROLLUP_BATCH_SIZE: int = 200  # Dirty hourly buckets recomputed per transaction
+    
+    # Background Jobs
+    JOB_WORKERS: int = 4  # Concurrent job workers per API process
+    JOB_TTL: int = 86400  # Job status retention (seconds)
+    JOB_STALE_AFTER: int = 600  # Re-queue in-progress jobs untouched this long (seconds)
+    JOB_EVENTS_POLL_INTERVAL: float = 0.5  # SSE status polling interval (seconds)
     
     # Logging
     LOG_LEVEL: str = "INFO"
@@ -6,9 +6,14 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
+# Timestamp columns are naive UTC: pin the session time zone so NOW(),
+# date_trunc() and analytics windows don't shift with the server's TimeZone
+CONNECT_ARGS = {"options": "-c timezone=UTC"}
+
 # Create database engine
 engine = create_engine(
     settings.DATABASE_URL,
+    connect_args=CONNECT_ARGS,
     pool_pre_ping=True,
     pool_size=10,
     max_overflow=20,
@@ -36,6 +36,7 @@ CREATE TABLE IF NOT EXISTS quizzes (
     difficulty VARCHAR(20),
     questions JSONB NOT NULL,
     variant_hash VARCHAR(64),
+    key_version INTEGER DEFAULT 1,
     created_at TIMESTAMP DEFAULT NOW()
 );
 
@@ -48,9 +49,122 @@ CREATE TABLE IF NOT EXISTS quiz_attempts (
     scores JSONB,
     total_score DECIMAL(4,2),
     weak_topics JSONB,
+    feedback TEXT,
+    grading_status VARCHAR(20) DEFAULT 'completed',
     created_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Columns added after the initial schema (deferred grading, answer key patches)
+ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS key_version INTEGER DEFAULT 1;
+ALTER TABLE quiz_attempts ADD COLUMN IF NOT EXISTS feedback TEXT;
+ALTER TABLE quiz_attempts ADD COLUMN IF NOT EXISTS grading_status VARCHAR(20) DEFAULT 'completed';
+
+-- Quiz attempt items: one row per graded question, for analytics GROUP BYs
+CREATE TABLE IF NOT EXISTS quiz_attempt_items (
+    attempt_id UUID REFERENCES quiz_attempts(id) ON DELETE CASCADE,
+    q_id VARCHAR(50) NOT NULL,
+    quiz_id UUID NOT NULL,
+    chapter_id UUID NOT NULL,
+    user_id UUID NOT NULL,
+    topic VARCHAR(255) NOT NULL DEFAULT 'general',
+    score REAL NOT NULL,
+    max_score REAL NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (attempt_id, q_id)
+);
+
+-- User topic stats: running per-user topic mastery, updated with each attempt
+CREATE TABLE IF NOT EXISTS user_topic_stats (
+    user_id UUID NOT NULL,
+    topic VARCHAR(255) NOT NULL,
+    sum_score DOUBLE PRECISION NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    weak_count INTEGER NOT NULL DEFAULT 0,
+    last_attempt_at TIMESTAMP,
+    PRIMARY KEY (user_id, topic)
+);
+
+-- Question stats: running score ratio moments per quiz question
+CREATE TABLE IF NOT EXISTS question_stats (
+    quiz_id UUID NOT NULL,
+    q_id VARCHAR(50) NOT NULL,
+    chapter_id UUID NOT NULL,
+    topic VARCHAR(255) NOT NULL DEFAULT 'general',
+    question_text VARCHAR(200),
+    sum_score DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_sq DOUBLE PRECISION NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    avg_score DOUBLE PRECISION GENERATED ALWAYS AS (sum_score / NULLIF(count, 0)) STORED,
+    PRIMARY KEY (quiz_id, q_id)
+);
+
+-- Chapter analytics rollups: question, topic and chapter totals per hour/day bucket
+CREATE TABLE IF NOT EXISTS chapter_rollups_hourly (
+    chapter_id UUID NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    topic VARCHAR(255) NOT NULL,
+    quiz_id UUID NOT NULL,
+    q_id VARCHAR(50) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    sum_score DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_sq DOUBLE PRECISION NOT NULL DEFAULT 0,
+    weak_count INTEGER NOT NULL DEFAULT 0,
+    user_sketch BYTEA,
+    PRIMARY KEY (chapter_id, bucket, topic, quiz_id, q_id)
+);
+
+CREATE TABLE IF NOT EXISTS chapter_rollups_daily (
+    chapter_id UUID NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    topic VARCHAR(255) NOT NULL,
+    quiz_id UUID NOT NULL,
+    q_id VARCHAR(50) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    sum_score DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_sq DOUBLE PRECISION NOT NULL DEFAULT 0,
+    weak_count INTEGER NOT NULL DEFAULT 0,
+    user_sketch BYTEA,
+    PRIMARY KEY (chapter_id, bucket, topic, quiz_id, q_id)
+);
+
+-- Running HyperLogLog sketch of each chapter's distinct users
+CREATE TABLE IF NOT EXISTS chapter_user_sketches (
+    chapter_id UUID PRIMARY KEY,
+    sketch BYTEA NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Hourly buckets waiting to be rolled up
+CREATE TABLE IF NOT EXISTS analytics_rollup_queue (
+    chapter_id UUID NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    PRIMARY KEY (chapter_id, bucket)
+);
+
+-- Question bank: individual generated questions, reused across quiz variants
+CREATE TABLE IF NOT EXISTS question_bank (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    chapter_id UUID REFERENCES chapters(id) ON DELETE CASCADE,
+    q_type VARCHAR(20) NOT NULL,
+    topic VARCHAR(255),
+    difficulty VARCHAR(20),
+    points REAL DEFAULT 1.0,
+    question JSONB NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    CONSTRAINT uq_question_bank_chapter_difficulty_hash UNIQUE (chapter_id, difficulty, content_hash)
+);
+
+-- Banks created when the key was (chapter_id, content_hash) only
+ALTER TABLE question_bank DROP CONSTRAINT IF EXISTS uq_question_bank_chapter_hash;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_question_bank_chapter_difficulty_hash') THEN
+        ALTER TABLE question_bank ADD CONSTRAINT uq_question_bank_chapter_difficulty_hash
+            UNIQUE (chapter_id, difficulty, content_hash);
+    END IF;
+END $$;
+
 -- Performance Table Indexes 
 CREATE INDEX IF NOT EXISTS idx_user_progress_user ON user_progress(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_progress_chapter ON user_progress(chapter_id);
@@ -58,6 +172,12 @@ CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user ON quiz_attempts(user_id);
 CREATE INDEX IF NOT EXISTS idx_quiz_attempts_quiz ON quiz_attempts(quiz_id);
 CREATE INDEX IF NOT EXISTS idx_quizzes_variant ON quizzes(variant_hash);
 CREATE INDEX IF NOT EXISTS idx_chapters_gemini_file ON chapters(gemini_file_id);
+CREATE INDEX IF NOT EXISTS idx_attempt_items_user_topic ON quiz_attempt_items(user_id, topic);
+CREATE INDEX IF NOT EXISTS idx_attempt_items_chapter_q ON quiz_attempt_items(chapter_id, q_id);
+CREATE INDEX IF NOT EXISTS idx_attempt_items_chapter_topic ON quiz_attempt_items(chapter_id, topic);
+CREATE INDEX IF NOT EXISTS idx_attempt_items_chapter_created ON quiz_attempt_items(chapter_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_question_stats_difficulty ON question_stats(chapter_id, avg_score);
+CREATE INDEX IF NOT EXISTS idx_question_bank_lookup ON question_bank(chapter_id, difficulty, q_type);
 
 -- Function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -10,8 +10,12 @@ import time
 
 from app.config import settings
 from app.database import init_db
-from app.api import chapters, quizzes, analytics
+from app.api import chapters, quizzes, analytics, admin
 from app.utils.rate_limiter import rate_limiter
+from app.services.gemini_service import gemini_service
+from app.services.rollup_service import rollup_service
+from app.utils.job_queue import job_queue
+from app.utils.metrics import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -45,7 +49,7 @@ async def rate_limit_middleware(request: Request, call_next):
     """Apply rate limiting to all requests"""
     
     # Skip rate limiting for health check and docs -- comment out to enable rate limiting on these endpoints
-    if request.url.path in ["/health", "/docs", "/redoc", "/openapi.json"]:
+    if request.url.path in ["/health", "/metrics", "/docs", "/redoc", "/openapi.json"]:
         return await call_next(request)
     
     try:
@@ -130,6 +134,18 @@ async def health_check():
     }
 
 
+# Metrics endpoint
+@app.get("/metrics")
+async def get_metrics():
+    """
+    In-process metrics for this worker
+    
+    Counters (cache hits/misses, model calls), gauges, timing summaries
+    and derived ratios such as cache hit rates
+    """
+    return metrics.snapshot()
+
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -146,6 +162,7 @@ async def root():
 app.include_router(chapters.router)
 app.include_router(quizzes.router)
 app.include_router(analytics.router)
+app.include_router(admin.router)
 
 
 # Startup event
@@ -162,6 +179,12 @@ async def startup_event():
         logger.error(f"Failed to initialize database: {str(e)}")
         raise
     
+    # Start background job workers (quiz generation)
+    await job_queue.start()
+    
+    # Incremental analytics rollups (time-windowed chapter analytics)
+    await rollup_service.start()
+    
     logger.info("Application startup complete")
 
 
@@ -170,6 +193,9 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down application")
+    await rollup_service.stop()
+    await job_queue.stop()
+    gemini_service.shutdown()
 
 
 if __name__ == "__main__":
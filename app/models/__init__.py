@@ -5,5 +5,15 @@ from app.models.chapter import Chapter
 from app.models.user_progress import UserProgress
 from app.models.quiz import Quiz
 from app.models.quiz_attempt import QuizAttempt
+from app.models.quiz_attempt_item import QuizAttemptItem
+from app.models.question_bank import QuestionBankItem
+from app.models.user_topic_stat import UserTopicStat
+from app.models.question_stat import QuestionStat
+from app.models.chapter_rollup import ChapterRollupHourly, ChapterRollupDaily, RollupQueueEntry
+from app.models.chapter_user_sketch import ChapterUserSketch
 
-__all__ = ["Chapter", "UserProgress", "Quiz", "QuizAttempt"]
\ No newline at end of file
+__all__ = [
+    "Chapter", "UserProgress", "Quiz", "QuizAttempt", "QuizAttemptItem", "QuestionBankItem",
+    "UserTopicStat", "QuestionStat", "ChapterRollupHourly", "ChapterRollupDaily", "RollupQueueEntry",
+    "ChapterUserSketch"
+]
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""
+Chapter analytics rollups - pre-aggregated hourly and daily buckets
+"""
+import uuid
+from sqlalchemy import Column, String, Float, Integer, TIMESTAMP, LargeBinary
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+# Dimension values of rows that aggregate over that dimension
+ALL_TOPICS = ""
+ALL_QUESTIONS = ""
+NO_QUIZ = uuid.UUID(int=0)
+
+
+class ChapterRollupColumns:
+    """
+    Columns shared by the hourly and daily rollup tables
+
+    Each (chapter, bucket) holds three kinds of rows, like GROUPING SETS:
+    - question rows (topic, quiz_id, q_id): count = graded answers,
+      sum_score/sum_sq = sums of score ratios
+    - topic rows (topic, NO_QUIZ, ALL_QUESTIONS): count = attempts covering
+      the topic, sum_score/sum_sq = sums of per-attempt topic averages,
+      weak_count = attempts where the topic averaged below 60%
+    - a chapter row (ALL_TOPICS, NO_QUIZ, ALL_QUESTIONS): count = graded
+      attempts, sum_score/sum_sq = sums of total scores, user_sketch = a
+      HyperLogLog sketch of the bucket's users
+
+    Every value is additive (sketches merge by register-wise max), so any
+    window is answered by combining buckets.
+    """
+
+    chapter_id = Column(UUID(as_uuid=True), primary_key=True)
+    bucket = Column(TIMESTAMP, primary_key=True)  # Start of the hour/day
+    topic = Column(String(255), primary_key=True)
+    quiz_id = Column(UUID(as_uuid=True), primary_key=True)
+    q_id = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    sum_score = Column(Float, nullable=False, default=0.0)
+    sum_sq = Column(Float, nullable=False, default=0.0)
+    weak_count = Column(Integer, nullable=False, default=0)
+    user_sketch = Column(LargeBinary)  # Chapter rows only (app.utils.hyperloglog)
+
+
+class ChapterRollupHourly(ChapterRollupColumns, Base):
+    """Hourly chapter rollups, recomputed per dirty (chapter, hour)"""
+    __tablename__ = "chapter_rollups_hourly"
+
+    def __repr__(self):
+        return f"<ChapterRollupHourly(chapter_id={self.chapter_id}, bucket={self.bucket}, q_id={self.q_id})>"
+
+
+class ChapterRollupDaily(ChapterRollupColumns, Base):
+    """Daily chapter rollups, merged from the day's hourly rows"""
+    __tablename__ = "chapter_rollups_daily"
+
+    def __repr__(self):
+        return f"<ChapterRollupDaily(chapter_id={self.chapter_id}, bucket={self.bucket}, q_id={self.q_id})>"
+
+
+class RollupQueueEntry(Base):
+    """
+    Hourly buckets whose attempts changed since they were last rolled up
+
+    Inserted in the same transaction as the attempt items, consumed by the
+    rollup job.
+    """
+    __tablename__ = "analytics_rollup_queue"
+
+    chapter_id = Column(UUID(as_uuid=True), primary_key=True)
+    bucket = Column(TIMESTAMP, primary_key=True)
+
+    def __repr__(self):
+        return f"<RollupQueueEntry(chapter_id={self.chapter_id}, bucket={self.bucket})>"
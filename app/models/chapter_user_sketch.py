@@ -0,0 +1,25 @@
+"""
+ChapterUserSketch model - approximate distinct users per chapter
+"""
+from sqlalchemy import Column, LargeBinary, TIMESTAMP, text
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+
+class ChapterUserSketch(Base):
+    """
+    Chapter user sketches table - HyperLogLog of every user who attempted a chapter
+
+    Merged in the same transaction as the attempt's quiz_attempt_items and
+    only rewritten when a new user actually changes a register, so repeat
+    attempts never touch the row. Users are never removed; regrades do not
+    change who attempted. See app.utils.hyperloglog for the encoding.
+    """
+    __tablename__ = "chapter_user_sketches"
+
+    chapter_id = Column(UUID(as_uuid=True), primary_key=True)
+    sketch = Column(LargeBinary, nullable=False)
+    updated_at = Column(TIMESTAMP, server_default=text("NOW()"))
+
+    def __repr__(self):
+        return f"<ChapterUserSketch(chapter_id={self.chapter_id}, updated_at={self.updated_at})>"
@@ -0,0 +1,42 @@
+"""
+QuestionBankItem model - reusable per-chapter question pool
+"""
+from sqlalchemy import Column, String, Float, TIMESTAMP, ForeignKey, Index, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from app.database import Base
+import uuid
+
+
+class QuestionBankItem(Base):
+    """
+    Question bank table - individual generated questions, deduplicated per chapter and difficulty
+    
+    Quizzes are assembled by sampling from here; Gemini is only called to
+    top up question types that do not have enough entries.
+    """
+    __tablename__ = "question_bank"
+    __table_args__ = (
+        # Per difficulty: the same text banked at "easy" must not block "hard"
+        UniqueConstraint(
+            "chapter_id", "difficulty", "content_hash", name="uq_question_bank_chapter_difficulty_hash"
+        ),
+        Index("idx_question_bank_lookup", "chapter_id", "difficulty", "q_type"),
+    )
+    
+    id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4,
+        server_default=text("gen_random_uuid()")
+    )
+    chapter_id = Column(UUID(as_uuid=True), ForeignKey("chapters.id"), nullable=False)
+    q_type = Column(String(20), nullable=False)  # mcq, short, numerical
+    topic = Column(String(255))
+    difficulty = Column(String(20))
+    points = Column(Float, default=1.0)
+    question = Column(JSONB, nullable=False)  # Full question data (without q_id)
+    content_hash = Column(String(64), nullable=False)
+    created_at = Column(TIMESTAMP, server_default=text("NOW()"))
+    
+    def __repr__(self):
+        return f"<QuestionBankItem(chapter_id={self.chapter_id}, type={self.q_type}, topic={self.topic})>"
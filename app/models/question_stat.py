@@ -0,0 +1,33 @@
+"""
+QuestionStat model - running per-question difficulty statistics
+"""
+from sqlalchemy import Column, String, Float, Integer, Computed, Index
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+
+class QuestionStat(Base):
+    """
+    Question stats table - score ratio moments per (quiz, question)
+
+    Updated in the same transaction as the attempt's quiz_attempt_items.
+    avg_score is a stored generated column, so the hardest questions of a
+    chapter are an index range scan on (chapter_id, avg_score).
+    """
+    __tablename__ = "question_stats"
+    __table_args__ = (
+        Index("idx_question_stats_difficulty", "chapter_id", "avg_score"),
+    )
+
+    quiz_id = Column(UUID(as_uuid=True), primary_key=True)
+    q_id = Column(String(50), primary_key=True)
+    chapter_id = Column(UUID(as_uuid=True), nullable=False)
+    topic = Column(String(255), nullable=False, default="general")
+    question_text = Column(String(200))  # Snippet, refreshed on every update
+    sum_score = Column(Float, nullable=False, default=0.0)  # Sum of score ratios
+    sum_sq = Column(Float, nullable=False, default=0.0)  # Sum of squared score ratios
+    count = Column(Integer, nullable=False, default=0)
+    avg_score = Column(Float, Computed("sum_score / NULLIF(count, 0)", persisted=True))
+
+    def __repr__(self):
+        return f"<QuestionStat(quiz_id={self.quiz_id}, q_id={self.q_id}, count={self.count})>"
@@ -1,7 +1,7 @@
 """
 Quiz model - stores generated quizzes
 """
-from sqlalchemy import Column, String, TIMESTAMP, ForeignKey, text
+from sqlalchemy import Column, String, Integer, TIMESTAMP, ForeignKey, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from app.database import Base
 import uuid
@@ -23,6 +23,7 @@ class Quiz(Base):
     difficulty = Column(String(20))
     questions = Column(JSONB, nullable=False)  # Full question data
     variant_hash = Column(String(64), index=True)  # For caching
+    key_version = Column(Integer, default=1)  # Bumped when the answer key is patched
     created_at = Column(TIMESTAMP, server_default=text("NOW()"))
     
     def __repr__(self):
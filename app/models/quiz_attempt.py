@@ -1,7 +1,7 @@
 """
 QuizAttempt model - stores quiz submissions and grading
 """
-from sqlalchemy import Column, TIMESTAMP, DECIMAL, ForeignKey, text
+from sqlalchemy import Column, String, Text, TIMESTAMP, DECIMAL, ForeignKey, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from app.database import Base
 import uuid
@@ -25,6 +25,8 @@ class QuizAttempt(Base):
     scores = Column(JSONB)  # Per-question scores and feedback
     total_score = Column(DECIMAL(4, 2))  # Total score
     weak_topics = Column(JSONB)  # Identified weak areas
+    feedback = Column(Text)  # Overall feedback message
+    grading_status = Column(String(20), default="completed")  # pending, completed, failed
     created_at = Column(TIMESTAMP, server_default=text("NOW()"))
     
     def __repr__(self):
@@ -0,0 +1,41 @@
+"""
+QuizAttemptItem model - one row per graded question of a quiz attempt
+"""
+from sqlalchemy import Column, String, Float, TIMESTAMP, ForeignKey, Index, text
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+
+class QuizAttemptItem(Base):
+    """
+    Quiz attempt items table - normalized copy of QuizAttempt.scores
+
+    Written in the same transaction as the attempt (and rewritten when it
+    is regraded) so analytics can GROUP BY topic/q_id on indexed columns
+    instead of walking JSONB breakdowns in Python. Pending items of
+    deferred attempts are added once grading completes.
+    """
+    __tablename__ = "quiz_attempt_items"
+    __table_args__ = (
+        Index("idx_attempt_items_user_topic", "user_id", "topic"),
+        Index("idx_attempt_items_chapter_q", "chapter_id", "q_id"),
+        Index("idx_attempt_items_chapter_topic", "chapter_id", "topic"),
+        Index("idx_attempt_items_chapter_created", "chapter_id", "created_at"),
+    )
+
+    attempt_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("quiz_attempts.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    q_id = Column(String(50), primary_key=True)
+    quiz_id = Column(UUID(as_uuid=True), nullable=False)
+    chapter_id = Column(UUID(as_uuid=True), nullable=False)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    topic = Column(String(255), nullable=False, default="general")
+    score = Column(Float, nullable=False)
+    max_score = Column(Float, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=text("NOW()"))
+
+    def __repr__(self):
+        return f"<QuizAttemptItem(attempt_id={self.attempt_id}, q_id={self.q_id}, score={self.score}/{self.max_score})>"
@@ -0,0 +1,27 @@
+"""
+UserTopicStat model - running per-user topic mastery
+"""
+from sqlalchemy import Column, String, Float, Integer, TIMESTAMP
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+
+class UserTopicStat(Base):
+    """
+    User topic stats table - incrementally maintained topic mastery
+
+    Updated in the same transaction as the attempt's quiz_attempt_items,
+    so performance analytics read one row per topic instead of every
+    attempt. Can be rebuilt from quiz_attempt_items.
+    """
+    __tablename__ = "user_topic_stats"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    topic = Column(String(255), primary_key=True)
+    sum_score = Column(Float, nullable=False, default=0.0)  # Sum of per-question score ratios
+    count = Column(Integer, nullable=False, default=0)  # Graded questions on this topic
+    weak_count = Column(Integer, nullable=False, default=0)  # Attempts where the topic was weak
+    last_attempt_at = Column(TIMESTAMP)
+
+    def __repr__(self):
+        return f"<UserTopicStat(user_id={self.user_id}, topic={self.topic}, count={self.count})>"
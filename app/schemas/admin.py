@@ -0,0 +1,39 @@
+"""
+Pydantic schemas for admin operations
+"""
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, List, Any, Optional
+from uuid import UUID
+
+
+class QuestionPatch(BaseModel):
+    """Corrections to one quiz question; omitted fields are left unchanged"""
+    question: Optional[str] = Field(None, min_length=1)
+    options: Optional[List[str]] = None
+    correct_answer: Optional[Any] = None
+    points: Optional[float] = Field(None, gt=0)
+    topic: Optional[str] = Field(None, max_length=255)
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if not self.model_dump(exclude_unset=True):
+            raise ValueError("At least one field must be provided")
+        return self
+
+
+class RegradeAccepted(BaseModel):
+    """Response when a question was patched and its attempts queued for regrading"""
+    quiz_id: UUID
+    q_id: str
+    key_version: int
+    key_changed: bool  # False: points/topic only, stored grades are rescaled
+    patched_quizzes: Dict[UUID, str]  # Every quiz carrying the question -> its q_id there
+    job_id: UUID
+    status_url: str
+
+
+class AdminJobAccepted(BaseModel):
+    """Response when an admin maintenance job was queued"""
+    job_id: UUID
+    job_type: str
+    status_url: str
@@ -2,8 +2,9 @@
 Pydantic schemas for analytics endpoints
 """
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from uuid import UUID
+from datetime import datetime
 
 
 class TopicMastery(BaseModel):
@@ -12,6 +13,7 @@ class TopicMastery(BaseModel):
     mastery_percentage: float
     attempts: int
     avg_score: float
+    weak_attempts: int = 0  # Quiz attempts in which this topic scored below 60%
 
 
 class ChapterProgress(BaseModel):
@@ -36,15 +38,19 @@ class UserPerformance(BaseModel):
     chapter_progress: List[ChapterProgress]
     weak_areas: List[str]
     recommendations: List[str]
+    window_start: Optional[datetime] = None  # Set when quiz metrics are limited to a window (UTC)
+    window_end: Optional[datetime] = None
 
 
 class QuestionAnalytics(BaseModel):
     """Analytics for a specific question"""
     q_id: str
+    quiz_id: Optional[UUID] = None
     question_text: str
     topic: str
     attempts: int
     avg_score: float
+    score_stddev: Optional[float] = None  # Spread of score ratios across attempts
     common_mistakes: List[str]
 
 
@@ -58,4 +64,8 @@ class ChapterAnalytics(BaseModel):
     avg_completion_time: int
     difficult_questions: List[QuestionAnalytics]
     common_weak_topics: List[Dict[str, Any]]
-    completion_rate: float
\ No newline at end of file
+    completion_rate: float
+    unique_users_approximate: bool = False  # unique_users is a HyperLogLog estimate
+    unique_users_error: Optional[float] = None  # Relative standard error of the estimate
+    window_start: Optional[datetime] = None  # Set for time-windowed analytics (UTC, hour-aligned)
+    window_end: Optional[datetime] = None
@@ -36,12 +36,37 @@ class QuizResponse(BaseModel):
         from_attributes = True
 
 
+class QuizJobAccepted(BaseModel):
+    """Response when quiz generation is queued (async mode)"""
+    job_id: UUID
+    status: str
+    status_url: str
+    events_url: str
+
+
+class QuizJobStatus(BaseModel):
+    """Status of a background job (quiz generation, deferred grading, regrade)"""
+    job_id: UUID
+    type: str
+    status: str  # queued, running, completed, failed
+    progress: Optional[Dict[str, Any]] = None  # Reported by long jobs (e.g. regrades)
+    result: Optional[Dict[str, Any]] = None  # Quiz payload once completed
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
 class QuizSubmission(BaseModel):
     """Schema for quiz submission"""
     user_id: UUID
     answers: Dict[str, Any]  # {q_id: answer}
 
 
+class BulkQuizSubmission(BaseModel):
+    """Schema for submitting many answer sheets for one quiz"""
+    submissions: List[QuizSubmission] = Field(..., min_length=1)
+
+
 class QuestionGrading(BaseModel):
     """Grading details for a single question"""
     q_id: str
@@ -51,6 +76,7 @@ class QuestionGrading(BaseModel):
     max_score: float
     feedback: Optional[str] = None
     is_correct: bool
+    pending: bool = False  # Subjective item still being graded (deferred mode)
 
 
 class QuizGradingResponse(BaseModel):
@@ -62,6 +88,22 @@ class QuizGradingResponse(BaseModel):
     breakdown: List[QuestionGrading]
     weak_topics: List[str]
     feedback: str
+    attempt_id: Optional[UUID] = None
+    grading_status: str = "completed"  # pending, completed, failed
+    status_url: Optional[str] = None  # Set while grading is pending
+    events_url: Optional[str] = None
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class BulkSubmissionResult(QuizGradingResponse):
+    """Grading result of one answer sheet in a bulk submission"""
+    user_id: UUID
+
+
+class BulkQuizGradingResponse(BaseModel):
+    """Response after bulk quiz grading"""
+    quiz_id: UUID
+    total_submissions: int
+    results: List[BulkSubmissionResult]  # In submission order
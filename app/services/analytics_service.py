@@ -2,61 +2,203 @@
 Analytics service for user and chapter performance tracking
 """
 import logging
-from typing import Dict, List, Any
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, text, tuple_
 from uuid import UUID
-from collections import defaultdict
-from app.models import Chapter, UserProgress, Quiz, QuizAttempt
+from app.models import Chapter, UserProgress, Quiz, QuizAttempt, UserTopicStat, QuestionStat, ChapterUserSketch
+from app.models.chapter_rollup import ALL_TOPICS, ALL_QUESTIONS, NO_QUIZ
+from app.services.attempt_stats_service import WEAK_TOPIC_THRESHOLD
+from app.utils.hyperloglog import HyperLogLog, relative_error
 
 logger = logging.getLogger(__name__)
 
+# Chapter title plus every scalar metric, in one round trip. Attempts count
+# once graded, like the rollups and sketches that serve windowed requests
+_CHAPTER_METRICS_SQL = """
+    SELECT
+        c.title,
+        att.total_attempts,
+        att.unique_users,
+        att.avg_score,
+        prog.progress_count,
+        prog.completed_count,
+        prog.completed_time
+    FROM chapters c
+    CROSS JOIN (
+        SELECT
+            count(*) AS total_attempts,
+            {unique_users} AS unique_users,
+            COALESCE(avg(COALESCE(a.total_score, 0)), 0) AS avg_score
+        FROM quiz_attempts a
+        JOIN quizzes q ON q.id = a.quiz_id
+        WHERE q.chapter_id = :chapter_id
+          AND (a.grading_status IS NULL OR a.grading_status = 'completed')
+    ) att
+    CROSS JOIN (
+        SELECT
+            count(*) AS progress_count,
+            count(*) FILTER (WHERE is_completed) AS completed_count,
+            COALESCE(sum(time_spent) FILTER (WHERE is_completed), 0) AS completed_time
+        FROM user_progress
+        WHERE chapter_id = :chapter_id
+    ) prog
+    WHERE c.id = :chapter_id
+"""
+CHAPTER_METRICS_SQL = text(_CHAPTER_METRICS_SQL.format(unique_users="count(DISTINCT a.user_id)"))
+# Approximate mode skips the DISTINCT; unique users come from the sketch
+CHAPTER_METRICS_APPROX_SQL = text(_CHAPTER_METRICS_SQL.format(unique_users="NULL::bigint"))
+
+# A topic is weak in an attempt when its average score ratio is below 60%
+# (same rule as grading); share of attempts covering the topic where it was weak
+COMMON_WEAK_TOPICS_SQL = text("""
+    WITH per_attempt AS (
+        SELECT topic, avg(score / max_score) < 0.6 AS weak
+        FROM quiz_attempt_items
+        WHERE chapter_id = :chapter_id AND max_score > 0
+        GROUP BY attempt_id, topic
+    )
+    SELECT
+        topic,
+        count(*) FILTER (WHERE weak) AS weakness_count,
+        count(*) AS total
+    FROM per_attempt
+    GROUP BY topic
+    HAVING count(*) FILTER (WHERE weak) > 0
+    ORDER BY count(*) FILTER (WHERE weak)::float / count(*) DESC, topic
+    LIMIT :limit
+""")
+
+# Rollup rows of a window: whole days from the daily table, the ragged
+# edges from the hourly table, summed per (topic, quiz_id, q_id)
+WINDOW_ROLLUP_SQL = text("""
+    WITH window_rows AS (
+        SELECT topic, quiz_id, q_id, count, sum_score, sum_sq, weak_count
+        FROM chapter_rollups_daily
+        WHERE chapter_id = :chapter_id AND bucket >= :day_start AND bucket < :day_end
+        UNION ALL
+        SELECT topic, quiz_id, q_id, count, sum_score, sum_sq, weak_count
+        FROM chapter_rollups_hourly
+        WHERE chapter_id = :chapter_id AND bucket >= :start AND bucket < :end
+          AND NOT (bucket >= :day_start AND bucket < :day_end)
+    )
+    SELECT
+        topic,
+        quiz_id,
+        q_id,
+        sum(count) AS count,
+        sum(sum_score) AS sum_score,
+        sum(sum_sq) AS sum_sq,
+        sum(weak_count) AS weak_count
+    FROM window_rows
+    GROUP BY topic, quiz_id, q_id
+""")
+
+WINDOW_UNIQUE_USERS_SQL = text("""
+    SELECT count(DISTINCT user_id)
+    FROM quiz_attempt_items
+    WHERE chapter_id = :chapter_id AND created_at >= :start AND created_at < :end
+""")
+
+# Distinct-user sketches of the same daily/hourly buckets (chapter rows)
+WINDOW_SKETCHES_SQL = text("""
+    SELECT user_sketch
+    FROM chapter_rollups_daily
+    WHERE chapter_id = :chapter_id AND bucket >= :day_start AND bucket < :day_end
+      AND topic = :all_topics AND quiz_id = :no_quiz AND q_id = :all_questions
+    UNION ALL
+    SELECT user_sketch
+    FROM chapter_rollups_hourly
+    WHERE chapter_id = :chapter_id AND bucket >= :start AND bucket < :end
+      AND NOT (bucket >= :day_start AND bucket < :day_end)
+      AND topic = :all_topics AND quiz_id = :no_quiz AND q_id = :all_questions
+""")
+
+WINDOW_PROGRESS_SQL = text("""
+    SELECT
+        count(*) AS progress_count,
+        count(*) FILTER (WHERE is_completed) AS completed_count,
+        COALESCE(sum(time_spent) FILTER (WHERE is_completed), 0) AS completed_time
+    FROM user_progress
+    WHERE chapter_id = :chapter_id AND updated_at >= :start AND updated_at < :end
+""")
+
+# A user's topic mastery over a window, weakness decided per attempt
+WINDOW_TOPIC_MASTERY_SQL = text("""
+    SELECT
+        topic,
+        sum(sum_score) AS sum_score,
+        sum(count)::bigint AS count,
+        count(*) FILTER (WHERE sum_score / count < :weak_threshold) AS weak_count
+    FROM (
+        SELECT topic, sum(score / max_score) AS sum_score, count(*) AS count
+        FROM quiz_attempt_items
+        WHERE user_id = :user_id
+          AND max_score > 0
+          AND created_at >= :start
+          AND created_at < :end
+        GROUP BY attempt_id, topic
+    ) per_attempt
+    GROUP BY topic
+""")
+
 
 class AnalyticsService:
     """Service for generating performance analytics"""
     
-    def get_user_performance(self, db: Session, user_id: UUID) -> Dict[str, Any]:
+    def get_user_performance(
+        self,
+        db: Session,
+        user_id: UUID,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Any]:
         """
         Get comprehensive performance analytics for a user
         
         Args:
             db: Database session
             user_id: User UUID
+            start: Optional window start; quiz metrics only count attempts from here
+            end: Optional window end (exclusive)
             
         Returns:
             Dictionary with performance metrics
         """
+        window = self.window(start, end) if start or end else None
         
         # Get all user progress records
         progress_records = db.query(UserProgress).filter(
             UserProgress.user_id == user_id
         ).all()
         
-        # Get all quiz attempts
-        attempts = db.query(QuizAttempt).filter(
-            QuizAttempt.user_id == user_id
-        ).all()
+        # Attempt count and average score, aggregated in SQL
+        attempt_query = db.query(
+            func.count(QuizAttempt.id),
+            func.avg(func.coalesce(QuizAttempt.total_score, 0))
+        ).filter(QuizAttempt.user_id == user_id)
+        if window:
+            attempt_query = attempt_query.filter(
+                QuizAttempt.created_at >= window[0],
+                QuizAttempt.created_at < window[1]
+            )
+        total_quiz_attempts, avg_score = attempt_query.one()
+        avg_score = float(avg_score or 0.0)
         
         # Calculate overall metrics
         total_chapters = len(progress_records)
         completed_chapters = sum(1 for p in progress_records if p.is_completed)
-        total_quiz_attempts = len(attempts)
-        
-        # Calculate average score
-        if attempts:
-            total_score = sum(float(a.total_score) for a in attempts if a.total_score)
-            avg_score = total_score / len(attempts) if attempts else 0.0
-        else:
-            avg_score = 0.0
         
         # Topic mastery analysis
-        topic_mastery = self._calculate_topic_mastery(db, attempts)
+        topic_mastery = self._calculate_topic_mastery(db, user_id, window)
         
         # Chapter progress details
         chapter_progress = self._get_chapter_progress_details(db, progress_records, user_id)
         
         # Weak areas
-        weak_areas = self._identify_weak_areas(attempts, topic_mastery)
+        weak_areas = self._identify_weak_areas(topic_mastery)
         
         # Recommendations
         recommendations = self._generate_recommendations(
@@ -72,41 +214,42 @@ class AnalyticsService:
             "topic_mastery": topic_mastery,
             "chapter_progress": chapter_progress,
             "weak_areas": weak_areas,
-            "recommendations": recommendations
+            "recommendations": recommendations,
+            **self._window_fields(window)
         }
     
     def _calculate_topic_mastery(
         self,
         db: Session,
-        attempts: List[QuizAttempt]
+        user_id: UUID,
+        window: Optional[Tuple[datetime, datetime]] = None
     ) -> List[Dict[str, Any]]:
-        """Calculate mastery level per topic"""
-        
-        topic_scores = defaultdict(list)
-        
-        for attempt in attempts:
-            if attempt.scores:
-                # scores is JSONB containing breakdown
-                breakdown = attempt.scores if isinstance(attempt.scores, list) else []
-                
-                for item in breakdown:
-                    if isinstance(item, dict):
-                        topic = item.get("topic", "general")
-                        score = item.get("score", 0)
-                        max_score = item.get("max_score", 1)
-                        
-                        if max_score > 0:
-                            topic_scores[topic].append(score / max_score)
+        """Calculate mastery level per topic from the running user_topic_stats"""
+        
+        if window:
+            # Running totals are all-time; a window aggregates the user's items
+            stats = db.execute(WINDOW_TOPIC_MASTERY_SQL, {
+                "user_id": user_id,
+                "start": window[0],
+                "end": window[1],
+                "weak_threshold": WEAK_TOPIC_THRESHOLD,
+            }).all()
+        else:
+            stats = db.query(UserTopicStat).filter(
+                UserTopicStat.user_id == user_id,
+                UserTopicStat.count > 0
+            ).all()
         
         # Calculate mastery percentage per topic
         mastery_list = []
-        for topic, scores in topic_scores.items():
-            avg_score = sum(scores) / len(scores) if scores else 0.0
+        for stat in stats:
+            avg_score = stat.sum_score / stat.count
             mastery_list.append({
-                "topic": topic,
+                "topic": stat.topic,
                 "mastery_percentage": round(avg_score * 100, 2),
-                "attempts": len(scores),
-                "avg_score": round(avg_score, 2)
+                "attempts": stat.count,
+                "avg_score": round(avg_score, 2),
+                "weak_attempts": stat.weak_count
             })
         
         # Sort by mastery descending
@@ -120,64 +263,73 @@ class AnalyticsService:
         progress_records: List[UserProgress],
         user_id: UUID
     ) -> List[Dict[str, Any]]:
-        """Get detailed progress for each chapter"""
+        """
+        Get detailed progress for each chapter
+        
+        Chapter titles and per-chapter attempt counts/averages come from a
+        single grouped query, whatever the number of chapters.
+        """
+        
+        if not progress_records:
+            return []
+        
+        # Attempt count and average score per chapter for this user
+        attempt_stats = (
+            db.query(
+                Quiz.chapter_id.label("chapter_id"),
+                func.count(QuizAttempt.id).label("attempts"),
+                func.avg(func.coalesce(QuizAttempt.total_score, 0)).label("avg_score")
+            )
+            .join(Quiz, Quiz.id == QuizAttempt.quiz_id)
+            .filter(QuizAttempt.user_id == user_id)
+            .group_by(Quiz.chapter_id)
+            .subquery()
+        )
+        
+        rows = (
+            db.query(
+                Chapter.id,
+                Chapter.title,
+                attempt_stats.c.attempts,
+                attempt_stats.c.avg_score
+            )
+            .outerjoin(attempt_stats, attempt_stats.c.chapter_id == Chapter.id)
+            .filter(Chapter.id.in_({p.chapter_id for p in progress_records}))
+            .all()
+        )
+        chapters = {row.id: row for row in rows}
         
         chapter_details = []
         
         for progress in progress_records:
-            # Get chapter info
-            chapter = db.query(Chapter).filter(Chapter.id == progress.chapter_id).first()
+            chapter = chapters.get(progress.chapter_id)
             
             if not chapter:
                 continue
             
-            # Get quiz attempts for this chapter
-            quiz_ids = db.query(Quiz.id).filter(Quiz.chapter_id == progress.chapter_id).all()
-            quiz_ids = [q_id[0] for q_id in quiz_ids]
-            
-            chapter_attempts = db.query(QuizAttempt).filter(
-                and_(
-                    QuizAttempt.user_id == user_id,
-                    QuizAttempt.quiz_id.in_(quiz_ids)
-                )
-            ).all() if quiz_ids else []
-            
-            # Calculate average quiz score
-            if chapter_attempts:
-                avg_quiz_score = sum(float(a.total_score) for a in chapter_attempts if a.total_score) / len(chapter_attempts)
-            else:
-                avg_quiz_score = 0.0
-            
             chapter_details.append({
                 "chapter_id": str(chapter.id),
                 "chapter_title": chapter.title,
                 "completion_percentage": float(progress.scroll_progress) if progress.scroll_progress else 0.0,
                 "is_completed": progress.is_completed,
                 "time_spent": progress.time_spent or 0,
-                "quiz_attempts": len(chapter_attempts),
-                "avg_quiz_score": round(avg_quiz_score, 2)
+                "quiz_attempts": chapter.attempts or 0,
+                "avg_quiz_score": round(float(chapter.avg_score or 0), 2)
             })
         
         return chapter_details
     
     def _identify_weak_areas(
         self,
-        attempts: List[QuizAttempt],
         topic_mastery: List[Dict[str, Any]]
     ) -> List[str]:
-        """Identify weak areas from quiz attempts"""
+        """Identify weak areas from topic mastery"""
         
         weak_areas = set()
         
-        # From quiz attempts
-        for attempt in attempts:
-            if attempt.weak_topics:
-                weak_topics = attempt.weak_topics if isinstance(attempt.weak_topics, list) else []
-                weak_areas.update(weak_topics)
-        
-        # From topic mastery (< 60%)
         for topic in topic_mastery:
-            if topic["mastery_percentage"] < 60:
+            # Weak in at least one quiz attempt, or overall mastery < 60%
+            if topic["weak_attempts"] > 0 or topic["mastery_percentage"] < 60:
                 weak_areas.add(topic["topic"])
         
         return sorted(list(weak_areas))
@@ -217,170 +369,280 @@ class AnalyticsService:
         
         return recommendations
     
-    def get_chapter_analytics(self, db: Session, chapter_id: UUID) -> Dict[str, Any]:
+    def get_chapter_analytics(
+        self,
+        db: Session,
+        chapter_id: UUID,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        approximate: bool = False
+    ) -> Dict[str, Any]:
         """
         Get analytics for a specific chapter
         
+        Scalar metrics are SQL aggregates fetched in one round trip; only
+        the top-N difficult questions and weak topics reach Python. Attempts
+        still pending deferred grading (or whose grading failed) are not
+        counted, with or without a window.
+        
         Args:
             db: Database session
             chapter_id: Chapter UUID
+            start: Optional window start (served from hourly/daily rollups)
+            end: Optional window end (exclusive)
+            approximate: Estimate unique users from HyperLogLog sketches
+                instead of an exact COUNT(DISTINCT)
             
         Returns:
             Dictionary with chapter analytics
         """
-        
-        # Get chapter
-        chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
-        if not chapter:
+        if start or end:
+            return self._get_windowed_chapter_analytics(
+                db, chapter_id, self.window(start, end), approximate
+            )
+        
+        metrics = db.execute(
+            CHAPTER_METRICS_APPROX_SQL if approximate else CHAPTER_METRICS_SQL,
+            {"chapter_id": chapter_id}
+        ).first()
+        if not metrics:
             return None
         
-        # Get all progress records for this chapter
-        progress_records = db.query(UserProgress).filter(
-            UserProgress.chapter_id == chapter_id
-        ).all()
+        if approximate:
+            stored = db.query(ChapterUserSketch.sketch).filter(
+                ChapterUserSketch.chapter_id == chapter_id
+            ).scalar()
+            unique_users = HyperLogLog.union([stored]).count()
+        else:
+            unique_users = metrics.unique_users
         
-        # Get all quizzes for this chapter
-        quizzes = db.query(Quiz).filter(Quiz.chapter_id == chapter_id).all()
-        quiz_ids = [q.id for q in quizzes]
+        completion_rate = (
+            metrics.completed_count / metrics.progress_count if metrics.progress_count else 0.0
+        )
+        avg_completion_time = (
+            metrics.completed_time / metrics.completed_count if metrics.completed_count else 0
+        )
         
-        # Get all quiz attempts
-        attempts = db.query(QuizAttempt).filter(
-            QuizAttempt.quiz_id.in_(quiz_ids)
-        ).all() if quiz_ids else []
+        # Difficult questions
+        difficult_questions = self._identify_difficult_questions(db, chapter_id)
         
-        # Calculate metrics
-        total_attempts = len(attempts)
-        unique_users = len(set(str(a.user_id) for a in attempts))
+        # Common weak topics
+        common_weak_topics = self._identify_common_weak_topics(db, chapter_id)
         
-        if attempts:
-            avg_score = sum(float(a.total_score) for a in attempts if a.total_score) / len(attempts)
-        else:
-            avg_score = 0.0
+        return {
+            "chapter_id": str(chapter_id),
+            "chapter_title": metrics.title,
+            "total_attempts": metrics.total_attempts,
+            "unique_users": unique_users,
+            "avg_score": round(float(metrics.avg_score), 2),
+            "avg_completion_time": int(avg_completion_time),
+            "difficult_questions": difficult_questions,
+            "common_weak_topics": common_weak_topics,
+            "completion_rate": round(completion_rate * 100, 2),
+            **self._approximation_fields(approximate)
+        }
+    
+    def window(
+        self,
+        start: Optional[datetime],
+        end: Optional[datetime]
+    ) -> Tuple[datetime, datetime]:
+        """
+        Normalize a requested window to naive UTC whole hours (the rollup grain)
         
-        # Average completion time
-        completed_progress = [p for p in progress_records if p.is_completed]
-        if completed_progress:
-            avg_completion_time = sum(p.time_spent for p in completed_progress if p.time_spent) / len(completed_progress)
-        else:
-            avg_completion_time = 0
+        The start is floored and the end rounded up to the hour; an open end
+        means now.
+        """
+        def to_utc(value: datetime) -> datetime:
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value
+        
+        end = to_utc(end) if end else datetime.utcnow()
+        floored_end = end.replace(minute=0, second=0, microsecond=0)
+        end = floored_end if floored_end == end else floored_end + timedelta(hours=1)
+        start = to_utc(start).replace(minute=0, second=0, microsecond=0) if start else datetime(1970, 1, 1)
+        
+        if start >= end:
+            raise ValueError("'from' must be before 'to'")
+        return start, end
+    
+    def _window_fields(self, window: Optional[Tuple[datetime, datetime]]) -> Dict[str, Any]:
+        if not window:
+            return {}
+        return {"window_start": window[0], "window_end": window[1]}
+    
+    def _approximation_fields(self, approximate: bool) -> Dict[str, Any]:
+        return {
+            "unique_users_approximate": approximate,
+            "unique_users_error": round(relative_error(), 4) if approximate else None
+        }
+    
+    def _get_windowed_chapter_analytics(
+        self,
+        db: Session,
+        chapter_id: UUID,
+        window: Tuple[datetime, datetime],
+        approximate: bool = False
+    ) -> Dict[str, Any]:
+        """Chapter analytics over a time window, merged from rollup buckets"""
+        
+        chapter = db.query(Chapter.title).filter(Chapter.id == chapter_id).first()
+        if not chapter:
+            return None
         
-        # Completion rate
-        if progress_records:
-            completion_rate = len(completed_progress) / len(progress_records)
+        start, end = window
+        # Whole days inside the window come from the daily rollups
+        day_start = start.replace(hour=0)
+        if day_start < start:
+            day_start += timedelta(days=1)
+        day_end = max(end.replace(hour=0), day_start)
+        
+        params = {"chapter_id": chapter_id, "start": start, "end": end}
+        rows = db.execute(
+            WINDOW_ROLLUP_SQL, {**params, "day_start": day_start, "day_end": day_end}
+        ).all()
+        
+        totals = None
+        topics = []
+        questions = []
+        for row in rows:
+            if row.topic == ALL_TOPICS:
+                totals = row
+            elif row.quiz_id == NO_QUIZ and row.q_id == ALL_QUESTIONS:
+                topics.append(row)
+            else:
+                questions.append(row)
+        
+        if approximate:
+            sketches = db.execute(WINDOW_SKETCHES_SQL, {
+                **params,
+                "day_start": day_start,
+                "day_end": day_end,
+                "all_topics": ALL_TOPICS,
+                "no_quiz": NO_QUIZ,
+                "all_questions": ALL_QUESTIONS
+            }).scalars()
+            unique_users = HyperLogLog.union(sketches).count()
         else:
-            completion_rate = 0.0
+            unique_users = db.execute(WINDOW_UNIQUE_USERS_SQL, params).scalar() or 0
+        progress = db.execute(WINDOW_PROGRESS_SQL, params).first()
         
-        # Difficult questions
-        difficult_questions = self._identify_difficult_questions(attempts, quizzes)
+        completion_rate = (
+            progress.completed_count / progress.progress_count if progress.progress_count else 0.0
+        )
+        avg_completion_time = (
+            progress.completed_time / progress.completed_count if progress.completed_count else 0
+        )
         
-        # Common weak topics
-        common_weak_topics = self._identify_common_weak_topics(attempts)
+        # Difficult questions: lowest average score ratio, below 50%
+        difficult = sorted(
+            (row for row in questions if row.count and row.sum_score / row.count < 0.5),
+            key=lambda row: row.sum_score / row.count
+        )[:5]
+        texts = {}
+        if difficult:
+            texts = {
+                (stat.quiz_id, stat.q_id): stat.question_text
+                for stat in db.query(QuestionStat.quiz_id, QuestionStat.q_id, QuestionStat.question_text).filter(
+                    tuple_(QuestionStat.quiz_id, QuestionStat.q_id).in_(
+                        [(row.quiz_id, row.q_id) for row in difficult]
+                    )
+                )
+            }
+        difficult_questions = [
+            self._question_entry(
+                row.q_id, row.quiz_id, texts.get((row.quiz_id, row.q_id)), row.topic,
+                int(row.count), row.sum_score, row.sum_sq
+            )
+            for row in difficult
+        ]
+        
+        # Common weak topics: share of attempts covering the topic where it was weak
+        weak_topics = sorted(
+            (row for row in topics if row.weak_count),
+            key=lambda row: (-row.weak_count / row.count, row.topic)
+        )[:5]
+        common_weak_topics = [
+            {
+                "topic": row.topic,
+                "weakness_count": int(row.weak_count),
+                "weakness_percentage": round(row.weak_count / row.count * 100, 2)
+            }
+            for row in weak_topics
+        ]
         
         return {
             "chapter_id": str(chapter_id),
             "chapter_title": chapter.title,
-            "total_attempts": total_attempts,
+            "total_attempts": int(totals.count) if totals else 0,
             "unique_users": unique_users,
-            "avg_score": round(avg_score, 2),
+            "avg_score": round(totals.sum_score / totals.count, 2) if totals and totals.count else 0.0,
             "avg_completion_time": int(avg_completion_time),
             "difficult_questions": difficult_questions,
             "common_weak_topics": common_weak_topics,
-            "completion_rate": round(completion_rate * 100, 2)
+            "completion_rate": round(completion_rate * 100, 2),
+            **self._approximation_fields(approximate),
+            **self._window_fields(window)
         }
     
-    def _identify_difficult_questions(
+    def _question_entry(
         self,
-        attempts: List[QuizAttempt],
-        quizzes: List[Quiz]
-    ) -> List[Dict[str, Any]]:
-        """Identify questions with low average scores"""
-        
-        question_scores = defaultdict(lambda: {"scores": [], "topic": "", "text": ""})
-        
-        # Collect scores for each question
-        for attempt in attempts:
-            if attempt.scores:
-                breakdown = attempt.scores if isinstance(attempt.scores, list) else []
-                
-                for item in breakdown:
-                    if isinstance(item, dict):
-                        q_id = item.get("q_id")
-                        score = item.get("score", 0)
-                        max_score = item.get("max_score", 1)
-                        topic = item.get("topic", "general")
-                        
-                        if max_score > 0:
-                            question_scores[q_id]["scores"].append(score / max_score)
-                            question_scores[q_id]["topic"] = topic
-        
-        # Calculate averages and identify difficult ones
-        difficult = []
-        for q_id, data in question_scores.items():
-            if len(data["scores"]) > 0:
-                avg = sum(data["scores"]) / len(data["scores"])
-                
-                if avg < 0.5:  # Less than 50% average
-                    # Find question text from quiz
-                    question_text = "Question details not available"
-                    for quiz in quizzes:
-                        if quiz.questions:
-                            questions = quiz.questions if isinstance(quiz.questions, list) else []
-                            for q in questions:
-                                if isinstance(q, dict) and q.get("q_id") == q_id:
-                                    question_text = q.get("question", question_text)
-                                    break
-                    
-                    difficult.append({
-                        "q_id": q_id,
-                        "question_text": question_text[:100] + "..." if len(question_text) > 100 else question_text,
-                        "topic": data["topic"],
-                        "attempts": len(data["scores"]),
-                        "avg_score": round(avg, 2),
-                        "common_mistakes": ["Review fundamental concepts", "Practice similar problems"]
-                    })
-        
-        # Sort by difficulty (lowest avg first)
-        difficult.sort(key=lambda x: x["avg_score"])
-        
-        return difficult[:5]  # Top 5 most difficult
+        q_id: str,
+        quiz_id: UUID,
+        question_text: Optional[str],
+        topic: str,
+        count: int,
+        sum_score: float,
+        sum_sq: float
+    ) -> Dict[str, Any]:
+        """Difficult-question payload from running score ratio sums"""
+        question_text = question_text or "Question details not available"
+        avg_score = sum_score / count
+        variance = max(sum_sq / count - avg_score ** 2, 0.0)
+        return {
+            "q_id": q_id,
+            "quiz_id": str(quiz_id),
+            "question_text": question_text[:100] + "..." if len(question_text) > 100 else question_text,
+            "topic": topic,
+            "attempts": count,
+            "avg_score": round(avg_score, 2),
+            "score_stddev": round(math.sqrt(variance), 2),
+            "common_mistakes": ["Review fundamental concepts", "Practice similar problems"]
+        }
     
-    def _identify_common_weak_topics(self, attempts: List[QuizAttempt]) -> List[Dict[str, Any]]:
-        """Identify most common weak topics across all attempts"""
-        
-        topic_weakness_count = defaultdict(int)
-        topic_total_mentions = defaultdict(int)
-        
-        for attempt in attempts:
-            # Count weak topics
-            if attempt.weak_topics:
-                weak = attempt.weak_topics if isinstance(attempt.weak_topics, list) else []
-                for topic in weak:
-                    topic_weakness_count[topic] += 1
-            
-            # Count all topic mentions
-            if attempt.scores:
-                breakdown = attempt.scores if isinstance(attempt.scores, list) else []
-                for item in breakdown:
-                    if isinstance(item, dict):
-                        topic = item.get("topic", "general")
-                        topic_total_mentions[topic] += 1
-        
-        # Calculate weakness percentage
-        common_weak = []
-        for topic, weak_count in topic_weakness_count.items():
-            total = topic_total_mentions.get(topic, weak_count)
-            weakness_pct = (weak_count / total * 100) if total > 0 else 0
-            
-            common_weak.append({
-                "topic": topic,
-                "weakness_count": weak_count,
-                "weakness_percentage": round(weakness_pct, 2)
-            })
-        
-        # Sort by weakness percentage
-        common_weak.sort(key=lambda x: x["weakness_percentage"], reverse=True)
-        
-        return common_weak[:5]  # Top 5
+    def _identify_difficult_questions(self, db: Session, chapter_id: UUID) -> List[Dict[str, Any]]:
+        """Identify questions with low average scores (top 5 most difficult)"""
+        
+        # Index range scan on (chapter_id, avg_score) over the running question stats
+        stats = db.query(QuestionStat).filter(
+            QuestionStat.chapter_id == chapter_id,
+            QuestionStat.avg_score < 0.5
+        ).order_by(QuestionStat.avg_score.asc()).limit(5).all()
+        
+        difficult = [
+            self._question_entry(
+                stat.q_id, stat.quiz_id, stat.question_text, stat.topic,
+                stat.count, stat.sum_score, stat.sum_sq
+            )
+            for stat in stats
+        ]
+        
+        return difficult
+    
+    def _identify_common_weak_topics(self, db: Session, chapter_id: UUID) -> List[Dict[str, Any]]:
+        """Identify most common weak topics across all attempts (top 5)"""
+        
+        rows = db.execute(COMMON_WEAK_TOPICS_SQL, {"chapter_id": chapter_id, "limit": 5}).all()
+        
+        return [
+            {
+                "topic": row.topic,
+                "weakness_count": row.weakness_count,
+                "weakness_percentage": round(row.weakness_count / row.total * 100, 2) if row.total else 0
+            }
+            for row in rows
+        ]
 
 
 # Global instance
@@ -0,0 +1,505 @@
+"""
+Normalized per-question attempt data for analytics
+"""
+import logging
+from collections import defaultdict
+from typing import Dict, Any, Iterable, List, Sequence
+from sqlalchemy import delete, func, or_, select, text, update, bindparam
+from sqlalchemy.dialects.postgresql import insert, ARRAY, UUID
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import (
+    Quiz, QuizAttempt, QuizAttemptItem, UserTopicStat, QuestionStat, RollupQueueEntry, ChapterUserSketch
+)
+from app.utils.events import event_bus, ANALYTICS_REBUILT
+from app.utils.hyperloglog import HyperLogLog
+from app.utils.job_queue import job_queue
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_JOB = "backfill_attempt_items"
+REBUILD_JOB = "rebuild_analytics_stats"
+
+# A topic is weak in an attempt when its average score ratio is below this (as in grading)
+WEAK_TOPIC_THRESHOLD = 0.6
+
+# Items of a batch of stored attempts, exploded from their JSONB breakdowns
+BACKFILL_ITEMS_SQL = text("""
+    INSERT INTO quiz_attempt_items
+        (attempt_id, q_id, quiz_id, chapter_id, user_id, topic, score, max_score, created_at)
+    SELECT
+        a.id,
+        item->>'q_id',
+        a.quiz_id,
+        q.chapter_id,
+        a.user_id,
+        COALESCE(NULLIF(item->>'topic', ''), 'general'),
+        COALESCE((item->>'score')::float, 0),
+        COALESCE((item->>'max_score')::float, 1),
+        a.created_at
+    FROM quiz_attempts a
+    JOIN quizzes q ON q.id = a.quiz_id
+    CROSS JOIN LATERAL jsonb_array_elements(
+        CASE WHEN jsonb_typeof(a.scores) = 'array' THEN a.scores ELSE '[]'::jsonb END
+    ) item
+    WHERE a.id = ANY(:attempt_ids)
+      AND jsonb_typeof(item) = 'object'
+      AND item->>'q_id' IS NOT NULL
+      AND NOT COALESCE((item->>'pending')::boolean, false)
+    ON CONFLICT (attempt_id, q_id) DO NOTHING
+""").bindparams(bindparam("attempt_ids", type_=ARRAY(UUID(as_uuid=True))))
+
+# Question text snippet length kept in question_stats
+QUESTION_SNIPPET_LENGTH = 200
+
+# Derived stats from scratch; the table locks make concurrent submissions
+# wait, so their increments apply on top of the rebuilt rows
+REBUILD_STATS_SQL = (
+    text("LOCK TABLE user_topic_stats, question_stats, chapter_user_sketches IN EXCLUSIVE MODE"),
+    text("DELETE FROM user_topic_stats"),
+    text(f"""
+        INSERT INTO user_topic_stats (user_id, topic, sum_score, count, weak_count, last_attempt_at)
+        SELECT
+            user_id,
+            topic,
+            sum(sum_score),
+            sum(count),
+            count(*) FILTER (WHERE sum_score / count < {WEAK_TOPIC_THRESHOLD}),
+            max(last_attempt_at)
+        FROM (
+            SELECT
+                attempt_id,
+                user_id,
+                topic,
+                sum(score / max_score) AS sum_score,
+                count(*) AS count,
+                max(created_at) AS last_attempt_at
+            FROM quiz_attempt_items
+            WHERE max_score > 0
+            GROUP BY attempt_id, user_id, topic
+        ) per_attempt
+        GROUP BY user_id, topic
+    """),
+    text("DELETE FROM question_stats"),
+    text(f"""
+        INSERT INTO question_stats
+            (quiz_id, q_id, chapter_id, topic, question_text, sum_score, sum_sq, count)
+        SELECT
+            i.quiz_id,
+            i.q_id,
+            q.chapter_id,
+            max(i.topic),
+            left(max(question->>'question'), {QUESTION_SNIPPET_LENGTH}),
+            sum(i.score / i.max_score),
+            sum((i.score / i.max_score) ^ 2),
+            count(*)
+        FROM quiz_attempt_items i
+        JOIN quizzes q ON q.id = i.quiz_id
+        LEFT JOIN LATERAL (
+            SELECT question
+            FROM jsonb_array_elements(
+                CASE WHEN jsonb_typeof(q.questions) = 'array' THEN q.questions ELSE '[]'::jsonb END
+            ) question
+            WHERE question->>'q_id' = i.q_id
+            LIMIT 1
+        ) question ON true
+        WHERE i.max_score > 0
+        GROUP BY i.quiz_id, i.q_id, q.chapter_id
+    """),
+    # Every bucket with data is rolled up again by the rollup job
+    text("""
+        INSERT INTO analytics_rollup_queue (chapter_id, bucket)
+        SELECT DISTINCT chapter_id, date_trunc('hour', created_at)
+        FROM quiz_attempt_items
+        WHERE created_at IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """),
+    text("DELETE FROM chapter_user_sketches"),
+)
+
+# Streamed into per-chapter sketches after REBUILD_STATS_SQL
+CHAPTER_USERS_SQL = text("""
+    SELECT DISTINCT chapter_id, user_id
+    FROM quiz_attempt_items
+    ORDER BY chapter_id
+""")
+
+
+class AttemptStatsService:
+    """
+    Keeps quiz_attempt_items in step with quiz_attempts
+
+    Callers invoke `record` / `replace` before committing the attempt, so
+    items land in the same transaction. Only graded items are stored:
+    attempts still pending are recorded when their grading completes.
+
+    Derived stats (per-user topic mastery, per-question difficulty) are
+    updated from exactly the items inserted (or deleted) by the same
+    statement, as upserts adding deltas, so retries and concurrent
+    submissions cannot double count. New items also feed the chapter's
+    HyperLogLog sketch of distinct users.
+    """
+
+    def record(self, db: Session, quiz: Quiz, attempts: Iterable[Dict[str, Any]]) -> int:
+        """
+        Add items for newly stored attempts of one quiz
+
+        Args:
+            db: Database session (not committed here)
+            quiz: Quiz the attempts answered
+            attempts: Dicts with id, user_id, scores and optionally created_at
+
+        Returns:
+            Number of items written
+        """
+        rows = [
+            row
+            for attempt in attempts
+            for row in self._item_rows(quiz, attempt)
+        ]
+        if not rows:
+            return 0
+
+        inserted = db.execute(
+            insert(QuizAttemptItem)
+            .on_conflict_do_nothing(index_elements=["attempt_id", "q_id"])
+            .returning(*self._item_columns()),
+            rows
+        ).all()
+        self._apply_deltas(db, quiz, inserted, sign=1)
+        return len(inserted)
+
+    def record_attempt(self, db: Session, quiz: Quiz, attempt: QuizAttempt) -> int:
+        """Add items for one stored attempt (flushes it first so it has an id)"""
+        if attempt.id is None:
+            db.flush()
+        return self.record(db, quiz, [self.attempt_row(attempt)])
+
+    def replace(self, db: Session, quiz: Quiz, attempts: List[QuizAttempt]) -> int:
+        """Rewrite items of attempts whose grading changed (deferred completion, regrade)"""
+        if not attempts:
+            return 0
+
+        removed = db.execute(
+            delete(QuizAttemptItem)
+            .where(QuizAttemptItem.attempt_id.in_([attempt.id for attempt in attempts]))
+            .returning(*self._item_columns())
+        ).all()
+        self._apply_deltas(db, quiz, removed, sign=-1)
+        return self.record(db, quiz, [self.attempt_row(attempt) for attempt in attempts])
+
+    def attempt_row(self, attempt: QuizAttempt) -> Dict[str, Any]:
+        """Fields of an attempt needed to derive its items"""
+        row = {
+            "id": attempt.id,
+            "user_id": attempt.user_id,
+            "scores": attempt.scores,
+        }
+        # Unloaded on fresh inserts (server default); items then default to NOW() too
+        if "created_at" in attempt.__dict__ and attempt.created_at is not None:
+            row["created_at"] = attempt.created_at
+        return row
+
+    def _item_rows(self, quiz: Quiz, attempt: Dict[str, Any]) -> List[Dict[str, Any]]:
+        breakdown = attempt.get("scores")
+        if not isinstance(breakdown, list):
+            return []
+
+        rows = []
+        for item in breakdown:
+            if not isinstance(item, dict) or item.get("pending") or not item.get("q_id"):
+                continue
+            row = {
+                "attempt_id": attempt["id"],
+                "q_id": item["q_id"],
+                "quiz_id": quiz.id,
+                "chapter_id": quiz.chapter_id,
+                "user_id": attempt["user_id"],
+                "topic": item.get("topic") or "general",
+                "score": float(item.get("score") or 0),
+                "max_score": float(item.get("max_score", 1) or 0),
+            }
+            if attempt.get("created_at") is not None:
+                row["created_at"] = attempt["created_at"]
+            rows.append(row)
+        return rows
+
+    def _item_columns(self) -> tuple:
+        return (
+            QuizAttemptItem.attempt_id,
+            QuizAttemptItem.q_id,
+            QuizAttemptItem.user_id,
+            QuizAttemptItem.topic,
+            QuizAttemptItem.score,
+            QuizAttemptItem.max_score,
+            QuizAttemptItem.created_at,
+        )
+
+    def _apply_deltas(self, db: Session, quiz: Quiz, items: Sequence, sign: int) -> None:
+        """Apply inserted (sign=1) or deleted (sign=-1) items to the derived stats"""
+        items = [item for item in items if item.max_score > 0]
+        if not items:
+            return
+        self._apply_topic_deltas(db, items, sign)
+        self._apply_question_deltas(db, quiz, items, sign)
+        self._mark_rollups_dirty(db, quiz, items)
+        if sign > 0:
+            self._add_chapter_users(db, quiz, items)
+
+    def _apply_topic_deltas(self, db: Session, items: Sequence, sign: int) -> None:
+        """Add (sign=1) or remove (sign=-1) items' contribution to user_topic_stats"""
+        # Per attempt first: weakness is decided per attempt and topic
+        per_attempt: Dict[tuple, List] = defaultdict(lambda: [0.0, 0, None])
+        for item in items:
+            entry = per_attempt[(item.attempt_id, item.user_id, item.topic)]
+            entry[0] += item.score / item.max_score
+            entry[1] += 1
+            if item.created_at is not None:
+                entry[2] = item.created_at if entry[2] is None else max(entry[2], item.created_at)
+
+        deltas: Dict[tuple, Dict[str, Any]] = {}
+        for (_, user_id, topic), (sum_score, count, created_at) in per_attempt.items():
+            delta = deltas.setdefault((user_id, topic), {
+                "user_id": user_id,
+                "topic": topic,
+                "sum_score": 0.0,
+                "count": 0,
+                "weak_count": 0,
+                "last_attempt_at": None,
+            })
+            delta["sum_score"] += sign * sum_score
+            delta["count"] += sign * count
+            delta["weak_count"] += sign * (sum_score / count < WEAK_TOPIC_THRESHOLD)
+            if sign > 0 and created_at is not None:
+                last = delta["last_attempt_at"]
+                delta["last_attempt_at"] = created_at if last is None else max(last, created_at)
+
+        if not deltas:
+            return
+
+        stmt = insert(UserTopicStat)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id", "topic"],
+                set_={
+                    "sum_score": UserTopicStat.sum_score + stmt.excluded.sum_score,
+                    "count": UserTopicStat.count + stmt.excluded.count,
+                    "weak_count": UserTopicStat.weak_count + stmt.excluded.weak_count,
+                    # GREATEST ignores NULL, so removals keep the timestamp
+                    "last_attempt_at": func.greatest(
+                        UserTopicStat.last_attempt_at, stmt.excluded.last_attempt_at
+                    ),
+                }
+            ),
+            # Fixed key order keeps concurrent upserts from deadlocking
+            [deltas[key] for key in sorted(deltas, key=lambda key: (str(key[0]), key[1]))]
+        )
+
+    def _apply_question_deltas(self, db: Session, quiz: Quiz, items: Sequence, sign: int) -> None:
+        """Add or remove items' score ratio moments in question_stats"""
+        questions = {
+            question.get("q_id"): question
+            for question in quiz.questions or []
+            if isinstance(question, dict)
+        }
+
+        deltas: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            ratio = item.score / item.max_score
+            delta = deltas.get(item.q_id)
+            if delta is None:
+                question_text = str(questions.get(item.q_id, {}).get("question") or "")
+                delta = deltas[item.q_id] = {
+                    "quiz_id": quiz.id,
+                    "q_id": item.q_id,
+                    "chapter_id": quiz.chapter_id,
+                    "topic": item.topic,
+                    "question_text": question_text[:QUESTION_SNIPPET_LENGTH] or None,
+                    "sum_score": 0.0,
+                    "sum_sq": 0.0,
+                    "count": 0,
+                }
+            delta["sum_score"] += sign * ratio
+            delta["sum_sq"] += sign * ratio * ratio
+            delta["count"] += sign
+
+        stmt = insert(QuestionStat)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["quiz_id", "q_id"],
+                set_={
+                    "sum_score": QuestionStat.sum_score + stmt.excluded.sum_score,
+                    "sum_sq": QuestionStat.sum_sq + stmt.excluded.sum_sq,
+                    "count": QuestionStat.count + stmt.excluded.count,
+                    # Follows answer key patches
+                    "topic": stmt.excluded.topic,
+                    "question_text": func.coalesce(
+                        stmt.excluded.question_text, QuestionStat.question_text
+                    ),
+                }
+            ),
+            [deltas[q_id] for q_id in sorted(deltas)]
+        )
+
+    def _mark_rollups_dirty(self, db: Session, quiz: Quiz, items: Sequence) -> None:
+        """Queue the hourly buckets these items fall in for the rollup job"""
+        buckets = sorted({
+            item.created_at.replace(minute=0, second=0, microsecond=0)
+            for item in items
+            if item.created_at is not None
+        })
+        if not buckets:
+            return
+
+        # A no-op update rather than DO NOTHING: it row-locks an already
+        # queued bucket, so the rollup's SKIP LOCKED claim leaves it queued
+        # until these items commit instead of rolling up the hour without them
+        stmt = insert(RollupQueueEntry)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["chapter_id", "bucket"],
+                set_={"bucket": stmt.excluded.bucket}
+            ),
+            [{"chapter_id": quiz.chapter_id, "bucket": bucket} for bucket in buckets]
+        )
+
+    def _add_chapter_users(self, db: Session, quiz: Quiz, items: Sequence) -> None:
+        """Merge the items' users into the chapter's distinct-user sketch"""
+        user_ids = {item.user_id for item in items}
+        stored = db.execute(
+            select(ChapterUserSketch.sketch).where(ChapterUserSketch.chapter_id == quiz.chapter_id)
+        ).scalar()
+
+        # Returning users leave every register as is: no write, no row lock
+        sketch = HyperLogLog.from_bytes(stored) if stored else HyperLogLog()
+        if not sketch.update(user_ids) and stored:
+            return
+
+        db.execute(
+            insert(ChapterUserSketch)
+            .values(chapter_id=quiz.chapter_id, sketch=b"")
+            .on_conflict_do_nothing(index_elements=["chapter_id"])
+        )
+        # Merge again under the row lock so concurrent writers don't lose registers
+        stored = db.execute(
+            select(ChapterUserSketch.sketch)
+            .where(ChapterUserSketch.chapter_id == quiz.chapter_id)
+            .with_for_update()
+        ).scalar()
+        sketch = HyperLogLog.from_bytes(stored) if stored else HyperLogLog()
+        sketch.update(user_ids)
+        db.execute(
+            update(ChapterUserSketch)
+            .where(ChapterUserSketch.chapter_id == quiz.chapter_id)
+            .values(sketch=sketch.to_bytes(), updated_at=func.now())
+        )
+
+    def enqueue_backfill(self) -> str:
+        """Enqueue a backfill of items for attempts stored before the table existed"""
+        return job_queue.enqueue(BACKFILL_JOB, {})
+
+    async def run_backfill_job(self, job_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Job handler: explode stored breakdowns into quiz_attempt_items
+
+        Keyset-paginated over completed attempts in batches of
+        ANALYTICS_BACKFILL_BATCH_SIZE, one commit per batch. Existing items
+        are kept (ON CONFLICT DO NOTHING), so the job is safe to re-run.
+        Derived stats are rebuilt at the end.
+        """
+        db = SessionLocal()
+        try:
+            processed = written = 0
+            last_id = None
+            while True:
+                query = db.query(QuizAttempt.id).filter(
+                    or_(
+                        QuizAttempt.grading_status.is_(None),
+                        QuizAttempt.grading_status == "completed"
+                    )
+                )
+                if last_id is not None:
+                    query = query.filter(QuizAttempt.id > last_id)
+                attempt_ids = [
+                    row.id for row in
+                    query.order_by(QuizAttempt.id).limit(settings.ANALYTICS_BACKFILL_BATCH_SIZE)
+                ]
+                if not attempt_ids:
+                    break
+
+                last_id = attempt_ids[-1]
+                result = db.execute(BACKFILL_ITEMS_SQL, {"attempt_ids": attempt_ids})
+                db.commit()
+                if result.rowcount:
+                    # Item-based analytics (windows, weak topics) changed for everyone
+                    event_bus.publish(ANALYTICS_REBUILT)
+
+                processed += len(attempt_ids)
+                written += max(result.rowcount, 0)
+                metrics.incr("attempt_items_backfilled", max(result.rowcount, 0))
+                job_queue.set_progress(job_id, {"processed": processed, "items_written": written})
+
+            logger.info(f"Attempt items backfill: {written} items from {processed} attempts")
+            self.rebuild(db)
+            return {"attempts_processed": processed, "items_written": written}
+        finally:
+            db.close()
+
+    def rebuild(self, db: Session) -> None:
+        """
+        Recompute derived stats tables from quiz_attempt_items and commit
+
+        Publishes ANALYTICS_REBUILT, which invalidates every cached
+        analytics response and ETag.
+        """
+        try:
+            for statement in REBUILD_STATS_SQL:
+                db.execute(statement)
+            self._rebuild_chapter_sketches(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        logger.info("Analytics stats rebuilt from quiz_attempt_items")
+        event_bus.publish(ANALYTICS_REBUILT)
+
+    def _rebuild_chapter_sketches(self, db: Session) -> None:
+        """Rebuild chapter_user_sketches from quiz_attempt_items, one chapter at a time"""
+        rows = db.execute(CHAPTER_USERS_SQL.execution_options(yield_per=10_000))
+        chapter_id, sketch = None, HyperLogLog()
+        sketches = []
+        for row in rows:
+            if row.chapter_id != chapter_id:
+                if chapter_id is not None:
+                    sketches.append({"chapter_id": chapter_id, "sketch": sketch.to_bytes()})
+                chapter_id, sketch = row.chapter_id, HyperLogLog()
+            sketch.add(row.user_id)
+        if chapter_id is not None:
+            sketches.append({"chapter_id": chapter_id, "sketch": sketch.to_bytes()})
+
+        if sketches:
+            db.execute(insert(ChapterUserSketch), sketches)
+
+    def enqueue_rebuild(self) -> str:
+        """Enqueue a rebuild of the derived stats tables"""
+        return job_queue.enqueue(REBUILD_JOB, {})
+
+    async def run_rebuild_job(self, job_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Job handler: rebuild derived stats tables from history"""
+        db = SessionLocal()
+        try:
+            self.rebuild(db)
+            return {
+                "rebuilt": ["user_topic_stats", "question_stats", "chapter_user_sketches"],
+                "rollups_queued": True
+            }
+        finally:
+            db.close()
+
+
+# Global instance
+attempt_stats = AttemptStatsService()
+job_queue.register(BACKFILL_JOB, attempt_stats.run_backfill_job)
+job_queue.register(REBUILD_JOB, attempt_stats.run_rebuild_job)
@@ -3,10 +3,16 @@ Gemini AI service for PDF processing, quiz generation, and grading
 """
 import google.generativeai as genai
 from app.config import settings
+import asyncio
+import functools
 import json
 import logging
-from typing import List, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, AsyncIterator
 import hashlib
+from app.utils.cache import cache_service
+from app.utils.file_handle_cache import FileHandleCache
+from app.utils.json_stream import JsonArrayStreamParser
 
 logger = logging.getLogger(__name__)
 
@@ -15,11 +21,57 @@ genai.configure(api_key=settings.GEMINI_API_KEY)
 
 
 class GeminiService:
-    """Service for all Gemini AI operations"""
+    """
+    Service for all Gemini AI operations
+    
+    The SDK calls are blocking, so every method has an ``*_async`` twin that
+    runs it on a dedicated, bounded thread pool. Route handlers must use the
+    async variants to keep the event loop free while Gemini is working.
+    """
     
     def __init__(self):
         self.model = genai.GenerativeModel('gemini-3-flash-preview')
         self.vision_model = genai.GenerativeModel('gemini-3-flash-preview')
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.GEMINI_MAX_WORKERS,
+            thread_name_prefix="gemini"
+        )
+        self._call_semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENT_CALLS)
+        self.file_cache = FileHandleCache(
+            redis_client=cache_service.redis_client,
+            fetch=genai.get_file,
+            ttl=settings.GEMINI_FILE_CACHE_TTL,
+            refresh_margin=settings.GEMINI_FILE_REFRESH_MARGIN
+        )
+    
+    async def _run_blocking(self, func, *args, **kwargs):
+        """
+        Run a blocking SDK call on the Gemini executor and await its result
+        
+        Concurrent calls are capped by GEMINI_MAX_CONCURRENT_CALLS; excess
+        callers wait here instead of piling up in the executor queue.
+        """
+        loop = asyncio.get_running_loop()
+        async with self._call_semaphore:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs)
+            )
+    
+    def shutdown(self):
+        """Release executor threads (called on application shutdown)"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    async def upload_and_index_pdf_async(self, file_path: str, display_name: str) -> Tuple[str, List[str]]:
+        """Non-blocking variant of upload_and_index_pdf()"""
+        return await self._run_blocking(self.upload_and_index_pdf, file_path, display_name)
+    
+    async def generate_quiz_async(self, **kwargs) -> List[Dict[str, Any]]:
+        """Non-blocking variant of generate_quiz(); accepts the same keyword arguments"""
+        return await self._run_blocking(self.generate_quiz, **kwargs)
+    
+    async def grade_answer_async(self, **kwargs) -> Tuple[float, str]:
+        """Non-blocking variant of grade_answer(); accepts the same keyword arguments"""
+        return await self._run_blocking(self.grade_answer, **kwargs)
     
     def upload_and_index_pdf(self, file_path: str, display_name: str) -> Tuple[str, List[str]]:
         """
@@ -36,6 +88,7 @@ class GeminiService:
             # Upload file to Gemini (synchronous in newer versions)
             uploaded_file = genai.upload_file(path=file_path, display_name=display_name)
             logger.info(f"Uploaded file to Gemini: {uploaded_file.name}")
+            self.file_cache.put(uploaded_file.name, uploaded_file)
             
             # Extract topics using Gemini Vision
             topics = self._extract_topics(uploaded_file)
@@ -100,8 +153,8 @@ class GeminiService:
             List of question dictionaries
         """
         try:
-            # Get the uploaded file
-            uploaded_file = genai.get_file(gemini_file_id)
+            # Get the uploaded file (cached handle; avoids a File API round trip)
+            uploaded_file = self.file_cache.get(gemini_file_id)
             
             # Create structured prompt
             prompt = self._create_quiz_prompt(
@@ -120,6 +173,62 @@ class GeminiService:
             logger.error(f"Failed to generate quiz: {str(e)}")
             raise
     
+    async def stream_quiz_questions(
+        self,
+        gemini_file_id: str,
+        chapter_title: str,
+        topics: List[str],
+        difficulty: str,
+        num_mcq: int,
+        num_short: int,
+        num_numerical: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate quiz questions, yielding each one as soon as Gemini has
+        streamed it completely
+        
+        Same arguments as generate_quiz(). Falls back to placeholder
+        questions if nothing parseable was streamed, including when the
+        stream fails before the first question; a failure after that is
+        raised.
+        """
+        uploaded_file = await self._run_blocking(self.file_cache.get, gemini_file_id)
+        
+        prompt = self._create_quiz_prompt(
+            chapter_title, topics, difficulty, num_mcq, num_short, num_numerical
+        )
+        
+        parser = JsonArrayStreamParser()
+        emitted = 0
+        
+        async with self._call_semaphore:
+            try:
+                response = await self.model.generate_content_async([uploaded_file, prompt], stream=True)
+                async for chunk in response:
+                    for question in parser.feed(self._chunk_text(chunk)):
+                        emitted += 1
+                        yield question
+            except Exception as e:
+                if emitted:
+                    # Questions already sent cannot be swapped for placeholders
+                    raise
+                logger.error(f"Quiz stream failed before any question: {str(e)}")
+        
+        total_expected = num_mcq + num_short + num_numerical
+        if emitted == 0:
+            logger.error("Streamed quiz response contained no parseable questions")
+            for question in self._create_fallback_questions(num_mcq, num_short, num_numerical):
+                yield question
+        elif emitted != total_expected:
+            logger.warning(f"Expected {total_expected} questions, got {emitted}")
+    
+    def _chunk_text(self, chunk) -> str:
+        """Text of a streamed chunk; empty for chunks without text parts (safety block, finish only)"""
+        try:
+            return chunk.text
+        except ValueError:
+            return ""
+    
     def _create_quiz_prompt(
         self,
         chapter_title: str,
@@ -231,7 +340,8 @@ Ensure questions are directly from chapter content and test real understanding.
                 "options": ["Option A", "Option B", "Option C", "Option D"],
                 "correct_answer": 0,
                 "topic": "general",
-                "points": 1.0
+                "points": 1.0,
+                "fallback": True
             })
         
         for i in range(num_short):
@@ -241,7 +351,8 @@ Ensure questions are directly from chapter content and test real understanding.
                 "question": f"Sample short answer question {i+1}",
                 "correct_answer": "Sample answer",
                 "topic": "general",
-                "points": 2.0
+                "points": 2.0,
+                "fallback": True
             })
         
         for i in range(num_numerical):
@@ -251,7 +362,8 @@ Ensure questions are directly from chapter content and test real understanding.
                 "question": f"Sample numerical problem {i+1}",
                 "correct_answer": "0",
                 "topic": "general",
-                "points": 3.0
+                "points": 3.0,
+                "fallback": True
             })
         
         return questions
@@ -263,7 +375,8 @@ Ensure questions are directly from chapter content and test real understanding.
         correct_answer: str,
         user_answer: str,
         question_type: str,
-        topic: str
+        topic: str,
+        raise_errors: bool = False
     ) -> Tuple[float, str]:
         """
         Grade a subjective answer using Gemini with chapter context
@@ -275,12 +388,14 @@ Ensure questions are directly from chapter content and test real understanding.
             user_answer: Student's answer
             question_type: short or numerical
             topic: Question topic
+            raise_errors: Re-raise failures instead of returning the
+                simple-match fallback (lets callers tell model grades apart)
             
         Returns:
             Tuple of (score, feedback)
         """
         try:
-            uploaded_file = genai.get_file(gemini_file_id)
+            uploaded_file = self.file_cache.get(gemini_file_id)
             
             prompt = f"""
 You are grading a student's answer for this question from the chapter.
@@ -324,12 +439,100 @@ Return ONLY valid JSON (no markdown):
             
         except Exception as e:
             logger.error(f"Failed to grade answer: {str(e)}")
+            if raise_errors:
+                raise
             # Fallback to simple matching
             if user_answer.lower().strip() == correct_answer.lower().strip():
                 return 1.0, "Correct answer"
             else:
                 return 0.5, "Partial credit - please review the concept"
 
+    
+    def grade_answers_batch(
+        self,
+        gemini_file_id: str,
+        items: List[Dict[str, Any]]
+    ) -> Dict[str, Tuple[float, str]]:
+        """
+        Grade several subjective answers in a single model call
+        
+        Args:
+            gemini_file_id: Reference to chapter PDF
+            items: Dicts with q_id, question, correct_answer, user_answer,
+                question_type and topic (q_id must be unique in the batch)
+            
+        Returns:
+            {q_id: (score, feedback)} for every item that parsed cleanly;
+            items missing from the result must be graded individually
+            
+        Raises:
+            Exception: if the call fails or the response is not a JSON list
+        """
+        uploaded_file = self.file_cache.get(gemini_file_id)
+        
+        answers_block = "\n\n".join(
+            f"""### {item['q_id']} ({item['question_type']}, topic: {item['topic']})
+**Question:** {item['question']}
+**Expected Answer:** {item['correct_answer']}
+**Student's Answer:** {item['user_answer']}"""
+            for item in items
+        )
+        
+        prompt = f"""
+You are grading a student's answers for questions from the chapter.
+
+{answers_block}
+
+Grade EACH answer independently on a scale of 0.0 to 1.0 based on:
+1. Correctness of key concepts
+2. Completeness
+3. Understanding demonstrated
+
+For numerical answers, allow ±2% tolerance for rounding.
+
+Return ONLY a valid JSON array (no markdown) with one entry per question id:
+[
+  {{"q_id": "{items[0]['q_id']}", "score": 0.85, "feedback": "Good understanding of main concept. Missing minor detail about..."}}
+]
+"""
+        
+        response = self.model.generate_content([uploaded_file, prompt])
+        
+        result_text = response.text.strip()
+        if result_text.startswith("```json"):
+            result_text = result_text[7:-3].strip()
+        elif result_text.startswith("```"):
+            result_text = result_text[3:-3].strip()
+        
+        parsed = json.loads(result_text)
+        if not isinstance(parsed, list):
+            raise ValueError("Batch grading response is not a list")
+        
+        expected_ids = {item["q_id"] for item in items}
+        results = {}
+        for entry in parsed:
+            try:
+                q_id = str(entry["q_id"])
+                if q_id not in expected_ids:
+                    continue
+                score = max(0.0, min(1.0, float(entry["score"])))
+                results[q_id] = (score, entry.get("feedback") or "No feedback provided")
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping unparseable batch grading entry: {str(e)}")
+        
+        if len(results) < len(items):
+            logger.warning(f"Batch grading parsed {len(results)}/{len(items)} answers")
+        
+        return results
+    
+    async def grade_answers_batch_async(
+        self,
+        gemini_file_id: str,
+        items: List[Dict[str, Any]]
+    ) -> Dict[str, Tuple[float, str]]:
+        """Non-blocking variant of grade_answers_batch()"""
+        return await self._run_blocking(self.grade_answers_batch, gemini_file_id, items)
+
 
 # Global instance
 gemini_service = GeminiService()
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+Compiled grading plans: per-quiz answer keys parsed once and cached by quiz id
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from app.config import settings
+from app.services.numeric_engine import numeric_engine, Quantity
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionPlan:
+    """Typed, pre-parsed grading record for one question"""
+
+    __slots__ = (
+        "question", "q_id", "q_type", "topic", "points", "correct_answer",
+        "mcq_index", "mcq_text", "numeric_target", "lower", "upper",
+        "keywords", "model_answer",
+    )
+
+    def __init__(self, question: Dict[str, Any]):
+        self.question = question  # Raw question dict (prompt text, options, ...)
+        self.q_id = question["q_id"]
+        self.q_type = question["type"]
+        self.topic = question.get("topic", "general")
+        self.points = question.get("points", 1.0)
+        self.correct_answer = question.get("correct_answer")
+
+        # MCQ: answer key index and the text shown in feedback
+        self.mcq_index = None
+        self.mcq_text = "Unknown"
+        if self.q_type == "mcq" and isinstance(self.correct_answer, int):
+            self.mcq_index = self.correct_answer
+            options = question.get("options") or []
+            if 0 <= self.mcq_index < len(options):
+                self.mcq_text = options[self.mcq_index]
+
+        # Numerical: parsed target and its tolerance interval
+        self.numeric_target: Optional[Quantity] = None
+        self.lower = self.upper = None
+        if self.q_type == "numerical":
+            self.numeric_target = numeric_engine.parse(self.correct_answer)
+            if self.numeric_target is not None:
+                value = self.numeric_target.value
+                margin = max(
+                    settings.NUMERICAL_ABS_TOLERANCE,
+                    settings.NUMERICAL_REL_TOLERANCE * abs(value)
+                )
+                self.lower, self.upper = value - margin, value + margin
+
+        # Fallback keyword set (used if Gemini fails)
+        self.keywords: FrozenSet[str] = frozenset(
+            word for word in str(self.correct_answer or "").lower().split() if len(word) > 3
+        )
+
+        # Expected answer as sent to the model (numerical keys normalized to float)
+        model_answer = question.get("correct_answer", "")
+        if self.q_type == "numerical":
+            try:
+                model_answer = float(model_answer)
+            except (ValueError, TypeError):
+                pass
+        self.model_answer = str(model_answer)
+
+
+class GradingPlan:
+    """Compiled answer key of a quiz"""
+
+    __slots__ = ("quiz_id", "version", "questions", "total_points")
+
+    def __init__(self, quiz_id: Any, questions: List[Dict[str, Any]], version: Optional[int] = None):
+        self.quiz_id = quiz_id
+        self.version = version  # Quiz.key_version the plan was compiled from
+        self.questions: Tuple[QuestionPlan, ...] = tuple(QuestionPlan(q) for q in questions)
+        self.total_points = sum(q.points for q in self.questions)
+
+
+class GradingPlanCache:
+    """
+    In-process LRU of compiled grading plans keyed by quiz id
+
+    A plan is valid until the quiz's answer key is patched: callers pass
+    Quiz.key_version, and a plan compiled from an older version is rebuilt,
+    so every worker picks up a patch without cross-process invalidation.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._plans: "OrderedDict[str, GradingPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        metrics.register_hit_rate("grading_plan_cache")
+
+    def get(self, quiz_id: Any, questions: List[Dict[str, Any]], version: Optional[int] = None) -> GradingPlan:
+        """Return the plan for a quiz, compiling it on first use or after a key patch"""
+        key = str(quiz_id)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None and plan.version == version:
+                self._plans.move_to_end(key)
+                metrics.incr("grading_plan_cache_hits")
+                return plan
+
+        metrics.incr("grading_plan_cache_misses")
+        plan = GradingPlan(quiz_id, questions, version)
+
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    def invalidate(self, quiz_id: Any) -> None:
+        """Drop a plan after the quiz's questions changed (this process only)"""
+        with self._lock:
+            self._plans.pop(str(quiz_id), None)
+
+
+# Global instance
+grading_plans = GradingPlanCache(max_size=settings.GRADING_PLAN_CACHE_SIZE)
@@ -3,13 +3,23 @@ Quiz grading service with hybrid approach
 MCQ: Exact match
 Short/Numerical: Semantic grading via Gemini
 """
+import asyncio
 import logging
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+from app.config import settings
 from app.services.gemini_service import gemini_service
-from collections import Counter
+from app.services.grading_plan import GradingPlan, QuestionPlan
+from app.services.lexical_grader import lexical_grader
+from app.services.numeric_engine import numeric_engine
+from app.utils.fair_scheduler import grading_scheduler
+from app.utils.grading_cache import grading_cache
+from app.utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# (score 0.0-1.0, feedback, is_correct)
+GradeResult = Tuple[float, str, bool]
+
 
 class GradingService:
     """
@@ -17,17 +27,29 @@ class GradingService:
     
     Strategy:
     - MCQ: Exact match (deterministic, fast)
-    - Short Answer: Gemini semantic grading (context-aware)
-    - Numerical: Tolerance matching + Gemini fallback
+    - Short Answer: Lexical pre-grader for clear accepts/rejects,
+      Gemini semantic grading (context-aware) for the rest
+    - Numerical: Local numeric engine (tolerance, units, sig figs);
+      Gemini only for ambiguous answers
+    
+    All answers needing Gemini in one submission are graded with a single
+    batch call; only items the batch fails to return are graded one by one.
+    
+    Model calls are admitted by the fair grading scheduler (per-user
+    fairness, interactive work before bulk and regrades).
+    
+    Deterministic grading works from a compiled GradingPlan (answer keys,
+    numeric targets and keyword sets parsed once per quiz).
     """
     
-    NUMERICAL_TOLERANCE = 0.02  # ±2%
+    NUMERICAL_TOLERANCE = settings.NUMERICAL_REL_TOLERANCE  # ±2%
     
     async def grade_quiz(
         self,
         questions: List[Dict[str, Any]],
         answers: Dict[str, Any],
-        gemini_file_id: str
+        gemini_file_id: str,
+        plan: Optional[GradingPlan] = None
     ) -> Tuple[float, List[Dict[str, Any]], List[str], str]:
         """
         Grade a complete quiz submission
@@ -36,43 +58,181 @@ class GradingService:
             questions: List of question dictionaries
             answers: User's answers {q_id: answer}
             gemini_file_id: Reference to chapter PDF
+            plan: Cached compiled plan of the quiz (compiled here if omitted)
             
         Returns:
             Tuple of (total_score, breakdown, weak_topics, feedback)
         """
+        plan = plan or GradingPlan(None, questions)
+        
+        # Pass 1: grade everything that does not need the model
+        results = self.grade_objective(plan, answers)
+        
+        # Pass 2: subjective answers go to the model (batched when possible)
+        await self.grade_pending(plan, answers, results, gemini_file_id)
+        
+        total_score, breakdown, weak_topics, feedback = self.summarize(plan, answers, results)
+        
+        logger.info(f"Quiz graded: {total_score:.2f}/{plan.total_points:.2f}, weak topics: {weak_topics}")
+        
+        return total_score, breakdown, weak_topics, feedback
+    
+    async def grade_submissions(
+        self,
+        plan: GradingPlan,
+        answer_sets: List[Dict[str, Any]],
+        gemini_file_id: str
+    ) -> List[Tuple[float, List[Dict[str, Any]], List[str], str]]:
+        """
+        Grade many submissions of the same quiz together
+        
+        Subjective answers from all submissions go through one model pass,
+        so identical normalized answers to a question are graded once and
+        the unique ones are batched.
         
+        Args:
+            plan: Compiled grading plan of the quiz
+            answer_sets: One {q_id: answer} dict per submission
+            gemini_file_id: Reference to chapter PDF
+            
+        Returns:
+            (total_score, breakdown, weak_topics, feedback) per submission, in order
+        """
+        all_results = [self.grade_objective(plan, answers) for answers in answer_sets]
+        
+        pending = [
+            (submission, index)
+            for submission, results in enumerate(all_results)
+            for index, result in enumerate(results)
+            if result is None
+        ]
+        if pending:
+            graded = await self._grade_with_model(
+                [
+                    (plan.questions[index], answer_sets[submission].get(plan.questions[index].q_id))
+                    for submission, index in pending
+                ],
+                gemini_file_id
+            )
+            for (submission, index), result in zip(pending, graded):
+                all_results[submission][index] = result
+        
+        logger.info(
+            f"Bulk graded {len(answer_sets)} submissions, {len(pending)} answers needed the model"
+        )
+        
+        return [
+            self.summarize(plan, answers, results)
+            for answers, results in zip(answer_sets, all_results)
+        ]
+    
+    async def grade_question(
+        self,
+        question: QuestionPlan,
+        user_answers: List[Any],
+        gemini_file_id: str
+    ) -> List[GradeResult]:
+        """
+        Grade one question across many attempts (used by regrades)
+        
+        The whole column goes through the local graders first; only the
+        answers they cannot decide are sent to the model, deduplicated.
+        
+        Returns:
+            GradeResult per answer, in order
+        """
+        results = [self._grade_locally(question, answer) for answer in user_answers]
+        
+        pending = [index for index, result in enumerate(results) if result is None]
+        if pending:
+            graded = await self._grade_with_model(
+                [(question, user_answers[index]) for index in pending],
+                gemini_file_id
+            )
+            for index, result in zip(pending, graded):
+                results[index] = result
+        
+        return results
+    
+    def grade_objective(
+        self,
+        plan: GradingPlan,
+        answers: Dict[str, Any]
+    ) -> List[Optional[GradeResult]]:
+        """
+        Grade every answer that does not need the model (MCQ, clear-cut
+        numerical and short answers)
+        
+        Returns:
+            GradeResult per question, None where semantic grading is pending
+        """
+        return [
+            self._grade_locally(question, answers.get(question.q_id))
+            for question in plan.questions
+        ]
+    
+    async def grade_pending(
+        self,
+        plan: GradingPlan,
+        answers: Dict[str, Any],
+        results: List[Optional[GradeResult]],
+        gemini_file_id: str
+    ) -> None:
+        """Fill in the pending (None) entries of `results` with model grades, in place"""
+        pending = [index for index, result in enumerate(results) if result is None]
+        if not pending:
+            return
+        
+        graded = await self._grade_with_model(
+            [(plan.questions[i], answers.get(plan.questions[i].q_id)) for i in pending],
+            gemini_file_id
+        )
+        for index, result in zip(pending, graded):
+            results[index] = result
+    
+    def summarize(
+        self,
+        plan: GradingPlan,
+        answers: Dict[str, Any],
+        results: List[Optional[GradeResult]]
+    ) -> Tuple[float, List[Dict[str, Any]], List[str], str]:
+        """
+        Build the score breakdown from per-question results
+        
+        Pending (None) results score 0 for now, are flagged `pending` in the
+        breakdown and are left out of weak-topic detection and feedback.
+        
+        Returns:
+            Tuple of (total_score, breakdown, weak_topics, feedback)
+        """
         breakdown = []
         total_score = 0.0
-        max_score = 0.0
         topic_performance = {}  # {topic: [scores]}
         
-        for question in questions:
-            q_id = question["q_id"]
-            q_type = question["type"]
-            topic = question.get("topic", "general")
-            points = question.get("points", 1.0)
+        for question, result in zip(plan.questions, results):
+            q_id = question.q_id
+            topic = question.topic
+            points = question.points
             
-            # Get user's answer
-            user_answer = answers.get(q_id)
+            if result is None:
+                breakdown.append({
+                    "q_id": q_id,
+                    "user_answer": answers.get(q_id),
+                    "correct_answer": question.correct_answer,
+                    "score": 0.0,
+                    "max_score": points,
+                    "feedback": "Grading in progress",
+                    "is_correct": False,
+                    "topic": topic,
+                    "pending": True
+                })
+                continue
             
-            # Grade based on type
-            if q_type == "mcq":
-                score, feedback, is_correct = self._grade_mcq(question, user_answer)
-            elif q_type == "short":
-                score, feedback, is_correct = await self._grade_short_answer(
-                    question, user_answer, gemini_file_id
-                )
-            elif q_type == "numerical":
-                score, feedback, is_correct = await self._grade_numerical(
-                    question, user_answer, gemini_file_id
-                )
-            else:
-                score, feedback, is_correct = 0.0, "Unknown question type", False
+            score, feedback, is_correct = result
             
             # Calculate weighted score
             weighted_score = score * points
             total_score += weighted_score
-            max_score += points
             
             # Track topic performance
             if topic not in topic_performance:
@@ -82,8 +242,8 @@ class GradingService:
             # Add to breakdown
             breakdown.append({
                 "q_id": q_id,
-                "user_answer": user_answer,
-                "correct_answer": question.get("correct_answer"),
+                "user_answer": answers.get(q_id),
+                "correct_answer": question.correct_answer,
                 "score": weighted_score,
                 "max_score": points,
                 "feedback": feedback,
@@ -98,145 +258,299 @@ class GradingService:
         ]
         
         # Generate overall feedback
-        feedback = self._generate_feedback(total_score, max_score, weak_topics, breakdown)
-        
-        logger.info(f"Quiz graded: {total_score:.2f}/{max_score:.2f}, weak topics: {weak_topics}")
+        graded = [item for item in breakdown if not item.get("pending")]
+        feedback = self._generate_feedback(
+            total_score,
+            sum(item["max_score"] for item in graded),
+            weak_topics,
+            graded
+        )
         
         return total_score, breakdown, weak_topics, feedback
     
+    def _grade_locally(self, question: QuestionPlan, user_answer: Any) -> Optional[GradeResult]:
+        """
+        Grade without the model where possible
+        
+        Returns:
+            (score, feedback, is_correct), or None if the answer needs
+            semantic grading
+        """
+        q_type = question.q_type
+        
+        if q_type == "mcq":
+            return self._grade_mcq(question, user_answer)
+        elif q_type == "short":
+            if not user_answer or not str(user_answer).strip():
+                return 0.0, "No answer provided", False
+            if settings.LEXICAL_PREGRADE_ENABLED:
+                return lexical_grader.grade(question.question, user_answer)
+            return None
+        elif q_type == "numerical":
+            return self._grade_numerical_locally(question, user_answer)
+        else:
+            return 0.0, "Unknown question type", False
+    
     def _grade_mcq(
         self,
-        question: Dict[str, Any],
+        question: QuestionPlan,
         user_answer: Any
     ) -> Tuple[float, str, bool]:
         """
         Grade MCQ with exact match
         
         Args:
-            question: Question dictionary
+            question: Compiled question
             user_answer: User's answer (index or letter)
             
         Returns:
             Tuple of (score, feedback, is_correct)
         """
-        correct_answer = question.get("correct_answer")
-        
         # Handle different answer formats
         if isinstance(user_answer, str) and user_answer.upper() in ['A', 'B', 'C', 'D']:
             # Convert letter to index
             user_answer = ord(user_answer.upper()) - ord('A')
         
         # Exact match
-        if user_answer == correct_answer:
+        if user_answer == question.correct_answer:
             return 1.0, "Correct!", True
         else:
-            options = question.get("options", [])
-            correct_text = options[correct_answer] if 0 <= correct_answer < len(options) else "Unknown"
-            return 0.0, f"Incorrect. Correct answer: {correct_text}", False
+            return 0.0, f"Incorrect. Correct answer: {question.mcq_text}", False
     
-    async def _grade_short_answer(
+    def _grade_numerical_locally(
         self,
-        question: Dict[str, Any],
-        user_answer: str,
-        gemini_file_id: str
-    ) -> Tuple[float, str, bool]:
+        question: QuestionPlan,
+        user_answer: Any
+    ) -> Optional[GradeResult]:
         """
-        Grade short answer using Gemini semantic grading
+        Grade numerical answer with the local numeric engine
+        
+        Handles fractions, scientific notation, units, radicals and
+        constants, with relative/absolute tolerance and sig-fig rounding.
+        The target value and tolerance interval come pre-parsed from the plan.
         
         Args:
-            question: Question dictionary
-            user_answer: User's text answer
-            gemini_file_id: Chapter PDF reference
+            question: Compiled question
+            user_answer: User's numerical answer
             
         Returns:
-            Tuple of (score, feedback, is_correct)
+            Tuple of (score, feedback, is_correct), or None when the case is
+            ambiguous (unparseable, unit mismatch, near miss) and Gemini
+            should decide
         """
-        if not user_answer or not user_answer.strip():
+        if user_answer is None or str(user_answer).strip() == "":
             return 0.0, "No answer provided", False
         
-        try:
-            score, feedback = gemini_service.grade_answer(
-                gemini_file_id=gemini_file_id,
-                question=question["question"],
-                correct_answer=question.get("correct_answer", ""),
-                user_answer=user_answer,
-                question_type="short",
-                topic=question.get("topic", "general")
-            )
-            
-            is_correct = score >= 0.7
-            
-            return score, feedback, is_correct
+        correct_answer = question.correct_answer
+        target = question.numeric_target
+        answer = numeric_engine.parse(user_answer) if target is not None else None
+        
+        if target is None or answer is None:
+            metrics.incr("numerical_graded_by_model")
+            return None
+        
+        # Fast path: same unit and inside the precomputed tolerance interval
+        if answer.dimension == target.dimension and question.lower <= answer.value <= question.upper:
+            metrics.incr("numerical_graded_locally")
+            return 1.0, f"Correct! (Answer: {correct_answer})", True
+        
+        verdict, relative_error = numeric_engine.compare(
+            target,
+            answer,
+            rel_tol=self.NUMERICAL_TOLERANCE,
+            abs_tol=settings.NUMERICAL_ABS_TOLERANCE,
+            min_sig_figs=settings.NUMERICAL_MIN_SIG_FIGS
+        )
+        
+        if verdict:
+            metrics.incr("numerical_graded_locally")
+            return 1.0, f"Correct! (Answer: {correct_answer})", True
+        
+        if verdict is False and relative_error > settings.NUMERICAL_REVIEW_BAND:
+            metrics.incr("numerical_graded_locally")
+            return 0.0, f"Incorrect. Expected: {correct_answer}", False
+        
+        # Near miss or unit ambiguity: Gemini checks for alternative methods
+        metrics.incr("numerical_graded_by_model")
+        return None
+    
+    def _model_request(self, question: QuestionPlan, user_answer: Any) -> Dict[str, Any]:
+        """Build grade_answer() arguments for a question"""
+        return {
+            "question": question.question["question"],
+            "correct_answer": question.model_answer,
+            "user_answer": str(user_answer),
+            "question_type": question.q_type,
+            "topic": question.topic,
+        }
+    
+    async def _grade_with_model(
+        self,
+        items: List[Tuple[QuestionPlan, Any]],
+        gemini_file_id: str
+    ) -> List[GradeResult]:
+        """
+        Semantically grade (question, user_answer) pairs
+        
+        Answers already graded before (same question, key and normalized
+        answer) come from the grading cache; identical answers within the
+        call are graded once.
+        
+        Returns:
+            (score, feedback, is_correct) per item, in input order
+        """
+        keys = [
+            grading_cache.make_key(question.question["question"], question.model_answer, user_answer)
+            for question, user_answer in items
+        ]
+        
+        results: List[Optional[GradeResult]] = [None] * len(items)
+        misses: Dict[str, List[int]] = {}  # {cache key: item indices}
+        
+        for index, key in enumerate(keys):
+            if key in misses:
+                misses[key].append(index)
+                continue
             
+            cached = grading_cache.get(key)
+            if cached:
+                score, feedback = cached
+                results[index] = (score, feedback, score >= 0.7)
+            else:
+                misses[key] = [index]
+        
+        if misses:
+            graded = await self._grade_uncached(
+                [items[indices[0]] for indices in misses.values()],
+                list(misses.keys()),
+                gemini_file_id
+            )
+            for indices, result in zip(misses.values(), graded):
+                for index in indices:
+                    results[index] = result
+        
+        return results
+    
+    async def _grade_uncached(
+        self,
+        items: List[Tuple[QuestionPlan, Any]],
+        keys: List[str],
+        gemini_file_id: str
+    ) -> List[GradeResult]:
+        """
+        Grade answers with Gemini and memoize successful model grades
+        
+        All items are sent in one batch call first; items the batch did not
+        return cleanly are graded individually and concurrently.
+        """
+        # Batch entries are keyed by q_id (suffixed when a q_id repeats)
+        item_ids = [question.q_id for question, _ in items]
+        if len(set(item_ids)) != len(item_ids):
+            item_ids = [f"{q_id}#{i}" for i, q_id in enumerate(item_ids)]
+        
+        batch_results = {}
+        if settings.GRADING_BATCH_ENABLED and len(items) > 1:
+            batch_items = [
+                {"q_id": item_id, **self._model_request(question, user_answer)}
+                for item_id, (question, user_answer) in zip(item_ids, items)
+            ]
+            # Large sets (bulk submissions) are split into concurrent batch calls
+            size = settings.GRADING_BATCH_MAX_ITEMS
+            responses = await asyncio.gather(*(
+                self._grade_batch(gemini_file_id, batch_items[start:start + size])
+                for start in range(0, len(batch_items), size)
+            ))
+            for response in responses:
+                batch_results.update(response)
+        
+        results: List[Optional[GradeResult]] = []
+        fallbacks = []
+        for index, (item_id, key) in enumerate(zip(item_ids, keys)):
+            if item_id in batch_results:
+                score, feedback = batch_results[item_id]
+                grading_cache.set(key, score, feedback)
+                results.append((score, feedback, score >= 0.7))
+            else:
+                results.append(None)
+                fallbacks.append(index)
+        
+        # Individual calls run concurrently (bounded by GEMINI_MAX_CONCURRENT_CALLS)
+        graded = await asyncio.gather(*(
+            self._grade_single(items[index][0], items[index][1], keys[index], gemini_file_id)
+            for index in fallbacks
+        ))
+        for index, result in zip(fallbacks, graded):
+            results[index] = result
+        
+        return results
+    
+    async def _grade_batch(
+        self,
+        gemini_file_id: str,
+        batch_items: List[Dict[str, Any]]
+    ) -> Dict[str, Tuple[float, str]]:
+        """One batch grading call; an empty result sends its items to individual grading"""
+        try:
+            async with grading_scheduler.slot(cost=len(batch_items)):
+                return await gemini_service.grade_answers_batch_async(gemini_file_id, batch_items)
         except Exception as e:
-            logger.error(f"Semantic grading failed: {str(e)}")
-            # Fallback to keyword matching
-            return self._fallback_keyword_grading(question, user_answer)
+            logger.error(f"Batch grading failed, grading individually: {str(e)}")
+            return {}
     
-    async def _grade_numerical(
+    async def _grade_single(
         self,
-        question: Dict[str, Any],
+        question: QuestionPlan,
         user_answer: Any,
+        cache_key: str,
         gemini_file_id: str
-    ) -> Tuple[float, str, bool]:
+    ) -> GradeResult:
         """
-        Grade numerical answer with tolerance
+        Grade one answer using Gemini semantic grading
         
         Args:
-            question: Question dictionary
-            user_answer: User's numerical answer
+            question: Compiled question
+            user_answer: User's answer
+            cache_key: Grading cache key for a successful model grade
             gemini_file_id: Chapter PDF reference
             
         Returns:
             Tuple of (score, feedback, is_correct)
         """
-        if user_answer is None or str(user_answer).strip() == "":
-            return 0.0, "No answer provided", False
-        
         try:
-            # Parse correct answer
-            correct_answer = float(question.get("correct_answer", 0))
-            user_answer_float = float(user_answer)
-            
-            # Calculate tolerance range
-            tolerance = abs(correct_answer * self.NUMERICAL_TOLERANCE)
-            lower_bound = correct_answer - tolerance
-            upper_bound = correct_answer + tolerance
-            
-            # Check if within tolerance
-            if lower_bound <= user_answer_float <= upper_bound:
-                return 1.0, f"Correct! (Answer: {correct_answer})", True
-            else:
-                # Outside tolerance - use Gemini for alternative methods
-                score, feedback = gemini_service.grade_answer(
+            async with grading_scheduler.slot():
+                score, feedback = await gemini_service.grade_answer_async(
                     gemini_file_id=gemini_file_id,
-                    question=question["question"],
-                    correct_answer=str(correct_answer),
-                    user_answer=str(user_answer),
-                    question_type="numerical",
-                    topic=question.get("topic", "general")
+                    raise_errors=True,
+                    **self._model_request(question, user_answer)
                 )
-                
-                is_correct = score >= 0.7
-                return score, feedback, is_correct
-                
-        except (ValueError, TypeError) as e:
-            logger.error(f"Failed to parse numerical answer: {str(e)}")
-            return 0.0, f"Invalid numerical format. Expected: {question.get('correct_answer')}", False
+            grading_cache.set(cache_key, score, feedback)
+            
+            is_correct = score >= 0.7
+            
+            return score, feedback, is_correct
+            
+        except Exception as e:
+            logger.error(f"Semantic grading failed: {str(e)}")
+            if question.q_type == "short":
+                # Fallback to keyword matching
+                return self._fallback_keyword_grading(question, str(user_answer))
+            # Fallback to simple matching
+            if str(user_answer).strip().lower() == question.model_answer.strip().lower():
+                return 1.0, "Correct answer", True
+            return 0.5, "Partial credit - please review the concept", False
     
     def _fallback_keyword_grading(
         self,
-        question: Dict[str, Any],
+        question: QuestionPlan,
         user_answer: str
     ) -> Tuple[float, str, bool]:
         """
         Fallback keyword-based grading if Gemini fails
         """
-        correct_answer = question.get("correct_answer", "").lower()
         user_answer_lower = user_answer.lower()
         
-        # Extract keywords from correct answer
-        keywords = set(word for word in correct_answer.split() if len(word) > 3)
+        # Keywords of the correct answer (precompiled in the plan)
+        keywords = question.keywords
         
         # Count matching keywords
         matches = sum(1 for keyword in keywords if keyword in user_answer_lower)
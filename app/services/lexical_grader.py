@@ -0,0 +1,225 @@
+"""
+Lexical pre-grader for short answers
+Scores answers locally so only the uncertain middle band reaches Gemini
+"""
+import logging
+import math
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = frozenset("""
+a an the and or but if then than so of to in on at by for with from into onto about as is are was
+were be been being it its this that these those there their they them he she his her we our you
+your i me my do does did done has have had having can could should would will shall may might must
+yes also which who whom what when where why how all any some such each very just only more
+most other same both either because while during over under again further once here
+""".split())
+
+# Kept as tokens: dropping them would make "is not reflected" match "is reflected"
+NEGATIONS = frozenset(("not", "no", "never", "neither", "nor", "none", "nothing", "cannot"))
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+CONTRACTED_NOT = re.compile(r"n['\u2019]t\b")
+KEY_POINT_SPLIT = re.compile(r"[.;:\n]+(?!\d)|,\s+|\band\b")
+SUFFIXES = ("ations", "ation", "ings", "ing", "ies", "ied", "ed", "es", "ly", "s")
+
+FUZZY_MIN_LENGTH = 5  # Only longer words are typo-matched ("mass" vs "mars" is not a typo)
+FUZZY_RATIO = 0.85
+FUZZY_STOPWORDS = tuple(word for word in STOPWORDS if len(word) >= FUZZY_MIN_LENGTH)
+
+
+def _stem(token: str) -> str:
+    """Very light suffix stripping so 'reflected'/'reflection'/'reflects' align"""
+    for suffix in SUFFIXES:
+        if len(token) > len(suffix) + 3 and token.endswith(suffix):
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: Any) -> List[str]:
+    """Lowercased, stemmed content tokens (stopwords dropped)"""
+    normalized = unicodedata.normalize("NFKC", str(text)).lower()
+    normalized = CONTRACTED_NOT.sub(" not", normalized)
+    return [_stem(token) for token in TOKEN_PATTERN.findall(normalized) if token not in STOPWORDS]
+
+
+@lru_cache(maxsize=2048)
+def _analyze_reference(correct_answer: str) -> Tuple[Tuple[Tuple[str, ...], ...], Dict[str, float]]:
+    """
+    Split a reference answer into key points and weight its terms
+
+    Weights are BM25-style IDF over the key points, so a term repeated in
+    every key point (e.g. the subject of the sentence) counts for less than
+    the term that distinguishes a point.
+    """
+    points = []
+    for fragment in KEY_POINT_SPLIT.split(correct_answer):
+        tokens = tuple(dict.fromkeys(tokenize(fragment)))
+        if tokens:
+            points.append(tokens)
+
+    if not points:
+        return (), {}
+
+    document_frequency: Dict[str, int] = {}
+    for tokens in points:
+        for token in tokens:
+            document_frequency[token] = document_frequency.get(token, 0) + 1
+
+    total = len(points)
+    weights = {
+        token: math.log(1 + (total - df + 0.5) / (df + 0.5))
+        for token, df in document_frequency.items()
+    }
+    return tuple(points), weights
+
+
+class LexicalGrader:
+    """
+    Fast local similarity scorer for short answers, run before Gemini
+
+    - Near-verbatim answers are accepted: the content words, in order,
+      match the reference's (SequenceMatcher >= accept threshold), with
+      no content word the reference lacks and the same negations
+    - Answers sharing no content words with the reference or the
+      question (off-topic, "idk") are rejected
+    - Everything in between returns None and goes to the model, including
+      negated, reordered or keyword-stuffed answers that cover the
+      reference's terms
+
+    Token matching is exact after light stemming, or fuzzy
+    (SequenceMatcher >= FUZZY_RATIO) for longer words to tolerate typos.
+    """
+
+    def __init__(self, accept_threshold: float, reject_threshold: float):
+        self.accept_threshold = accept_threshold
+        self.reject_threshold = reject_threshold
+
+        metrics.set_gauge("lexical_accept_threshold", accept_threshold)
+        metrics.set_gauge("lexical_reject_threshold", reject_threshold)
+        metrics.register_hit_rate(
+            "lexical", hit="decided", miss="uncertain", name="lexical_model_calls_avoided_rate"
+        )
+
+    def score(self, correct_answer: Any, user_answer: Any) -> Optional[float]:
+        """
+        Weighted coverage (0.0-1.0) of the reference key points by the answer
+
+        Each key point is scored by the IDF-weighted share of its terms the
+        answer contains; the result is the mean over key points.
+
+        Returns:
+            Coverage, or None if the reference has no content words
+        """
+        points, weights = _analyze_reference(str(correct_answer))
+        if not points:
+            return None
+
+        answer_tokens = set(tokenize(user_answer))
+        if not answer_tokens:
+            return 0.0
+
+        coverage = 0.0
+        for tokens in points:
+            total = sum(weights[token] for token in tokens)
+            matched = sum(weights[token] for token in tokens if self._matches(token, answer_tokens))
+            coverage += matched / total if total else 0.0
+
+        return coverage / len(points)
+
+    def grade(self, question: Dict[str, Any], user_answer: Any) -> Optional[Tuple[float, str, bool]]:
+        """
+        Pre-grade a short answer
+
+        Returns:
+            (score, feedback, is_correct) for clear accepts/rejects, or None
+            when the answer should be graded by Gemini
+        """
+        correct_answer = str(question.get("correct_answer", ""))
+        coverage = self.score(correct_answer, user_answer)
+
+        if coverage is None:
+            metrics.incr("lexical_uncertain")
+            return None
+
+        metrics.observe("lexical_coverage", coverage)
+
+        if self._near_verbatim(correct_answer, user_answer):
+            metrics.incr("lexical_decided")
+            metrics.incr("lexical_accepted")
+            return 1.0, "Correct! Your answer covers the key points", True
+
+        if coverage <= self.reject_threshold and self._off_topic(question, user_answer):
+            metrics.incr("lexical_decided")
+            metrics.incr("lexical_rejected")
+            return 0.0, f"Answer does not address the question. Expected: {correct_answer}", False
+
+        metrics.incr("lexical_uncertain")
+        return None
+
+    def _matches(self, token: str, answer_tokens: set) -> bool:
+        if token in answer_tokens:
+            return True
+        if len(token) < FUZZY_MIN_LENGTH:
+            return False
+        return any(
+            len(candidate) >= FUZZY_MIN_LENGTH
+            and abs(len(candidate) - len(token)) <= 2
+            and SequenceMatcher(None, token, candidate).ratio() >= FUZZY_RATIO
+            for candidate in answer_tokens
+        )
+
+    def _typo_of(self, word: str, token: str) -> bool:
+        """Whether `token` is a misspelling of a longer `word` (stemming may shorten it)"""
+        return (
+            len(word) >= FUZZY_MIN_LENGTH
+            and abs(len(word) - len(token)) <= 2
+            and SequenceMatcher(None, word, token).ratio() >= FUZZY_RATIO
+        )
+
+    def _near_verbatim(self, correct_answer: str, user_answer: Any) -> bool:
+        """Same content words as the reference, in (nearly) the same order"""
+        reference = tokenize(correct_answer)
+        if not reference:
+            return False
+
+        # Typos count as the reference word they match
+        vocabulary = set(reference)
+        answer = []
+        for token in tokenize(user_answer):
+            if token not in vocabulary:
+                matched = next((ref for ref in reference if self._typo_of(ref, token)), None)
+                if matched is None:
+                    if any(self._typo_of(word, token) for word in FUZZY_STOPWORDS):
+                        continue  # Misspelled stopword ("becuase")
+                    return False  # Content the reference does not have
+                token = matched
+            answer.append(token)
+
+        negations = [token for token in reference if token in NEGATIONS]
+        if [token for token in answer if token in NEGATIONS] != negations:
+            return False
+
+        return SequenceMatcher(None, reference, answer, autojunk=False).ratio() >= self.accept_threshold
+
+    def _off_topic(self, question: Dict[str, Any], user_answer: Any) -> bool:
+        """No content word of the answer appears in the question or reference"""
+        answer_tokens = set(tokenize(user_answer))
+        if not answer_tokens:
+            return True
+        vocabulary = set(tokenize(question.get("question", ""))) | set(tokenize(question.get("correct_answer", "")))
+        return not any(self._matches(token, answer_tokens) for token in vocabulary)
+
+
+# Global instance
+lexical_grader = LexicalGrader(
+    accept_threshold=settings.LEXICAL_ACCEPT_THRESHOLD,
+    reject_threshold=settings.LEXICAL_REJECT_THRESHOLD
+)
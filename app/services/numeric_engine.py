@@ -0,0 +1,233 @@
+"""
+Local numeric answer engine for numerical question grading
+Parses fractions, scientific notation, units, radicals and constants safely
+"""
+import ast
+import logging
+import math
+import operator
+import re
+import unicodedata
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Quantity:
+    """Parsed numeric answer"""
+
+    __slots__ = ("value", "dimension", "sig_figs")
+
+    def __init__(self, value: float, dimension: Optional[str] = None, sig_figs: Optional[int] = None):
+        self.value = value  # In SI base units when a unit was given
+        self.dimension = dimension  # e.g. "length"; None for bare numbers
+        self.sig_figs = sig_figs  # Only known for plain decimal literals
+
+    def __repr__(self):
+        return f"<Quantity(value={self.value}, dimension={self.dimension}, sig_figs={self.sig_figs})>"
+
+
+# Unit symbol -> (dimension, factor to SI base unit)
+UNITS = {
+    # Length
+    "km": ("length", 1e3), "m": ("length", 1.0), "cm": ("length", 1e-2),
+    "mm": ("length", 1e-3), "µm": ("length", 1e-6), "um": ("length", 1e-6),
+    "nm": ("length", 1e-9),
+    # Area / volume
+    "m²": ("area", 1.0), "m2": ("area", 1.0), "cm²": ("area", 1e-4), "cm2": ("area", 1e-4),
+    "m³": ("volume", 1.0), "m3": ("volume", 1.0), "cm³": ("volume", 1e-6), "cm3": ("volume", 1e-6),
+    "l": ("volume", 1e-3), "ml": ("volume", 1e-6),
+    # Mass
+    "kg": ("mass", 1.0), "g": ("mass", 1e-3), "mg": ("mass", 1e-6),
+    # Time
+    "h": ("time", 3600.0), "hr": ("time", 3600.0), "min": ("time", 60.0),
+    "s": ("time", 1.0), "sec": ("time", 1.0), "ms": ("time", 1e-3),
+    # Speed
+    "m/s": ("speed", 1.0), "km/h": ("speed", 1 / 3.6),
+    # Force / energy / power
+    "n": ("force", 1.0), "j": ("energy", 1.0), "kj": ("energy", 1e3), "w": ("power", 1.0),
+    # Dimensionless
+    "%": ("ratio", 1e-2),
+    "°": ("angle", math.pi / 180), "deg": ("angle", math.pi / 180), "rad": ("angle", 1.0),
+}
+
+# Longest symbols first so "min" wins over "m", "km/h" over "h"
+UNIT_SYMBOLS = sorted(UNITS, key=len, reverse=True)
+
+CONSTANTS = {"pi": math.pi, "e": math.e}
+FUNCTIONS = {"sqrt": math.sqrt, "cbrt": lambda x: math.copysign(abs(x) ** (1 / 3), x)}
+
+BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+MAX_EXPRESSION_LENGTH = 100
+MAX_EXPONENT = 300
+
+PLAIN_NUMBER = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)(e[+-]?\d+)?$")
+SUPERSCRIPTS = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹⁻", "0123456789-")
+
+
+class NumericEngine:
+    """
+    Safe evaluator for student numerical answers
+
+    Supported: "1/3", "3.2e4", "3.2 x 10^4", "√2", "2π", "2√3", "12 cm",
+    "1,250", "45%", "sqrt(2)/2". Evaluation walks a restricted AST
+    (numbers, + - * / **, pi, e, sqrt, cbrt); nothing is exec'd.
+    """
+
+    def parse(self, raw: Any) -> Optional[Quantity]:
+        """
+        Parse an answer into a Quantity
+
+        Returns:
+            Quantity, or None if the answer is not a recognizable number
+        """
+        if raw is None or isinstance(raw, bool):
+            return None
+        if isinstance(raw, (int, float)):
+            return Quantity(float(raw)) if math.isfinite(raw) else None
+
+        # Superscript powers (x², 10⁻³) before NFKC folds them into plain digits
+        text = re.sub(
+            r"(?<=[\d)])([⁰¹²³⁴⁵⁶⁷⁸⁹⁻]+)",
+            lambda m: "^" + m.group(1).translate(SUPERSCRIPTS),
+            str(raw)
+        )
+        text = unicodedata.normalize("NFKC", text).strip()
+        if not text or len(text) > MAX_EXPRESSION_LENGTH:
+            return None
+
+        text, dimension, factor = self._split_unit(text)
+        expression = self._to_python(text)
+        if not expression:
+            return None
+
+        value = self._evaluate(expression)
+        if value is None:
+            return None
+
+        sig_figs = self._sig_figs(expression) if PLAIN_NUMBER.match(expression) else None
+        return Quantity(value * factor, dimension, sig_figs)
+
+    def compare(
+        self,
+        target: Quantity,
+        answer: Quantity,
+        rel_tol: float,
+        abs_tol: float,
+        min_sig_figs: int
+    ) -> Tuple[Optional[bool], float]:
+        """
+        Compare a student answer to the target value
+
+        Returns:
+            (verdict, relative_error); verdict is None when the comparison
+            is ambiguous (unit dimensions disagree or only one side has units)
+        """
+        if target.dimension != answer.dimension and target.dimension is not None:
+            return None, math.inf
+        if answer.dimension is not None and target.dimension is None:
+            # "12 cm" against a bare "12": can't know the intended unit
+            return None, math.inf
+
+        difference = abs(answer.value - target.value)
+        scale = abs(target.value)
+        relative_error = difference / scale if scale else (0.0 if difference == 0 else math.inf)
+
+        if difference <= max(abs_tol, rel_tol * scale):
+            return True, relative_error
+
+        # Answer rounded to its own precision (at least min_sig_figs digits)
+        if answer.sig_figs and answer.sig_figs >= min_sig_figs and target.value != 0:
+            if math.isclose(self._round_sig(target.value, answer.sig_figs), answer.value, rel_tol=1e-9):
+                return True, relative_error
+
+        return False, relative_error
+
+    def _split_unit(self, text: str) -> Tuple[str, Optional[str], float]:
+        lowered = text.lower()
+        for symbol in UNIT_SYMBOLS:
+            if lowered.endswith(symbol):
+                head = text[:len(text) - len(symbol)].rstrip()
+                # Unit must follow a number or closing bracket ("12 cm", "(1/2)m")
+                if head and (head[-1].isdigit() or head[-1] in ").π"):
+                    dimension, factor = UNITS[symbol]
+                    return head, dimension, factor
+        return text, None, 1.0
+
+    def _to_python(self, text: str) -> str:
+        expr = text.lower().translate(str.maketrans({
+            "×": "*", "·": "*", "∙": "*", "÷": "/", "⁄": "/", "−": "-", "–": "-", "π": "pi",
+        }))
+        # Thousands separators: 1,250,000 -> 1250000 (otherwise a comma is a decimal mark)
+        expr = re.sub(r"(?<=\d),(?=\d{3}(\D|$))", "", expr)
+        expr = re.sub(r"(?<=\d),(?=\d)", ".", expr)
+        # Mixed numbers: 1 1/2 -> (1+1/2)
+        expr = re.sub(r"(\d+)\s+(\d+)\s*/\s*(\d+)", r"(\1+\2/\3)", expr)
+        # 3.2 x 10^4 -> 3.2*10^4
+        expr = re.sub(r"(?<=[\d)])\s*x\s*(?=10)", "*", expr)
+        expr = expr.replace("^", "**")
+        # Radicals: √2 -> sqrt(2), √(x) -> sqrt(x)
+        expr = re.sub(r"√\s*(\d+\.?\d*|pi|e)", r"sqrt(\1)", expr)
+        expr = expr.replace("√", "sqrt")
+        # Implicit multiplication: 2pi, 3sqrt(2), 2(3), (1)(2)
+        expr = re.sub(r"(?<=[\d)])\s*(?=(pi|sqrt|cbrt|\(|e(?![+-]?\d)))", "*", expr)
+        expr = re.sub(r"(?<=pi)\s*(?=[\d(])", "*", expr)
+        return expr.replace(" ", "")
+
+    def _evaluate(self, expression: str) -> Optional[float]:
+        try:
+            tree = ast.parse(expression, mode="eval")
+            # float() rejects complex results and overflows huge integers
+            value = float(self._eval_node(tree.body))
+        except (SyntaxError, ValueError, TypeError, ZeroDivisionError, OverflowError):
+            return None
+
+        return value if math.isfinite(value) else None
+
+    def _eval_node(self, node) -> float:
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return node.value
+        if isinstance(node, ast.Name) and node.id in CONSTANTS:
+            return CONSTANTS[node.id]
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPS:
+            return UNARY_OPS[type(node.op)](self._eval_node(node.operand))
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPS:
+            left = self._eval_node(node.left)
+            right = self._eval_node(node.right)
+            if isinstance(node.op, ast.Pow) and (abs(right) > MAX_EXPONENT or abs(left) > 1e100):
+                raise ValueError("Exponent out of range")
+            return BINARY_OPS[type(node.op)](left, right)
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in FUNCTIONS
+            and len(node.args) == 1
+            and not node.keywords
+        ):
+            return FUNCTIONS[node.func.id](self._eval_node(node.args[0]))
+        raise ValueError(f"Unsupported expression: {type(node).__name__}")
+
+    def _sig_figs(self, literal: str) -> Optional[int]:
+        mantissa = literal.lstrip("+-").split("e")[0]
+        digits = mantissa.replace(".", "").lstrip("0")
+        if not digits:
+            return None
+        if "." not in mantissa:
+            # Trailing zeros of an integer are not significant
+            digits = digits.rstrip("0") or "0"
+        return len(digits)
+
+    def _round_sig(self, value: float, sig_figs: int) -> float:
+        return round(value, sig_figs - 1 - int(math.floor(math.log10(abs(value)))))
+
+
+# Global instance
+numeric_engine = NumericEngine()
@@ -0,0 +1,280 @@
+"""
+Question bank service - assembles quizzes from previously generated questions
+"""
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from app.models import Chapter, Quiz, QuestionBankItem
+from app.services.gemini_service import gemini_service
+
+logger = logging.getLogger(__name__)
+
+QUESTION_TYPES = ("mcq", "short", "numerical")
+
+TOP_UP_ATTEMPTS = 2  # Gemini calls to fill a shortfall before the request fails
+
+# Up to `needed` questions per requested type, round-robin across topics:
+# every topic's first random pick, then every topic's second, and so on.
+# Only ids and topics are ranked; question bodies are read for picked rows
+SAMPLE_BANK_SQL = text("""
+    WITH wanted AS (
+        SELECT *
+        FROM unnest(CAST(:types AS varchar[]), CAST(:counts AS int[])) AS w(q_type, needed)
+    ),
+    ranked AS (
+        SELECT
+            b.id,
+            b.q_type,
+            w.needed,
+            row_number() OVER (PARTITION BY b.q_type, b.topic ORDER BY random()) AS topic_rank,
+            random() AS tiebreak
+        FROM question_bank b
+        JOIN wanted w ON w.q_type = b.q_type
+        WHERE b.chapter_id = :chapter_id
+          AND b.difficulty = :difficulty
+    ),
+    picked AS (
+        SELECT
+            id,
+            needed,
+            row_number() OVER (PARTITION BY q_type ORDER BY topic_rank, tiebreak) AS pick_rank
+        FROM ranked
+    )
+    SELECT b.q_type, b.question, b.content_hash
+    FROM picked p
+    JOIN question_bank b ON b.id = p.id
+    WHERE p.pick_rank <= p.needed
+    ORDER BY b.q_type, p.pick_rank
+""")
+
+
+class QuestionBankService:
+    """
+    Per-chapter pool of individual questions
+
+    Strategy:
+    - Every generated question is stored once per chapter and difficulty
+      (content hash)
+    - A quiz request samples each type from the bank, spreading picks
+      across topics
+    - Gemini is only asked for the shortfall, preferring topics the bank
+      does not cover yet; the new questions are added to the bank
+    """
+
+    def content_hash(self, question: Dict[str, Any]) -> str:
+        """Hash of type, normalized question text and options"""
+        text_norm = " ".join(str(question.get("question", "")).lower().split())
+        options = "|".join(str(o).strip().lower() for o in question.get("options") or [])
+        key_string = f"{question.get('type')}|{text_norm}|{options}"
+        return hashlib.sha256(key_string.encode()).hexdigest()
+
+    def add_questions(
+        self,
+        db: Session,
+        chapter_id,
+        difficulty: str,
+        questions: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Insert questions into the bank, skipping duplicates and fallbacks
+
+        Does not commit; the caller owns the transaction.
+
+        Returns:
+            Number of candidate rows sent to the database
+        """
+        rows = {}
+        for q in questions:
+            if q.get("fallback") or q.get("type") not in QUESTION_TYPES:
+                continue
+
+            stored = {k: v for k, v in q.items() if k != "q_id"}
+            digest = self.content_hash(q)
+            rows[digest] = {
+                "chapter_id": chapter_id,
+                "q_type": q["type"],
+                "topic": q.get("topic", "general"),
+                "difficulty": difficulty,
+                "points": float(q.get("points", 1.0)),
+                "question": stored,
+                "content_hash": digest,
+            }
+
+        if not rows:
+            return 0
+
+        stmt = insert(QuestionBankItem).values(list(rows.values()))
+        stmt = stmt.on_conflict_do_nothing(constraint="uq_question_bank_chapter_difficulty_hash")
+        db.execute(stmt)
+
+        return len(rows)
+
+    def seed_from_quizzes(self, db: Session, chapter_id) -> None:
+        """Populate an empty bank from the chapter's existing quizzes"""
+        has_items = db.query(QuestionBankItem.id).filter(
+            QuestionBankItem.chapter_id == chapter_id
+        ).first()
+        if has_items:
+            return
+
+        quizzes = db.query(Quiz.difficulty, Quiz.questions).filter(
+            Quiz.chapter_id == chapter_id
+        ).all()
+
+        for difficulty, questions in quizzes:
+            if isinstance(questions, list):
+                self.add_questions(db, chapter_id, difficulty, questions)
+
+        if quizzes:
+            logger.info(f"Seeded question bank for chapter {chapter_id} from {len(quizzes)} quizzes")
+
+    def _sample_from_bank(
+        self,
+        db: Session,
+        chapter_id,
+        difficulty: str,
+        counts: Dict[str, int]
+    ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, int], set]:
+        """
+        Sample each type from the bank in SQL, round-robin across topics
+
+        Returns:
+            Tuple of (picked questions by type, shortfall by type, picked content hashes)
+        """
+        types = [q_type for q_type, needed in counts.items() if needed > 0]
+        rows = db.execute(SAMPLE_BANK_SQL, {
+            "chapter_id": chapter_id,
+            "difficulty": difficulty,
+            "types": types,
+            "counts": [counts[q_type] for q_type in types],
+        }).all()
+
+        picked = {q_type: [] for q_type in counts}
+        used_hashes = set()
+        for q_type, question, digest in rows:
+            picked[q_type].append(question)
+            used_hashes.add(digest)
+
+        shortfall = {q_type: needed - len(picked[q_type]) for q_type, needed in counts.items()}
+        return picked, shortfall, used_hashes
+
+    def covered_topics(self, db: Session, chapter_id, difficulty: str) -> set:
+        """Topics the bank has questions on for this chapter and difficulty"""
+        rows = db.query(QuestionBankItem.topic).filter(
+            QuestionBankItem.chapter_id == chapter_id,
+            QuestionBankItem.difficulty == difficulty
+        ).distinct().all()
+        return {topic for (topic,) in rows}
+
+    def _number(self, picked: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Flatten picked questions (MCQ, short, numerical) and assign q1..qN"""
+        questions = []
+        for q_type in QUESTION_TYPES:
+            for q in picked[q_type]:
+                fields = {k: v for k, v in q.items() if k != "q_id"}
+                questions.append({"q_id": f"q{len(questions) + 1}", **fields})
+        return questions
+
+    def assemble_from_bank(
+        self,
+        db: Session,
+        chapter_id,
+        difficulty: str,
+        num_mcq: int,
+        num_short: int,
+        num_numerical: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Assemble a quiz purely from the bank
+
+        Returns:
+            Question list, or None if any type lacks enough questions
+        """
+        counts = {"mcq": num_mcq, "short": num_short, "numerical": num_numerical}
+
+        self.seed_from_quizzes(db, chapter_id)
+        picked, shortfall, _ = self._sample_from_bank(db, chapter_id, difficulty, counts)
+        if any(shortfall.values()):
+            return None
+
+        return self._number(picked)
+
+    async def build_questions(
+        self,
+        db: Session,
+        chapter: Chapter,
+        difficulty: str,
+        num_mcq: int,
+        num_short: int,
+        num_numerical: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Assemble a question list from the bank, topping up via Gemini
+
+        Topped-up questions are added to the bank but not committed; the
+        caller commits them together with the quiz.
+
+        Returns:
+            Questions ordered MCQ, short, numerical with q_ids q1..qN
+
+        Raises:
+            RuntimeError: if Gemini cannot fill the shortfall with real
+                (non-fallback) questions in TOP_UP_ATTEMPTS calls
+        """
+        counts = {"mcq": num_mcq, "short": num_short, "numerical": num_numerical}
+
+        self.seed_from_quizzes(db, chapter.id)
+        picked, shortfall, used_hashes = self._sample_from_bank(
+            db, chapter.id, difficulty, counts
+        )
+
+        if any(shortfall.values()):
+            # Prefer topics the bank has nothing on yet
+            covered_topics = self.covered_topics(db, chapter.id, difficulty)
+            chapter_topics = chapter.topics or []
+            uncovered = [t for t in chapter_topics if t not in covered_topics]
+
+            for _ in range(TOP_UP_ATTEMPTS):
+                logger.info(f"Question bank top-up for chapter {chapter.id}: {shortfall}")
+                generated = await gemini_service.generate_quiz_async(
+                    gemini_file_id=chapter.gemini_file_id,
+                    chapter_title=chapter.title,
+                    topics=uncovered or chapter_topics,
+                    difficulty=difficulty,
+                    num_mcq=shortfall["mcq"],
+                    num_short=shortfall["short"],
+                    num_numerical=shortfall["numerical"],
+                )
+                # Bank everything Gemini returned, including any surplus
+                self.add_questions(db, chapter.id, difficulty, generated)
+
+                # Placeholders from a failed generation are never served; Gemini
+                # may also repeat a question the quiz already drew from the bank
+                for q in generated:
+                    q_type = q.get("type")
+                    if q.get("fallback") or q_type not in shortfall or len(picked[q_type]) >= counts[q_type]:
+                        continue
+                    digest = self.content_hash(q)
+                    if digest not in used_hashes:
+                        used_hashes.add(digest)
+                        picked[q_type].append(q)
+
+                shortfall = {q_type: needed - len(picked[q_type]) for q_type, needed in counts.items()}
+                if not any(shortfall.values()):
+                    break
+            else:
+                raise RuntimeError(
+                    f"Question generation for chapter {chapter.id} fell short after "
+                    f"{TOP_UP_ATTEMPTS} attempts: {shortfall}"
+                )
+        else:
+            logger.info(f"Quiz assembled entirely from question bank for chapter {chapter.id}")
+
+        return self._number(picked)
+
+
+# Global instance
+question_bank_service = QuestionBankService()
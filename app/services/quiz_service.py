@@ -0,0 +1,322 @@
+"""
+Quiz generation service shared by the HTTP routes and background jobs
+"""
+import logging
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Chapter, Quiz
+from app.schemas.quiz import QuizGenerateRequest
+from app.services.gemini_service import gemini_service
+from app.services.grading_plan import grading_plans
+from app.services.question_bank_service import question_bank_service, QUESTION_TYPES
+from app.utils.cache import cache_service
+from app.utils.job_queue import job_queue
+from app.utils.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+GENERATE_QUIZ_JOB = "generate_quiz"
+
+# Smallest stored quiz of the same chapter/difficulty with at least the
+# requested number of questions of each type (fallback quizzes excluded)
+DOMINATING_QUIZ_SQL = text("""
+    SELECT id, questions
+    FROM quizzes
+    WHERE chapter_id = :chapter_id
+      AND difficulty = :difficulty
+      AND jsonb_typeof(questions) = 'array'
+      AND NOT questions @> '[{"fallback": true}]'
+      AND (SELECT count(*) FROM jsonb_array_elements(questions) q WHERE q->>'type' = 'mcq') >= :num_mcq
+      AND (SELECT count(*) FROM jsonb_array_elements(questions) q WHERE q->>'type' = 'short') >= :num_short
+      AND (SELECT count(*) FROM jsonb_array_elements(questions) q WHERE q->>'type' = 'numerical') >= :num_numerical
+    ORDER BY jsonb_array_length(questions) ASC, created_at ASC
+    LIMIT 1
+""")
+
+
+class QuizService:
+    """
+    Get-or-generate logic for quizzes
+
+    Lookup order:
+    1. Redis cache (quiz:{chapter}:{difficulty}:{counts})
+    2. Database row with the same variant_hash
+    3. Slice of a larger stored quiz that dominates the requested counts
+    4. Assembly from the chapter question bank, with Gemini topping up
+       missing questions
+    Steps 3-4 are coalesced per variant via single-flight.
+    """
+
+    def build_response_data(self, quiz_id, questions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the JSON-serializable quiz response payload (also used as cache value)"""
+        return {
+            "quiz_id": str(quiz_id),
+            "questions": questions,
+            "total_questions": len(questions),
+            "total_points": sum(q.get("points", 1.0) for q in questions),
+        }
+
+    def slice_from_larger_quiz(
+        self,
+        db: Session,
+        chapter_id,
+        request: QuizGenerateRequest
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Derive the requested variant from a stored quiz with more questions
+
+        The derivation is deterministic: the first N questions of each type,
+        in the source quiz's order, renumbered q1..qN (MCQ, short, numerical).
+
+        Returns:
+            Question list, or None if no stored quiz dominates the request
+        """
+        counts = {
+            "mcq": request.num_mcq,
+            "short": request.num_short,
+            "numerical": request.num_numerical,
+        }
+
+        source = db.execute(DOMINATING_QUIZ_SQL, {
+            "chapter_id": chapter_id,
+            "difficulty": request.difficulty,
+            "num_mcq": counts["mcq"],
+            "num_short": counts["short"],
+            "num_numerical": counts["numerical"],
+        }).first()
+        if not source:
+            return None
+
+        questions = []
+        for q_type in QUESTION_TYPES:
+            of_type = [q for q in source.questions if q.get("type") == q_type]
+            for q in of_type[:counts[q_type]]:
+                fields = {k: v for k, v in q.items() if k != "q_id"}
+                questions.append({"q_id": f"q{len(questions) + 1}", **fields})
+
+        logger.info(f"Derived quiz variant from larger quiz {source.id}")
+        return questions
+
+    def _variant_keys(self, chapter_id, request: QuizGenerateRequest) -> Tuple[str, str]:
+        """Return (cache_key, variant_hash) for the requested variant"""
+        params = (
+            str(chapter_id),
+            request.difficulty,
+            request.num_mcq,
+            request.num_short,
+            request.num_numerical,
+        )
+        return cache_service.generate_cache_key(*params), cache_service.generate_variant_hash(*params)
+
+    def _lookup_existing(self, db: Session, cache_key: str, variant_hash: str) -> Optional[Dict[str, Any]]:
+        """Return an already stored quiz for this variant (cache, then database)"""
+        cached_quiz = cache_service.get(cache_key)
+        if cached_quiz:
+            logger.info(f"Returning cached quiz for {cache_key}")
+            return cached_quiz
+
+        existing_quiz = db.query(Quiz).filter(Quiz.variant_hash == variant_hash).first()
+        if existing_quiz:
+            logger.info(f"Found existing quiz in database: {existing_quiz.id}")
+            response_data = self.build_response_data(existing_quiz.id, existing_quiz.questions)
+
+            # Cache it
+            cache_service.set(cache_key, response_data)
+            return response_data
+
+        return None
+
+    def _store_quiz(
+        self,
+        db: Session,
+        chapter_id,
+        request: QuizGenerateRequest,
+        questions: List[Dict[str, Any]],
+        cache_key: str,
+        variant_hash: str
+    ) -> Dict[str, Any]:
+        """Persist a new quiz (and its questions in the bank), then cache it"""
+        question_bank_service.add_questions(db, chapter_id, request.difficulty, questions)
+
+        # Create quiz record
+        quiz = Quiz(
+            chapter_id=chapter_id,
+            difficulty=request.difficulty,
+            questions=questions,
+            variant_hash=variant_hash,
+        )
+
+        db.add(quiz)
+        db.commit()
+        db.refresh(quiz)
+
+        logger.info(f"Quiz created: {quiz.id}")
+
+        # Compile the answer key now so the first submission does not pay for it
+        grading_plans.get(quiz.id, questions, quiz.key_version)
+
+        # Cache the response so waiters on other workers can pick it up
+        response_data = self.build_response_data(quiz.id, questions)
+        cache_service.set(cache_key, response_data)
+
+        return response_data
+
+    def _prebuilt_questions(
+        self,
+        db: Session,
+        chapter_id,
+        request: QuizGenerateRequest
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Questions obtainable without Gemini (larger quiz slice, then full bank)"""
+        questions = self.slice_from_larger_quiz(db, chapter_id, request)
+        if questions is None:
+            questions = question_bank_service.assemble_from_bank(
+                db,
+                chapter_id,
+                difficulty=request.difficulty,
+                num_mcq=request.num_mcq,
+                num_short=request.num_short,
+                num_numerical=request.num_numerical,
+            )
+        return questions
+
+    async def get_or_create_quiz(
+        self,
+        db: Session,
+        chapter: Chapter,
+        request: QuizGenerateRequest
+    ) -> Dict[str, Any]:
+        """
+        Return a quiz for the requested variant, generating it if needed
+
+        Args:
+            db: Database session
+            chapter: Chapter to generate from
+            request: Quiz parameters
+
+        Returns:
+            Quiz response payload
+        """
+        cache_key, variant_hash = self._variant_keys(chapter.id, request)
+
+        async def lookup_existing() -> Optional[Dict[str, Any]]:
+            return self._lookup_existing(db, cache_key, variant_hash)
+
+        async def generate_and_store() -> Dict[str, Any]:
+            """Derive or assemble a new quiz, persist and cache it"""
+            logger.info(f"Building new quiz for chapter {chapter.id}")
+
+            questions = self.slice_from_larger_quiz(db, chapter.id, request)
+            if questions is None:
+                questions = await question_bank_service.build_questions(
+                    db,
+                    chapter,
+                    difficulty=request.difficulty,
+                    num_mcq=request.num_mcq,
+                    num_short=request.num_short,
+                    num_numerical=request.num_numerical,
+                )
+
+            return self._store_quiz(db, chapter.id, request, questions, cache_key, variant_hash)
+
+        # Check cache and database first
+        existing = await lookup_existing()
+        if existing:
+            return existing
+
+        try:
+            # Concurrent identical requests share a single build
+            return await single_flight.do(
+                variant_hash, generate_and_store, lookup=lookup_existing
+            )
+        except Exception:
+            db.rollback()
+            raise
+
+    async def stream_quiz(
+        self,
+        db: Session,
+        chapter: Chapter,
+        request: QuizGenerateRequest
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Produce a quiz as a sequence of events
+
+        Yields:
+            ("question", {...}) for each question as soon as it is available,
+            then ("complete", {quiz_id, total_questions, total_points})
+
+        Stored, sliced or bank-assembled quizzes are emitted immediately;
+        otherwise questions are relayed from Gemini's stream and the full
+        quiz is persisted and cached at the end.
+        """
+        cache_key, variant_hash = self._variant_keys(chapter.id, request)
+
+        response_data = self._lookup_existing(db, cache_key, variant_hash)
+        if response_data is None:
+            questions = self._prebuilt_questions(db, chapter.id, request)
+            if questions is not None:
+                response_data = self._store_quiz(
+                    db, chapter.id, request, questions, cache_key, variant_hash
+                )
+
+        if response_data is None:
+            logger.info(f"Streaming new quiz for chapter {chapter.id}")
+            questions = []
+            try:
+                async for question in gemini_service.stream_quiz_questions(
+                    gemini_file_id=chapter.gemini_file_id,
+                    chapter_title=chapter.title,
+                    topics=chapter.topics or [],
+                    difficulty=request.difficulty,
+                    num_mcq=request.num_mcq,
+                    num_short=request.num_short,
+                    num_numerical=request.num_numerical,
+                ):
+                    fields = {k: v for k, v in question.items() if k != "q_id"}
+                    question = {"q_id": f"q{len(questions) + 1}", **fields}
+                    questions.append(question)
+                    yield "question", question
+
+                response_data = self._store_quiz(
+                    db, chapter.id, request, questions, cache_key, variant_hash
+                )
+            except Exception:
+                db.rollback()
+                raise
+        else:
+            for question in response_data["questions"]:
+                yield "question", question
+
+        yield "complete", {
+            "quiz_id": response_data["quiz_id"],
+            "total_questions": response_data["total_questions"],
+            "total_points": response_data["total_points"],
+        }
+
+    def enqueue_generation(self, chapter_id, request: QuizGenerateRequest) -> str:
+        """Enqueue a background generation job and return its id"""
+        return job_queue.enqueue(GENERATE_QUIZ_JOB, {
+            "chapter_id": str(chapter_id),
+            "request": request.model_dump(),
+        })
+
+    async def run_generation_job(self, job_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Job handler: generate a quiz with a worker-owned database session"""
+        db = SessionLocal()
+        try:
+            chapter = db.query(Chapter).filter(Chapter.id == payload["chapter_id"]).first()
+            if not chapter:
+                raise ValueError("Chapter not found")
+
+            request = QuizGenerateRequest(**payload["request"])
+            return await self.get_or_create_quiz(db, chapter, request)
+        finally:
+            db.close()
+
+
+# Global instance
+quiz_service = QuizService()
+job_queue.register(GENERATE_QUIZ_JOB, quiz_service.run_generation_job)
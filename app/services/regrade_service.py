@@ -0,0 +1,342 @@
+"""
+Answer key corrections and regrading of historical quiz attempts
+"""
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Chapter, Quiz, QuizAttempt, QuestionBankItem
+from app.services.attempt_stats_service import attempt_stats
+from app.services.grading_plan import grading_plans, GradingPlan
+from app.services.grading_service import grading_service, GradeResult
+from app.services.question_bank_service import question_bank_service
+from app.services.submission_service import SubmissionService
+from app.utils.cache import cache_service
+from app.utils.events import event_bus, ATTEMPTS_CHANGED
+from app.utils.fair_scheduler import grading_scheduler, PRIORITY_REGRADE
+from app.utils.job_queue import job_queue
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+REGRADE_JOB = "regrade_question"
+
+# Fields whose change invalidates previous grades (the rest only rescale them)
+KEY_FIELDS = ("question", "options", "correct_answer")
+
+
+class RegradeService:
+    """
+    Patches a quiz question and regrades the attempts that answered it
+
+    - The patch applies to every quiz of the chapter carrying the question
+      (sliced and bank-assembled quizzes share questions), bumps their
+      Quiz.key_version, so every worker recompiles the grading plans, and
+      is mirrored to the chapter question bank
+    - Attempts are regraded by a background job in keyset-paginated
+      batches of REGRADE_BATCH_SIZE, one commit per batch
+    - Within a batch the patched question is graded as one column: MCQ and
+      numerical answers locally, subjective ones through the model
+      (deduplicated and memoized) only if the answer key changed; a
+      points/topic-only patch rescales the stored grades
+    - Other questions keep their stored grades; totals, weak topics and
+      feedback are recomputed from the merged results
+    """
+
+    def patch_question(
+        self,
+        db: Session,
+        quiz: Quiz,
+        q_id: str,
+        changes: Dict[str, Any]
+    ) -> Tuple[bool, Dict[str, str]]:
+        """
+        Apply changes to one question of a quiz, and to every other quiz of
+        the chapter carrying the same question, then commit
+
+        Quizzes sliced from a larger quiz or assembled from the question bank
+        share questions; copies are matched by bank content hash and may sit
+        under a different q_id.
+
+        Args:
+            db: Database session
+            quiz: Quiz to patch
+            q_id: Question id within the quiz
+            changes: Fields to overwrite (question, options, correct_answer, points, topic)
+
+        Returns:
+            Tuple of (whether the answer key changed, {quiz id: q_id} of every patched quiz)
+
+        Raises:
+            KeyError: if the question does not exist
+            ValueError: if the patched question is inconsistent
+        """
+        index = next((i for i, q in enumerate(quiz.questions or []) if q.get("q_id") == q_id), None)
+        if index is None:
+            raise KeyError(q_id)
+
+        old = quiz.questions[index]
+        new = {**old, **changes}
+
+        if new.get("type") == "mcq":
+            options = new.get("options") or []
+            answer = new.get("correct_answer")
+            if not isinstance(answer, int) or not 0 <= answer < len(options):
+                raise ValueError("MCQ correct_answer must be an index into options")
+
+        key_changed = any(new.get(field) != old.get(field) for field in KEY_FIELDS)
+
+        sharing = self._quizzes_sharing(db, quiz, old)
+        patched = {}
+        for target, target_index in [(quiz, index)] + sharing:
+            questions = [dict(q) for q in target.questions]
+            questions[target_index] = {**questions[target_index], **changes}
+            target.questions = questions
+            target.key_version = (target.key_version or 1) + 1
+            patched[str(target.id)] = questions[target_index]["q_id"]
+
+        self._patch_bank(db, quiz.chapter_id, old, new)
+        db.commit()
+
+        for quiz_id in patched:
+            grading_plans.invalidate(quiz_id)
+        # Cached quiz payloads embed the answer key
+        cache_service.clear_chapter_cache(str(quiz.chapter_id))
+
+        logger.info(
+            f"Patched question {q_id} of quiz {quiz.id} and {len(sharing)} quizzes sharing it "
+            f"(key changed: {key_changed})"
+        )
+        return key_changed, patched
+
+    def _quizzes_sharing(self, db: Session, quiz: Quiz, question: Dict[str, Any]) -> List[Tuple[Quiz, int]]:
+        """Other quizzes of the chapter holding `question`, with its index in each"""
+        digest = question_bank_service.content_hash(question)
+        # Copies are verbatim, so JSONB containment on the text narrows the
+        # candidates in SQL; the content hash decides
+        candidates = db.query(Quiz).filter(
+            Quiz.chapter_id == quiz.chapter_id,
+            Quiz.id != quiz.id,
+            Quiz.questions.contains([{"question": question.get("question")}])
+        ).all()
+
+        sharing = []
+        for candidate in candidates:
+            index = next(
+                (i for i, q in enumerate(candidate.questions or [])
+                 if question_bank_service.content_hash(q) == digest),
+                None
+            )
+            if index is not None:
+                sharing.append((candidate, index))
+        return sharing
+
+    def _patch_bank(self, db: Session, chapter_id, old: Dict[str, Any], new: Dict[str, Any]) -> None:
+        """Mirror the fix to the bank (every difficulty) so future quizzes get the corrected question"""
+        items = db.query(QuestionBankItem).filter(
+            QuestionBankItem.chapter_id == chapter_id,
+            QuestionBankItem.content_hash == question_bank_service.content_hash(old)
+        ).all()
+
+        new_hash = question_bank_service.content_hash(new)
+        for item in items:
+            duplicate = new_hash != item.content_hash and db.query(QuestionBankItem.id).filter(
+                QuestionBankItem.chapter_id == chapter_id,
+                QuestionBankItem.difficulty == item.difficulty,
+                QuestionBankItem.content_hash == new_hash
+            ).first()
+            if duplicate:
+                # The corrected question is already banked; drop the wrong copy
+                db.delete(item)
+                continue
+
+            item.question = {k: v for k, v in new.items() if k != "q_id"}
+            item.content_hash = new_hash
+            item.topic = new.get("topic", "general")
+            item.points = float(new.get("points", 1.0))
+
+    def enqueue_regrade(self, patched: Dict[str, str], key_changed: bool) -> str:
+        """Enqueue one regrade job for every patched quiz and return its id"""
+        return job_queue.enqueue(REGRADE_JOB, {
+            "quizzes": {str(quiz_id): q_id for quiz_id, q_id in patched.items()},
+            "key_changed": key_changed,
+        })
+
+    async def run_regrade_job(self, job_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Job handler: regrade every completed attempt of each patched quiz, batch by batch"""
+        # Jobs queued before multi-quiz patches carry a single quiz
+        targets = payload.get("quizzes") or {payload["quiz_id"]: payload["q_id"]}
+        progress = {"processed": 0, "changed": 0}
+
+        db = SessionLocal()
+        try:
+            results = []
+            for quiz_id, q_id in targets.items():
+                results.append(await self._regrade_quiz(
+                    db, job_id, quiz_id, q_id, payload["key_changed"], progress
+                ))
+            return {
+                "quizzes": results,
+                "attempts_processed": progress["processed"],
+                "attempts_changed": progress["changed"],
+            }
+        finally:
+            db.close()
+
+    async def _regrade_quiz(
+        self,
+        db: Session,
+        job_id: str,
+        quiz_id: str,
+        q_id: str,
+        key_changed: bool,
+        progress: Dict[str, int]
+    ) -> Dict[str, Any]:
+        """
+        Regrade one question across the completed attempts of one quiz
+
+        Attempts still pending deferred grading are skipped: their grading
+        job completes them against the patched key (see
+        SubmissionService._complete_attempt).
+
+        Returns:
+            Summary of the quiz's attempts processed and changed
+        """
+        quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+        chapter = quiz and db.query(Chapter).filter(Chapter.id == quiz.chapter_id).first()
+        if not chapter:
+            raise ValueError(f"Quiz {quiz_id} or its chapter not found")
+
+        plan = grading_plans.get(quiz.id, quiz.questions, quiz.key_version)
+        index = next((i for i, q in enumerate(plan.questions) if q.q_id == q_id), None)
+        if index is None:
+            raise ValueError(f"Question {q_id} not found in quiz {quiz_id}")
+
+        chapter_id = quiz.chapter_id
+        gemini_file_id = chapter.gemini_file_id
+        processed = changed = 0
+        last_id = None
+        while True:
+            query = db.query(QuizAttempt).filter(
+                QuizAttempt.quiz_id == quiz.id,
+                or_(
+                    QuizAttempt.grading_status.is_(None),
+                    QuizAttempt.grading_status == SubmissionService.STATUS_COMPLETED
+                )
+            )
+            if last_id is not None:
+                query = query.filter(QuizAttempt.id > last_id)
+            batch = query.order_by(QuizAttempt.id).limit(settings.REGRADE_BATCH_SIZE).all()
+            if not batch:
+                break
+
+            last_id = batch[-1].id
+            with grading_scheduler.context(f"regrade:{quiz.id}", PRIORITY_REGRADE):
+                updated = await self._regrade_batch(batch, plan, index, key_changed, gemini_file_id)
+            user_ids = [attempt.user_id for attempt in updated]
+            attempt_stats.replace(db, quiz, updated)
+            db.commit()
+            if user_ids:
+                event_bus.publish(ATTEMPTS_CHANGED, chapter_id=chapter_id, user_ids=user_ids)
+            # Keep the session's identity map bounded on large quizzes
+            for attempt in batch:
+                db.expunge(attempt)
+
+            changed += len(updated)
+            processed += len(batch)
+            progress["processed"] += len(batch)
+            progress["changed"] += len(updated)
+            metrics.incr("regrade_attempts_processed", len(batch))
+            job_queue.set_progress(job_id, progress)
+
+        logger.info(f"Regrade of quiz {quiz_id} {q_id}: {changed}/{processed} attempts changed")
+        return {
+            "quiz_id": str(quiz_id),
+            "q_id": q_id,
+            "attempts_processed": processed,
+            "attempts_changed": changed,
+        }
+
+    async def _regrade_batch(
+        self,
+        batch: List[QuizAttempt],
+        plan: GradingPlan,
+        index: int,
+        key_changed: bool,
+        gemini_file_id: str
+    ) -> List[QuizAttempt]:
+        """
+        Regrade one question across a batch of attempts and update them in place
+
+        Returns:
+            Attempts whose stored grading changed
+        """
+        question = plan.questions[index]
+        answer_sets = [attempt.answers or {} for attempt in batch]
+        stored = [self._stored_results(plan, attempt.scores) for attempt in batch]
+
+        # Column of results for the patched question
+        regrade = [
+            position for position, results in enumerate(stored)
+            if key_changed or results[index] is None
+        ]
+        if regrade:
+            column = await grading_service.grade_question(
+                question,
+                [answer_sets[position].get(question.q_id) for position in regrade],
+                gemini_file_id
+            )
+            for position, result in zip(regrade, column):
+                stored[position][index] = result
+
+        # Questions missing from a stored breakdown (should not happen for completed attempts)
+        for results in stored:
+            for position, result in enumerate(results):
+                if result is None:
+                    results[position] = (0.0, "Not graded", False)
+
+        changed = []
+        for attempt, answers, results in zip(batch, answer_sets, stored):
+            total_score, breakdown, weak_topics, feedback = grading_service.summarize(
+                plan, answers, results
+            )
+            if breakdown == attempt.scores and weak_topics == (attempt.weak_topics or []):
+                continue
+
+            attempt.scores = breakdown
+            attempt.total_score = total_score
+            attempt.weak_topics = weak_topics
+            attempt.feedback = feedback
+            changed.append(attempt)
+
+        return changed
+
+    def _stored_results(
+        self,
+        plan: GradingPlan,
+        breakdown: Optional[List[Dict[str, Any]]]
+    ) -> List[Optional[GradeResult]]:
+        """Per-question (score ratio, feedback, is_correct) from a stored breakdown"""
+        by_q_id = {
+            item.get("q_id"): item
+            for item in breakdown or []
+            if isinstance(item, dict) and not item.get("pending")
+        }
+
+        results: List[Optional[GradeResult]] = []
+        for question in plan.questions:
+            item = by_q_id.get(question.q_id)
+            if item is None:
+                results.append(None)
+                continue
+            max_score = item.get("max_score") or 0
+            ratio = item.get("score", 0) / max_score if max_score > 0 else 0.0
+            results.append((ratio, item.get("feedback") or "", bool(item.get("is_correct"))))
+        return results
+
+
+# Global instance
+regrade_service = RegradeService()
+job_queue.register(REGRADE_JOB, regrade_service.run_regrade_job)
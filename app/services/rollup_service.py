@@ -0,0 +1,249 @@
+"""
+Incremental hourly/daily rollups for time-windowed chapter analytics
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.chapter_rollup import ALL_TOPICS, ALL_QUESTIONS, NO_QUIZ
+from app.services.attempt_stats_service import WEAK_TOPIC_THRESHOLD
+from app.utils.events import event_bus, ROLLUPS_UPDATED
+from app.utils.hyperloglog import HyperLogLog
+from app.utils.job_queue import job_queue
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_JOB = "rollup_analytics"
+
+# Serializes rollup runs across API processes (pg_try_advisory_xact_lock key)
+ROLLUP_LOCK_KEY = 7_240_101
+
+CLAIM_DIRTY_SQL = text("""
+    DELETE FROM analytics_rollup_queue
+    WHERE (chapter_id, bucket) IN (
+        SELECT chapter_id, bucket
+        FROM analytics_rollup_queue
+        ORDER BY bucket
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING chapter_id, bucket
+""")
+
+CLEAR_HOURLY_SQL = text("""
+    DELETE FROM chapter_rollups_hourly WHERE chapter_id = :chapter_id AND bucket = :bucket
+""")
+
+# One hour of one chapter: question rows, topic rows and the chapter row
+ROLLUP_HOUR_SQL = text("""
+    INSERT INTO chapter_rollups_hourly
+        (chapter_id, bucket, topic, quiz_id, q_id, count, sum_score, sum_sq, weak_count)
+    WITH items AS (
+        SELECT attempt_id, quiz_id, q_id, topic, score / max_score AS ratio
+        FROM quiz_attempt_items
+        WHERE chapter_id = :chapter_id
+          AND created_at >= :bucket
+          AND created_at < :bucket_end
+          AND max_score > 0
+    ),
+    attempt_topics AS (
+        SELECT attempt_id, topic, avg(ratio) AS ratio
+        FROM items
+        GROUP BY attempt_id, topic
+    )
+    SELECT :chapter_id, :bucket, topic, quiz_id, q_id,
+           count(*), sum(ratio), sum(ratio * ratio), 0
+    FROM items
+    GROUP BY topic, quiz_id, q_id
+    UNION ALL
+    SELECT :chapter_id, :bucket, topic, :no_quiz, :all_questions,
+           count(*), sum(ratio), sum(ratio * ratio), count(*) FILTER (WHERE ratio < :weak_threshold)
+    FROM attempt_topics
+    GROUP BY topic
+    UNION ALL
+    SELECT :chapter_id, :bucket, :all_topics, :no_quiz, :all_questions,
+           count(*), sum(COALESCE(a.total_score, 0)), sum(COALESCE(a.total_score, 0) ^ 2), 0
+    FROM quiz_attempts a
+    WHERE a.id IN (SELECT attempt_id FROM items)
+    HAVING count(*) > 0
+""")
+
+HOUR_USERS_SQL = text("""
+    SELECT DISTINCT user_id
+    FROM quiz_attempt_items
+    WHERE chapter_id = :chapter_id
+      AND created_at >= :bucket
+      AND created_at < :bucket_end
+""")
+
+HOUR_SKETCHES_SQL = text("""
+    SELECT user_sketch
+    FROM chapter_rollups_hourly
+    WHERE chapter_id = :chapter_id
+      AND bucket >= :bucket
+      AND bucket < :bucket_end
+      AND topic = :all_topics AND quiz_id = :no_quiz AND q_id = :all_questions
+""")
+
+# Sketches live on the chapter row only
+SET_SKETCH_SQL = """
+    UPDATE {table} SET user_sketch = :sketch
+    WHERE chapter_id = :chapter_id AND bucket = :bucket
+      AND topic = :all_topics AND quiz_id = :no_quiz AND q_id = :all_questions
+"""
+SET_HOURLY_SKETCH_SQL = text(SET_SKETCH_SQL.format(table="chapter_rollups_hourly"))
+SET_DAILY_SKETCH_SQL = text(SET_SKETCH_SQL.format(table="chapter_rollups_daily"))
+
+CLEAR_DAILY_SQL = text("""
+    DELETE FROM chapter_rollups_daily WHERE chapter_id = :chapter_id AND bucket = :bucket
+""")
+
+# A day is the sum of its hours
+ROLLUP_DAY_SQL = text("""
+    INSERT INTO chapter_rollups_daily
+        (chapter_id, bucket, topic, quiz_id, q_id, count, sum_score, sum_sq, weak_count)
+    SELECT chapter_id, :bucket, topic, quiz_id, q_id,
+           sum(count), sum(sum_score), sum(sum_sq), sum(weak_count)
+    FROM chapter_rollups_hourly
+    WHERE chapter_id = :chapter_id
+      AND bucket >= :bucket
+      AND bucket < :bucket_end
+    GROUP BY chapter_id, topic, quiz_id, q_id
+""")
+
+
+class RollupService:
+    """
+    Maintains chapter_rollups_hourly and chapter_rollups_daily
+
+    Writers queue the (chapter, hour) buckets they touch in
+    analytics_rollup_queue, in the attempt's own transaction (see
+    AttemptStatsService). Every ANALYTICS_ROLLUP_INTERVAL seconds each API
+    process tries to claim a batch of queued buckets; only one run is
+    active at a time (advisory lock). A claimed hour is recomputed from
+    quiz_attempt_items, then each affected day is re-summed from its
+    hours, and the claim, recomputation and queue deletion commit
+    together. Late writes and regrades simply queue their hour again.
+
+    Chapter rows also carry a HyperLogLog sketch of the bucket's users:
+    built from the hour's distinct user ids, merged into the day.
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    def run_once(self, db: Session) -> Optional[Dict[str, int]]:
+        """
+        Roll up queued buckets, one transaction per batch
+
+        Returns:
+            Counts of hours/days recomputed, or None if another run holds the lock
+        """
+        hours = days = 0
+        while True:
+            if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ROLLUP_LOCK_KEY}).scalar():
+                db.rollback()
+                return None if hours == 0 else {"hours": hours, "days": days}
+
+            claimed = db.execute(CLAIM_DIRTY_SQL, {"limit": self.batch_size}).all()
+            if not claimed:
+                db.commit()
+                break
+
+            try:
+                affected_days = self._recompute(db, claimed)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+            hours += len(claimed)
+            days += len(affected_days)
+            metrics.incr("analytics_rollup_hours", len(claimed))
+            event_bus.publish(ROLLUPS_UPDATED, chapter_ids={row.chapter_id for row in claimed})
+
+        if hours:
+            logger.info(f"Analytics rollup: {hours} hourly and {days} daily buckets recomputed")
+        return {"hours": hours, "days": days}
+
+    def _recompute(self, db: Session, claimed: List[Any]) -> set:
+        params = {
+            "no_quiz": NO_QUIZ,
+            "all_topics": ALL_TOPICS,
+            "all_questions": ALL_QUESTIONS,
+            "weak_threshold": WEAK_TOPIC_THRESHOLD,
+        }
+
+        affected_days = set()
+        for row in claimed:
+            bucket = {"chapter_id": row.chapter_id, "bucket": row.bucket}
+            db.execute(CLEAR_HOURLY_SQL, bucket)
+            bucket_end = row.bucket + timedelta(hours=1)
+            db.execute(ROLLUP_HOUR_SQL, {**params, **bucket, "bucket_end": bucket_end})
+
+            users = db.execute(HOUR_USERS_SQL, {**bucket, "bucket_end": bucket_end}).scalars()
+            sketch = HyperLogLog()
+            sketch.update(users)
+            db.execute(SET_HOURLY_SKETCH_SQL, {**params, **bucket, "sketch": sketch.to_bytes()})
+            affected_days.add((row.chapter_id, row.bucket.replace(hour=0)))
+
+        for chapter_id, day in sorted(affected_days, key=lambda key: (key[1], str(key[0]))):
+            bucket = {"chapter_id": chapter_id, "bucket": day}
+            db.execute(CLEAR_DAILY_SQL, bucket)
+            db.execute(ROLLUP_DAY_SQL, {**bucket, "bucket_end": day + timedelta(days=1)})
+
+            hour_sketches = db.execute(
+                HOUR_SKETCHES_SQL, {**params, **bucket, "bucket_end": day + timedelta(days=1)}
+            ).scalars()
+            sketch = HyperLogLog.union(hour_sketches)
+            db.execute(SET_DAILY_SKETCH_SQL, {**params, **bucket, "sketch": sketch.to_bytes()})
+
+        return affected_days
+
+    async def run_rollup_job(self, job_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Job handler: run the incremental rollup now"""
+        return await asyncio.to_thread(self._run_in_session) or {"skipped": "rollup already running"}
+
+    def _run_in_session(self) -> Optional[Dict[str, int]]:
+        db = SessionLocal()
+        try:
+            return self.run_once(db)
+        finally:
+            db.close()
+
+    async def start(self) -> None:
+        """Start the periodic rollup loop"""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # Blocking database work stays off the event loop
+                await asyncio.to_thread(self._run_in_session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Analytics rollup failed: {str(e)}")
+
+
+# Global instance
+rollup_service = RollupService(
+    interval=settings.ANALYTICS_ROLLUP_INTERVAL,
+    batch_size=settings.ANALYTICS_ROLLUP_BATCH_SIZE
+)
+job_queue.register(ROLLUP_JOB, rollup_service.run_rollup_job)
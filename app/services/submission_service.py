@@ -0,0 +1,313 @@
+"""
+Quiz submission service: grading, persistence and deferred grading jobs
+"""
+import logging
+import uuid
+from typing import Dict, Any, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Chapter, Quiz, QuizAttempt
+from app.schemas.quiz import QuizSubmission
+from app.services.attempt_stats_service import attempt_stats
+from app.services.grading_plan import grading_plans
+from app.services.grading_service import grading_service
+from app.utils.events import event_bus, ATTEMPTS_CHANGED
+from app.utils.fair_scheduler import grading_scheduler, PRIORITY_BULK
+from app.utils.job_queue import job_queue
+
+logger = logging.getLogger(__name__)
+
+GRADE_ATTEMPT_JOB = "grade_attempt"
+
+
+class SubmissionService:
+    """
+    Grades and stores quiz attempts
+
+    Two modes:
+    - Immediate: everything is graded before the attempt is stored
+    - Deferred: the attempt is stored right away with objective scores
+      (MCQ, clear-cut numerical/short answers) and subjective items marked
+      pending; a background job grades them and updates the attempt
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    def build_response_data(
+        self,
+        questions: List[Dict[str, Any]],
+        total_score: float,
+        breakdown: List[Dict[str, Any]],
+        weak_topics: List[str],
+        feedback: str,
+        attempt: Optional[QuizAttempt] = None
+    ) -> Dict[str, Any]:
+        """Shape grading results as a QuizGradingResponse payload"""
+        max_score = sum(q.get("points", 1.0) for q in questions)
+        percentage = (total_score / max_score * 100) if max_score > 0 else 0.0
+
+        data = {
+            "score": round(total_score, 2),
+            "max_score": round(max_score, 2),
+            # "X/Y" format as per assignment
+            "score_display": f"{total_score:.1f}/{max_score:.1f}",
+            "percentage": round(percentage, 2),
+            "breakdown": breakdown,
+            "weak_topics": weak_topics,
+            "feedback": feedback,
+        }
+
+        if attempt is not None:
+            data["attempt_id"] = attempt.id
+            data["grading_status"] = attempt.grading_status or self.STATUS_COMPLETED
+        return data
+
+    def attempt_response_data(self, db: Session, attempt: QuizAttempt) -> Dict[str, Any]:
+        """Current grading state of a stored attempt"""
+        quiz = db.query(Quiz).filter(Quiz.id == attempt.quiz_id).first()
+        return self.build_response_data(
+            questions=quiz.questions if quiz else [],
+            total_score=float(attempt.total_score or 0),
+            breakdown=attempt.scores or [],
+            weak_topics=attempt.weak_topics or [],
+            feedback=attempt.feedback or "",
+            attempt=attempt
+        )
+
+    def _lock_key_version(self, db: Session, quiz: Quiz, key_version: Optional[int]) -> bool:
+        """
+        Share-lock the quiz row until commit; returns whether its answer key is still `key_version`
+
+        A regrade job only sees attempts committed (and completed) when it
+        pages past them, so an attempt graded against a key patched meanwhile
+        would keep its stale grade: callers grade again on False. The lock
+        (FOR SHARE) makes a concurrent patch wait until the attempt is stored.
+        """
+        db.refresh(quiz, with_for_update={"read": True})
+        return quiz.key_version == key_version
+
+    async def submit(
+        self,
+        db: Session,
+        quiz: Quiz,
+        chapter: Chapter,
+        submission: QuizSubmission
+    ) -> Dict[str, Any]:
+        """Grade all answers, then store the attempt"""
+        while True:
+            key_version = quiz.key_version
+            with grading_scheduler.context(submission.user_id):
+                total_score, breakdown, weak_topics, feedback = await grading_service.grade_quiz(
+                    questions=quiz.questions,
+                    answers=submission.answers,
+                    gemini_file_id=chapter.gemini_file_id,
+                    plan=grading_plans.get(quiz.id, quiz.questions, key_version),
+                )
+            if self._lock_key_version(db, quiz, key_version):
+                break
+            logger.info(f"Answer key of quiz {quiz.id} patched while grading a submission, regrading")
+            db.commit()  # Do not hold the lock across model calls
+
+        attempt = QuizAttempt(
+            user_id=submission.user_id,
+            quiz_id=quiz.id,
+            answers=submission.answers,
+            scores=breakdown,
+            total_score=total_score,
+            weak_topics=weak_topics,
+            feedback=feedback,
+            grading_status=self.STATUS_COMPLETED,
+        )
+        db.add(attempt)
+        attempt_stats.record_attempt(db, quiz, attempt)
+        db.commit()
+        event_bus.publish(ATTEMPTS_CHANGED, chapter_id=quiz.chapter_id, user_ids=[submission.user_id])
+
+        logger.info(f"Quiz attempt saved: {attempt.id}, score: {total_score}")
+
+        return self.build_response_data(
+            quiz.questions, total_score, breakdown, weak_topics, feedback, attempt
+        )
+
+    async def submit_bulk(
+        self,
+        db: Session,
+        quiz: Quiz,
+        chapter: Chapter,
+        submissions: List[QuizSubmission]
+    ) -> List[Dict[str, Any]]:
+        """
+        Grade many answer sheets together and store all attempts in one bulk insert
+
+        Returns:
+            Response payload (with user_id and attempt_id) per submission, in order
+        """
+        while True:
+            key_version = quiz.key_version
+            # Bulk work is scheduled behind interactive submissions, fair per quiz
+            with grading_scheduler.context(f"bulk:{quiz.id}", PRIORITY_BULK):
+                graded = await grading_service.grade_submissions(
+                    plan=grading_plans.get(quiz.id, quiz.questions, key_version),
+                    answer_sets=[submission.answers for submission in submissions],
+                    gemini_file_id=chapter.gemini_file_id,
+                )
+            if self._lock_key_version(db, quiz, key_version):
+                break
+            logger.info(f"Answer key of quiz {quiz.id} patched while grading a bulk submission, regrading")
+            db.commit()  # Do not hold the lock across model calls
+
+        rows = []
+        results = []
+        for submission, (total_score, breakdown, weak_topics, feedback) in zip(submissions, graded):
+            attempt_id = uuid.uuid4()
+            rows.append({
+                "id": attempt_id,
+                "user_id": submission.user_id,
+                "quiz_id": quiz.id,
+                "answers": submission.answers,
+                "scores": breakdown,
+                "total_score": total_score,
+                "weak_topics": weak_topics,
+                "feedback": feedback,
+                "grading_status": self.STATUS_COMPLETED,
+            })
+
+            data = self.build_response_data(
+                quiz.questions, total_score, breakdown, weak_topics, feedback
+            )
+            data["attempt_id"] = attempt_id
+            data["user_id"] = submission.user_id
+            results.append(data)
+
+        db.execute(insert(QuizAttempt), rows)
+        attempt_stats.record(db, quiz, rows)
+        db.commit()
+        event_bus.publish(
+            ATTEMPTS_CHANGED,
+            chapter_id=quiz.chapter_id,
+            user_ids=[submission.user_id for submission in submissions]
+        )
+
+        logger.info(f"Bulk submission saved: {len(rows)} attempts for quiz {quiz.id}")
+        return results
+
+    async def submit_deferred(
+        self,
+        db: Session,
+        quiz: Quiz,
+        chapter: Chapter,
+        submission: QuizSubmission
+    ) -> Dict[str, Any]:
+        """
+        Store the attempt with objective scores now; grade the rest in the background
+
+        Falls back to grading inline if the job cannot be enqueued.
+        """
+        plan = grading_plans.get(quiz.id, quiz.questions, quiz.key_version)
+        results = grading_service.grade_objective(plan, submission.answers)
+        total_score, breakdown, weak_topics, feedback = grading_service.summarize(
+            plan, submission.answers, results
+        )
+        has_pending = any(result is None for result in results)
+
+        attempt = QuizAttempt(
+            user_id=submission.user_id,
+            quiz_id=quiz.id,
+            answers=submission.answers,
+            scores=breakdown,
+            total_score=total_score,
+            weak_topics=weak_topics,
+            feedback=feedback,
+            grading_status=self.STATUS_PENDING if has_pending else self.STATUS_COMPLETED,
+        )
+        db.add(attempt)
+        if not has_pending:
+            # Pending attempts get their items once grading completes
+            attempt_stats.record_attempt(db, quiz, attempt)
+        db.commit()
+        event_bus.publish(ATTEMPTS_CHANGED, chapter_id=quiz.chapter_id, user_ids=[submission.user_id])
+
+        if has_pending:
+            try:
+                job_queue.enqueue(GRADE_ATTEMPT_JOB, {"attempt_id": str(attempt.id)})
+                logger.info(f"Quiz attempt saved with pending grading: {attempt.id}")
+            except Exception as e:
+                logger.error(f"Failed to enqueue grading for {attempt.id}, grading inline: {str(e)}")
+                await self._complete_attempt(db, attempt, quiz, chapter)
+
+        return self.attempt_response_data(db, attempt)
+
+    async def run_grading_job(self, job_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Job handler: finish grading a pending attempt with a worker-owned session"""
+        db = SessionLocal()
+        try:
+            attempt = db.query(QuizAttempt).filter(QuizAttempt.id == payload["attempt_id"]).first()
+            if not attempt:
+                raise ValueError("Quiz attempt not found")
+
+            if attempt.grading_status != self.STATUS_COMPLETED:
+                quiz = db.query(Quiz).filter(Quiz.id == attempt.quiz_id).first()
+                chapter = quiz and db.query(Chapter).filter(Chapter.id == quiz.chapter_id).first()
+                if not chapter:
+                    attempt.grading_status = self.STATUS_FAILED
+                    db.commit()
+                    raise ValueError("Quiz or chapter not found")
+
+                await self._complete_attempt(db, attempt, quiz, chapter)
+
+            return {
+                "attempt_id": str(attempt.id),
+                "grading_status": attempt.grading_status,
+                "total_score": float(attempt.total_score or 0),
+            }
+        finally:
+            db.close()
+
+    async def _complete_attempt(
+        self,
+        db: Session,
+        attempt: QuizAttempt,
+        quiz: Quiz,
+        chapter: Chapter
+    ) -> None:
+        """Grade every answer of a stored attempt and mark it completed (or failed)"""
+        try:
+            while True:
+                key_version = quiz.key_version
+                # The user is waiting on this result: interactive lane
+                with grading_scheduler.context(attempt.user_id):
+                    total_score, breakdown, weak_topics, feedback = await grading_service.grade_quiz(
+                        questions=quiz.questions,
+                        answers=attempt.answers or {},
+                        gemini_file_id=chapter.gemini_file_id,
+                        plan=grading_plans.get(quiz.id, quiz.questions, key_version),
+                    )
+
+                if self._lock_key_version(db, quiz, key_version):
+                    break
+                logger.info(f"Answer key of quiz {quiz.id} patched while grading {attempt.id}, regrading")
+                db.commit()  # Do not hold the lock across model calls
+        except Exception:
+            db.rollback()
+            attempt.grading_status = self.STATUS_FAILED
+            db.commit()
+            raise
+
+        attempt.scores = breakdown
+        attempt.total_score = total_score
+        attempt.weak_topics = weak_topics
+        attempt.feedback = feedback
+        attempt.grading_status = self.STATUS_COMPLETED
+        attempt_stats.replace(db, quiz, [attempt])
+        db.commit()
+        event_bus.publish(ATTEMPTS_CHANGED, chapter_id=quiz.chapter_id, user_ids=[attempt.user_id])
+
+        logger.info(f"Deferred grading completed: {attempt.id}, score: {total_score}")
+
+
+# Global instance
+submission_service = SubmissionService()
+job_queue.register(GRADE_ATTEMPT_JOB, submission_service.run_grading_job)
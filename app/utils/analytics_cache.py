@@ -0,0 +1,169 @@
+"""
+Versioned Redis cache for analytics responses
+"""
+import json
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional
+from app.config import settings
+from app.utils.cache import cache_service
+from app.utils.events import (
+    event_bus, ATTEMPTS_CHANGED, PROGRESS_UPDATED, ROLLUPS_UPDATED, ANALYTICS_REBUILT
+)
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SCOPE_USER = "user"
+SCOPE_CHAPTER = "chapter"
+
+
+class AnalyticsCache:
+    """
+    Response cache for the user performance and chapter analytics endpoints
+
+    Keys:
+    - `analytics:ver:{scope}:{id}`: version counter, bumped (INCR) by the
+      event bus whenever attempts or progress of that user/chapter change
+    - `analytics:epoch`: global counter, bumped when admin jobs rebuild
+      the derived tables for everyone
+    - `analytics:{scope}:{id}:{epoch}.{version}`: cached response body (TTL)
+
+    Entries are never deleted or scanned for: a version bump makes the old
+    entry unreachable and it expires on its own. A reader that read the
+    version before a concurrent write stores its result under the old
+    version, so stale data is never served under the new one. The
+    `{epoch}.{version}` pair doubles as the ETag. New counters start from
+    the current time in ms, so ETags stay unique even if counters expire
+    or Redis loses them.
+    """
+
+    VERSION_PREFIX = "analytics:ver:"
+    EPOCH_KEY = "analytics:epoch"
+    ENTRY_PREFIX = "analytics:"
+
+    def __init__(self, redis_client, ttl: int):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        # Counters outlive entries; an expired counter restarts at the current time
+        self.version_ttl = ttl * 24
+
+        metrics.register_hit_rate("analytics_cache")
+
+    def version(self, scope: str, key: Any) -> Optional[str]:
+        """Current `{epoch}.{version}` of a user's/chapter's analytics, or None if Redis is unavailable"""
+        if not self.redis_client:
+            return None
+
+        version_key = f"{self.VERSION_PREFIX}{scope}:{key}"
+        try:
+            epoch, value = self.redis_client.mget(self.EPOCH_KEY, version_key)
+            if epoch is None or value is None:
+                if epoch is None:
+                    self.redis_client.set(self.EPOCH_KEY, self._initial_version(), nx=True)
+                if value is None:
+                    self.redis_client.set(
+                        version_key, self._initial_version(), nx=True, ex=self.version_ttl
+                    )
+                epoch, value = self.redis_client.mget(self.EPOCH_KEY, version_key)
+            return f"{int(epoch)}.{int(value)}"
+        except Exception as e:
+            logger.error(f"Analytics cache version error: {str(e)}")
+            return None
+
+    def etag(self, scope: str, version: Optional[str], variant: str = "") -> Optional[str]:
+        """Weak ETag for a version; `variant` distinguishes e.g. time windows"""
+        if version is None:
+            return None
+        suffix = f"-{variant}" if variant else ""
+        return f'W/"{scope}-{version}{suffix}"'
+
+    def get(self, scope: str, key: Any, version: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Cached response for this version, or None"""
+        if version is None:
+            return None
+
+        try:
+            value = self.redis_client.get(f"{self.ENTRY_PREFIX}{scope}:{key}:{version}")
+        except Exception as e:
+            logger.error(f"Analytics cache get error: {str(e)}")
+            return None
+
+        if value is None:
+            metrics.incr("analytics_cache_misses")
+            return None
+        metrics.incr("analytics_cache_hits")
+        return json.loads(value)
+
+    def set(self, scope: str, key: Any, version: Optional[str], value: Dict[str, Any]) -> None:
+        """Store a response computed after reading `version`"""
+        if version is None:
+            return
+
+        try:
+            self.redis_client.setex(
+                f"{self.ENTRY_PREFIX}{scope}:{key}:{version}",
+                self.ttl,
+                json.dumps(value, default=str)
+            )
+        except Exception as e:
+            logger.error(f"Analytics cache set error: {str(e)}")
+
+    def invalidate(self, scope: str, keys: Iterable[Any]) -> None:
+        """Bump the version of each key (one round trip)"""
+        if not self.redis_client:
+            return
+
+        version_keys = [f"{self.VERSION_PREFIX}{scope}:{key}" for key in set(map(str, keys))]
+        if not version_keys:
+            return
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for version_key in version_keys:
+            pipe.incr(version_key)
+        for version_key, value in zip(version_keys, pipe.execute()):
+            if value == 1:
+                # Counter was missing: nothing cached under it, but never reuse small versions
+                self.redis_client.set(version_key, self._initial_version(), ex=self.version_ttl)
+        metrics.incr(f"analytics_cache_invalidations_{scope}", len(version_keys))
+
+    def invalidate_all(self) -> None:
+        """Bump the global epoch: every cached response and ETag becomes stale"""
+        if not self.redis_client:
+            return
+
+        try:
+            if self.redis_client.incr(self.EPOCH_KEY) == 1:
+                self.redis_client.set(self.EPOCH_KEY, self._initial_version())
+            metrics.incr("analytics_cache_invalidations_all")
+        except Exception as e:
+            logger.error(f"Analytics cache epoch error: {str(e)}")
+
+    def _initial_version(self) -> int:
+        return int(time.time() * 1000)
+
+    def on_attempts_changed(self, chapter_id: Any, user_ids: Iterable[Any]) -> None:
+        self.invalidate(SCOPE_CHAPTER, [chapter_id])
+        self.invalidate(SCOPE_USER, user_ids)
+
+    def on_progress_updated(self, chapter_id: Any, user_id: Any) -> None:
+        self.invalidate(SCOPE_CHAPTER, [chapter_id])
+        self.invalidate(SCOPE_USER, [user_id])
+
+    def on_rollups_updated(self, chapter_ids: Iterable[Any]) -> None:
+        # Windowed chapter responses are served from the rollups
+        self.invalidate(SCOPE_CHAPTER, chapter_ids)
+
+    def on_analytics_rebuilt(self) -> None:
+        self.invalidate_all()
+
+
+# Global instance
+analytics_cache = AnalyticsCache(
+    redis_client=cache_service.redis_client,
+    ttl=settings.ANALYTICS_CACHE_TTL
+)
+event_bus.subscribe(ATTEMPTS_CHANGED, analytics_cache.on_attempts_changed)
+event_bus.subscribe(PROGRESS_UPDATED, analytics_cache.on_progress_updated)
+event_bus.subscribe(ROLLUPS_UPDATED, analytics_cache.on_rollups_updated)
+event_bus.subscribe(ANALYTICS_REBUILT, analytics_cache.on_analytics_rebuilt)
@@ -0,0 +1,55 @@
+"""
+In-process event bus for domain events
+"""
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Quiz attempts were stored or their grades changed.
+# Payload: chapter_id, user_ids
+ATTEMPTS_CHANGED = "attempts_changed"
+
+# A user's chapter progress was updated.
+# Payload: chapter_id, user_id
+PROGRESS_UPDATED = "progress_updated"
+
+# The rollup job recomputed time buckets of these chapters.
+# Payload: chapter_ids
+ROLLUPS_UPDATED = "rollups_updated"
+
+# Derived analytics were rebuilt or backfilled wholesale (admin jobs).
+# Payload: none
+ANALYTICS_REBUILT = "analytics_rebuilt"
+
+EventHandler = Callable[..., None]
+
+
+class EventBus:
+    """
+    Synchronous publish/subscribe between services
+
+    Publishers fire events after their transaction commits; subscribers
+    (e.g. cache invalidation) run inline. A failing subscriber is logged
+    and never fails the publisher's request. Cross-process effects belong
+    in shared state (Redis), not in the bus itself.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[EventHandler]] = defaultdict(list)
+
+    def subscribe(self, event: str, handler: EventHandler) -> None:
+        """Call `handler(**payload)` whenever `event` is published"""
+        self._handlers[event].append(handler)
+
+    def publish(self, event: str, **payload: Any) -> None:
+        for handler in self._handlers.get(event, ()):
+            try:
+                handler(**payload)
+            except Exception as e:
+                logger.error(f"Event handler {getattr(handler, '__qualname__', handler)} failed for {event}: {str(e)}")
+
+
+# Global instance
+event_bus = EventBus()
@@ -0,0 +1,167 @@
+"""
+Fair scheduler for model grading calls
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Tuple
+from app.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0  # A user is waiting on the result (submit, deferred submit)
+PRIORITY_BULK = 1  # Bulk classroom submissions
+PRIORITY_REGRADE = 2  # Admin regrades of historical attempts
+
+LANE_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BULK: "bulk",
+    PRIORITY_REGRADE: "regrade",
+}
+
+# (owner key, priority) of the grading work running in the current task
+_grading_context: ContextVar[Tuple[str, int]] = ContextVar(
+    "grading_context", default=("anonymous", PRIORITY_INTERACTIVE)
+)
+
+
+class FairScheduler:
+    """
+    Admission control for model grading calls
+
+    - Global cap: at most `max_concurrent` grading calls in flight
+    - Priority lanes: interactive before bulk before regrade; a request
+      waiting longer than `max_wait` seconds is served regardless of lane
+      so background work cannot starve
+    - Within a lane, start-time fair queueing per owner (user id, or quiz
+      for bulk/regrade work): each request is tagged with
+      max(lane virtual time, owner's previous tag) + cost, and the lowest
+      tag runs next. One user submitting 50 quizzes in a loop therefore
+      interleaves with everyone else instead of queueing ahead of them.
+
+    Cost is the number of answers in the call, so a batch of 25 weighs
+    as much as 25 single calls. Owner and priority come from the current
+    context (see `context`), set by whoever starts the grading work.
+    """
+
+    def __init__(self, max_concurrent: int, max_wait: float):
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self._lanes: Dict[int, List[tuple]] = {priority: [] for priority in LANE_NAMES}
+        self._virtual_time: Dict[int, float] = {priority: 0.0 for priority in LANE_NAMES}
+        self._last_tag: Dict[Tuple[int, str], float] = {}
+        self._sequence = itertools.count()
+        self._in_flight = 0
+
+    @contextmanager
+    def context(self, owner: str, priority: int = PRIORITY_INTERACTIVE):
+        """Attribute grading calls made inside this block (and tasks it spawns)"""
+        token = _grading_context.set((str(owner), priority))
+        try:
+            yield
+        finally:
+            _grading_context.reset(token)
+
+    @asynccontextmanager
+    async def slot(self, cost: int = 1):
+        """Wait for a turn, then hold one of the `max_concurrent` call slots"""
+        owner, priority = _grading_context.get()
+        lane = LANE_NAMES.get(priority, "interactive")
+        start = time.monotonic()
+
+        if self._in_flight < self.max_concurrent and not self._queued():
+            self._in_flight += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._push(priority, owner, max(cost, 1), future, start)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Slot was granted just as the waiter was cancelled
+                    self._release()
+                raise
+
+        waited = time.monotonic() - start
+        metrics.observe("grading_queue_wait_seconds", waited)
+        metrics.observe(f"grading_queue_wait_seconds_{lane}", waited)
+        metrics.incr(f"grading_calls_{lane}")
+        metrics.set_gauge("grading_calls_in_flight", self._in_flight)
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _queued(self) -> int:
+        return sum(len(queue) for queue in self._lanes.values())
+
+    def _push(self, priority: int, owner: str, cost: int, future: asyncio.Future, enqueued_at: float) -> None:
+        key = (priority, owner)
+        tag = max(self._virtual_time[priority], self._last_tag.get(key, 0.0)) + cost
+        self._last_tag[key] = tag
+        heapq.heappush(self._lanes[priority], (tag, next(self._sequence), owner, enqueued_at, future))
+        self._update_depth()
+
+    def _pop_next(self):
+        now = time.monotonic()
+
+        # Aging: a request that has waited too long is served first, whatever its
+        # lane; the longest-waiting one wins so an overloaded interactive lane
+        # (whose heads are aged too) cannot starve background work
+        aged = [
+            (queue[0][3], priority)
+            for priority, queue in self._lanes.items()
+            if queue and now - queue[0][3] > self.max_wait
+        ]
+        if aged:
+            _, priority = min(aged)
+            return priority, heapq.heappop(self._lanes[priority])
+
+        for priority in sorted(self._lanes):
+            queue = self._lanes[priority]
+            if queue:
+                return priority, heapq.heappop(queue)
+        return None
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.max_concurrent:
+            picked = self._pop_next()
+            if picked is None:
+                break
+
+            priority, (tag, _, owner, _, future) = picked
+            self._virtual_time[priority] = max(self._virtual_time[priority], tag)
+            if self._last_tag.get((priority, owner)) == tag:
+                # Owner has nothing else queued in this lane
+                del self._last_tag[(priority, owner)]
+
+            if future.cancelled():
+                continue
+
+            self._in_flight += 1
+            future.set_result(None)
+
+        self._update_depth()
+        metrics.set_gauge("grading_calls_in_flight", self._in_flight)
+
+    def _update_depth(self) -> None:
+        for priority, queue in self._lanes.items():
+            metrics.set_gauge(f"grading_queue_depth_{LANE_NAMES[priority]}", len(queue))
+        metrics.set_gauge("grading_queue_depth", self._queued())
+
+
+# Global instance
+grading_scheduler = FairScheduler(
+    max_concurrent=settings.GRADING_MAX_CONCURRENT_CALLS,
+    max_wait=settings.GRADING_SCHEDULER_MAX_WAIT
+)
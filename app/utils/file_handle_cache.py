@@ -0,0 +1,108 @@
+"""
+Cache of Gemini File API handles
+"""
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class FileHandleCache:
+    """
+    Two-level cache that avoids a genai.get_file() round trip per call
+
+    - L1: in-process dict {gemini_file_id: (handle, expires_at)}
+    - L2: Redis metadata (uri, mime_type, expires_at) shared by all
+      workers; a hit is turned into a `file_data` content part, which
+      generate_content accepts in place of the File object
+
+    Entries expire after `ttl` seconds, or `refresh_margin` seconds before
+    the File API's own expiration, whichever comes first.
+    """
+
+    REDIS_PREFIX = "gemini_file:"
+
+    def __init__(self, redis_client, fetch: Callable[[str], Any], ttl: int, refresh_margin: int):
+        self.redis_client = redis_client
+        self.fetch = fetch
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self._local: Dict[str, Tuple[Any, float]] = {}
+
+        metrics.register_hit_rate("gemini_file_cache")
+
+    def get(self, gemini_file_id: str) -> Any:
+        """Return a handle usable as a generate_content part"""
+        now = time.time()
+
+        entry = self._local.get(gemini_file_id)
+        if entry and entry[1] > now:
+            metrics.incr("gemini_file_cache_hits")
+            metrics.incr("gemini_file_cache_local_hits")
+            return entry[0]
+
+        meta = self._get_shared(gemini_file_id)
+        if meta and meta["expires_at"] > now:
+            handle = {"file_data": {"file_uri": meta["uri"], "mime_type": meta["mime_type"]}}
+            self._local[gemini_file_id] = (handle, meta["expires_at"])
+            metrics.incr("gemini_file_cache_hits")
+            metrics.incr("gemini_file_cache_redis_hits")
+            return handle
+
+        metrics.incr("gemini_file_cache_misses")
+        uploaded_file = self.fetch(gemini_file_id)
+        self.put(gemini_file_id, uploaded_file)
+        return uploaded_file
+
+    def put(self, gemini_file_id: str, uploaded_file: Any) -> None:
+        """Store a freshly fetched or uploaded File object"""
+        now = time.time()
+        expires_at = now + self.ttl
+
+        expiration = getattr(uploaded_file, "expiration_time", None)
+        if expiration is not None:
+            try:
+                expires_at = min(expires_at, expiration.timestamp() - self.refresh_margin)
+            except (AttributeError, TypeError):
+                pass
+
+        if expires_at <= now:
+            return
+
+        self._local[gemini_file_id] = (uploaded_file, expires_at)
+        self._set_shared(gemini_file_id, uploaded_file, expires_at)
+
+    def invalidate(self, gemini_file_id: str) -> None:
+        self._local.pop(gemini_file_id, None)
+        if self.redis_client:
+            try:
+                self.redis_client.delete(f"{self.REDIS_PREFIX}{gemini_file_id}")
+            except Exception as e:
+                logger.error(f"File cache delete error: {str(e)}")
+
+    def _get_shared(self, gemini_file_id: str) -> Optional[Dict[str, Any]]:
+        if not self.redis_client:
+            return None
+        try:
+            value = self.redis_client.get(f"{self.REDIS_PREFIX}{gemini_file_id}")
+            return json.loads(value) if value else None
+        except Exception as e:
+            logger.error(f"File cache get error: {str(e)}")
+            return None
+
+    def _set_shared(self, gemini_file_id: str, uploaded_file: Any, expires_at: float) -> None:
+        uri = getattr(uploaded_file, "uri", None)
+        mime_type = getattr(uploaded_file, "mime_type", None)
+        if not self.redis_client or not uri or not mime_type:
+            return
+        try:
+            self.redis_client.setex(
+                f"{self.REDIS_PREFIX}{gemini_file_id}",
+                max(1, int(expires_at - time.time())),
+                json.dumps({"uri": uri, "mime_type": mime_type, "expires_at": expires_at})
+            )
+        except Exception as e:
+            logger.error(f"File cache set error: {str(e)}")
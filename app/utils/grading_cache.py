@@ -0,0 +1,106 @@
+"""
+Memoization of model grading results
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from app.config import settings
+from app.utils.cache import cache_service
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class GradingCache:
+    """
+    Two-level cache of (score, feedback) for subjective answers
+
+    Key: SHA256 of (question text, correct_answer, normalized user answer),
+    so identical or trivially different answers (case, whitespace,
+    punctuation) to the same question are graded by the model only once.
+
+    - L1: in-process LRU (GRADING_CACHE_LOCAL_SIZE entries)
+    - L2: Redis with a long TTL (GRADING_CACHE_TTL), shared by all workers
+    """
+
+    REDIS_PREFIX = "grade:"
+
+    def __init__(self, redis_client, max_local: int, ttl: int):
+        self.redis_client = redis_client
+        self.max_local = max_local
+        self.ttl = ttl
+        self._local: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        metrics.register_hit_rate("grading_cache")
+
+    @staticmethod
+    def normalize(answer: Any) -> str:
+        """Lowercase, drop punctuation (keeping decimal points and math symbols), collapse whitespace"""
+        text = unicodedata.normalize("NFKC", str(answer)).lower()
+        text = re.sub(r"[^\w\s.\-+/*^=()%√π]", " ", text)
+        # Keep '.' only as a decimal point
+        text = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", text)
+        return " ".join(text.split())
+
+    def make_key(self, question: str, correct_answer: Any, user_answer: Any) -> str:
+        key_string = json.dumps(
+            [" ".join(str(question).split()), str(correct_answer).strip(), self.normalize(user_answer)]
+        )
+        return hashlib.sha256(key_string.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[float, str]]:
+        """Return cached (score, feedback) or None"""
+        with self._lock:
+            if key in self._local:
+                self._local.move_to_end(key)
+                metrics.incr("grading_cache_hits")
+                metrics.incr("grading_cache_local_hits")
+                return self._local[key]
+
+        if self.redis_client:
+            try:
+                value = self.redis_client.get(f"{self.REDIS_PREFIX}{key}")
+                if value:
+                    score, feedback = json.loads(value)
+                    self._remember(key, (score, feedback))
+                    metrics.incr("grading_cache_hits")
+                    metrics.incr("grading_cache_redis_hits")
+                    return score, feedback
+            except Exception as e:
+                logger.error(f"Grading cache get error: {str(e)}")
+
+        metrics.incr("grading_cache_misses")
+        return None
+
+    def set(self, key: str, score: float, feedback: str) -> None:
+        """Store a model grading result"""
+        self._remember(key, (score, feedback))
+
+        if self.redis_client:
+            try:
+                self.redis_client.setex(
+                    f"{self.REDIS_PREFIX}{key}", self.ttl, json.dumps([score, feedback])
+                )
+            except Exception as e:
+                logger.error(f"Grading cache set error: {str(e)}")
+
+    def _remember(self, key: str, value: Tuple[float, str]) -> None:
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_local:
+                self._local.popitem(last=False)
+
+
+# Global instance
+grading_cache = GradingCache(
+    redis_client=cache_service.redis_client,
+    max_local=settings.GRADING_CACHE_LOCAL_SIZE,
+    ttl=settings.GRADING_CACHE_TTL
+)
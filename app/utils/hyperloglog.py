@@ -0,0 +1,115 @@
+"""
+HyperLogLog sketches for approximate distinct counting
+"""
+import hashlib
+import math
+import zlib
+from typing import Any, Iterable, Optional
+
+DEFAULT_PRECISION = 14  # 2^14 registers: ~0.81% standard error
+
+_FORMAT_VERSION = 1
+_HASH_BITS = 64
+
+# 2^-rank for every possible register value
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(_HASH_BITS + 2)]
+
+
+def relative_error(precision: int = DEFAULT_PRECISION) -> float:
+    """Standard error of the estimate: 1.04 / sqrt(2^precision)"""
+    return 1.04 / math.sqrt(1 << precision)
+
+
+class HyperLogLog:
+    """
+    Mergeable distinct-count sketch (Flajolet et al., 64-bit hashes)
+
+    - `add`/`update` report whether any register changed, so callers can
+      skip writing back a sketch that already counted everyone
+    - `merge` is a register-wise max: the sketch of a union of sets
+    - `to_bytes`/`from_bytes` give a compact, zlib-compressed encoding for
+      storage in BYTEA columns; sparse sketches (one hour of one chapter)
+      compress to a few hundred bytes
+
+    Estimates have a standard error of `relative_error(precision)` (about
+    0.81% at the default precision; ~95% of estimates fall within twice
+    that). Small cardinalities use linear counting and are near exact.
+    """
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: Optional[bytearray] = None):
+        if not 4 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 4 and 18")
+        self.precision = precision
+        self.registers = registers if registers is not None else bytearray(1 << precision)
+
+    @staticmethod
+    def _hash(value: Any) -> int:
+        # Stable across processes (unlike hash()); str() normalizes UUIDs
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def add(self, value: Any) -> bool:
+        """Add one value; returns whether the sketch changed"""
+        x = self._hash(value)
+        remaining_bits = _HASH_BITS - self.precision
+        index = x >> remaining_bits
+        rank = remaining_bits - (x & ((1 << remaining_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def update(self, values: Iterable[Any]) -> bool:
+        """Add many values; returns whether the sketch changed"""
+        changed = False
+        for value in values:
+            changed = self.add(value) or changed
+        return changed
+
+    def merge(self, other: "HyperLogLog") -> bool:
+        """Union `other` into this sketch; returns whether it changed"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        merged = bytearray(map(max, self.registers, other.registers))
+        changed = merged != self.registers
+        self.registers = merged
+        return changed
+
+    def count(self) -> int:
+        """Estimated number of distinct values added"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(_INVERSE_POWERS[rank] for rank in self.registers)
+
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return bytes([_FORMAT_VERSION, self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        if len(data) < 2 or data[0] != _FORMAT_VERSION:
+            raise ValueError("Unsupported HyperLogLog encoding")
+        precision = data[1]
+        try:
+            registers = bytearray(zlib.decompress(data[2:]))
+        except zlib.error as e:
+            raise ValueError(f"Corrupt HyperLogLog sketch: {str(e)}")
+        if len(registers) != 1 << precision:
+            raise ValueError("Corrupt HyperLogLog sketch")
+        return cls(precision, registers)
+
+    @classmethod
+    def union(cls, encoded: Iterable[Optional[bytes]], precision: int = DEFAULT_PRECISION) -> "HyperLogLog":
+        """Merge stored sketches (None/empty entries are skipped)"""
+        sketch = cls(precision)
+        for data in encoded:
+            if data:
+                sketch.merge(cls.from_bytes(bytes(data)))
+        return sketch
@@ -0,0 +1,218 @@
+"""
+Durable Redis-backed job queue with an in-process worker pool
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.config import settings
+from app.utils.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    Reliable queue for long-running work (quiz generation, deferred grading,
+    regrades)
+
+    Storage:
+    - `jobs:queue`: pending job ids (LPUSH / BRPOPLPUSH)
+    - `jobs:processing`: ids taken by a worker but not finished yet
+    - `job:{id}`: hash with type, status, payload, progress, result, error,
+      timestamps
+
+    Jobs left in `jobs:processing` by a crashed worker are re-queued on
+    startup once they have not been updated for JOB_STALE_AFTER seconds.
+    """
+
+    QUEUE_KEY = "jobs:queue"
+    PROCESSING_KEY = "jobs:processing"
+    JOB_PREFIX = "job:"
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    FINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+    def __init__(self, redis_client, num_workers: int, job_ttl: int, stale_after: int):
+        self.redis_client = redis_client
+        self.num_workers = num_workers
+        self.job_ttl = job_ttl
+        self.stale_after = stale_after
+        self._handlers: Dict[str, JobHandler] = {}
+        self._workers: List[asyncio.Task] = []
+        self._running = False
+
+    @property
+    def available(self) -> bool:
+        return self.redis_client is not None
+
+    def register(self, job_type: str, handler: JobHandler) -> None:
+        """Register the coroutine that processes jobs of `job_type`"""
+        self._handlers[job_type] = handler
+
+    def enqueue(self, job_type: str, payload: Dict[str, Any]) -> str:
+        """
+        Persist and enqueue a job
+
+        Returns:
+            Job id
+
+        Raises:
+            RuntimeError: if Redis is unavailable
+        """
+        if not self.available:
+            raise RuntimeError("Job queue unavailable (Redis not connected)")
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        job_key = f"{self.JOB_PREFIX}{job_id}"
+
+        pipe = self.redis_client.pipeline()
+        pipe.hset(job_key, mapping={
+            "id": job_id,
+            "type": job_type,
+            "status": self.STATUS_QUEUED,
+            "payload": json.dumps(payload, default=str),
+            "created_at": now,
+            "updated_at": now,
+        })
+        pipe.expire(job_key, self.job_ttl)
+        pipe.lpush(self.QUEUE_KEY, job_id)
+        pipe.execute()
+
+        logger.info(f"Job enqueued: {job_type} {job_id}")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return job state or None if unknown/expired"""
+        if not self.available:
+            return None
+
+        raw = self.redis_client.hgetall(f"{self.JOB_PREFIX}{job_id}")
+        if not raw:
+            return None
+
+        return {
+            "job_id": raw["id"],
+            "type": raw["type"],
+            "status": raw["status"],
+            "result": json.loads(raw["result"]) if raw.get("result") else None,
+            "progress": json.loads(raw["progress"]) if raw.get("progress") else None,
+            "error": raw.get("error") or None,
+            "created_at": float(raw["created_at"]),
+            "updated_at": float(raw["updated_at"]),
+        }
+
+    def set_progress(self, job_id: str, progress: Dict[str, Any]) -> None:
+        """
+        Record progress of a running job
+
+        Also refreshes updated_at, so long jobs that report progress are
+        not mistaken for stale ones.
+        """
+        try:
+            self._update(job_id, progress=json.dumps(progress, default=str))
+        except Exception as e:
+            logger.error(f"Job progress update failed for {job_id}: {str(e)}")
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        self.redis_client.hset(f"{self.JOB_PREFIX}{job_id}", mapping=fields)
+
+    async def start(self) -> None:
+        """Re-queue stale jobs and start the worker pool"""
+        if not self.available or self._running:
+            return
+
+        self._requeue_stale()
+        self._running = True
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.num_workers)
+        ]
+        logger.info(f"Job queue started with {self.num_workers} workers")
+
+    async def stop(self) -> None:
+        """Stop workers; unfinished jobs stay in the processing list"""
+        self._running = False
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _requeue_stale(self) -> None:
+        cutoff = time.time() - self.stale_after
+        for job_id in self.redis_client.lrange(self.PROCESSING_KEY, 0, -1):
+            updated_at = self.redis_client.hget(f"{self.JOB_PREFIX}{job_id}", "updated_at")
+            if updated_at is None:
+                # Job hash expired; drop the dangling id
+                self.redis_client.lrem(self.PROCESSING_KEY, 1, job_id)
+            elif float(updated_at) < cutoff:
+                pipe = self.redis_client.pipeline()
+                pipe.lrem(self.PROCESSING_KEY, 1, job_id)
+                pipe.rpush(self.QUEUE_KEY, job_id)
+                pipe.execute()
+                logger.warning(f"Re-queued stale job {job_id}")
+
+    async def _worker(self, index: int) -> None:
+        while self._running:
+            try:
+                # Blocking pop runs in a thread; short timeout keeps shutdown responsive
+                job_id = await asyncio.to_thread(
+                    self.redis_client.brpoplpush, self.QUEUE_KEY, self.PROCESSING_KEY, 1
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {index} queue error: {str(e)}")
+                await asyncio.sleep(1)
+                continue
+
+            if job_id:
+                await self._process(job_id)
+
+    async def _process(self, job_id: str) -> None:
+        job_key = f"{self.JOB_PREFIX}{job_id}"
+        raw = self.redis_client.hgetall(job_key)
+        if not raw:
+            self.redis_client.lrem(self.PROCESSING_KEY, 1, job_id)
+            return
+
+        handler = self._handlers.get(raw["type"])
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job type {raw['type']}")
+
+            self._update(job_id, status=self.STATUS_RUNNING)
+            result = await handler(job_id, json.loads(raw["payload"]))
+            self._update(
+                job_id,
+                status=self.STATUS_COMPLETED,
+                result=json.dumps(result, default=str),
+            )
+            logger.info(f"Job completed: {raw['type']} {job_id}")
+        except asyncio.CancelledError:
+            # Left in the processing list; re-queued on a later startup
+            raise
+        except Exception as e:
+            logger.error(f"Job failed: {raw['type']} {job_id}: {str(e)}")
+            self._update(job_id, status=self.STATUS_FAILED, error=str(e))
+
+        self.redis_client.lrem(self.PROCESSING_KEY, 1, job_id)
+
+
+# Global instance
+job_queue = JobQueue(
+    redis_client=cache_service.redis_client,
+    num_workers=settings.JOB_WORKERS,
+    job_ttl=settings.JOB_TTL,
+    stale_after=settings.JOB_STALE_AFTER
+)
@@ -0,0 +1,86 @@
+"""
+Incremental parser for streamed JSON arrays of objects
+"""
+import json
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class JsonArrayStreamParser:
+    """
+    Emits each top-level object of a JSON array as soon as it is complete
+
+    Text before the opening `[` (e.g. a ```json fence) is ignored, as is
+    everything after the closing `]`. Only object elements are supported,
+    which is what the quiz prompt asks Gemini for.
+
+    Usage:
+        parser = JsonArrayStreamParser()
+        for chunk in stream:
+            for item in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_array = False
+        self._in_string = False
+        self._escape = False
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Consume a chunk of text
+
+        Returns:
+            Objects completed by this chunk, in order
+        """
+        items = []
+
+        for ch in chunk:
+            if self.done:
+                break
+
+            if not self._in_array:
+                if ch == "[":
+                    self._in_array = True
+                continue
+
+            if self._depth == 0:
+                # Between elements: whitespace and commas
+                if ch == "{":
+                    self._depth = 1
+                    self._buffer = [ch]
+                elif ch == "]":
+                    self.done = True
+                continue
+
+            self._buffer.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    element = "".join(self._buffer)
+                    self._buffer = []
+                    try:
+                        items.append(json.loads(element))
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Skipping malformed streamed element: {str(e)}")
+
+        return items
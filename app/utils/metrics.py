@@ -0,0 +1,89 @@
+"""
+Lightweight in-process metrics registry
+"""
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Any
+
+
+class Metrics:
+    """
+    Counters, gauges and timing summaries for this worker process
+
+    Exposed as JSON at GET /metrics. Thread-safe, since some counters are
+    updated from executor threads (Gemini calls).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._derived: Dict[str, Callable[[], float]] = {}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        """Increment a counter"""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a point-in-time value"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a sample (e.g. a duration in seconds) into a count/sum/max summary"""
+        with self._lock:
+            summary = self._timings.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def register_derived(self, name: str, fn: Callable[[], float]) -> None:
+        """Register a value computed at snapshot time (e.g. a hit rate)"""
+        self._derived[name] = fn
+
+    def register_hit_rate(
+        self,
+        prefix: str,
+        hit: str = "hits",
+        miss: str = "misses",
+        name: str = ""
+    ) -> None:
+        """
+        Register `{prefix}_hit_rate` as {prefix}_{hit} / ({prefix}_{hit} + {prefix}_{miss})
+
+        Args:
+            prefix: Counter prefix, e.g. "grading_cache"
+            hit: Suffix of the counter of successful lookups
+            miss: Suffix of the counter of the rest
+            name: Metric name when `{prefix}_hit_rate` does not fit
+        """
+        hits, misses = f"{prefix}_{hit}", f"{prefix}_{miss}"
+        self.register_derived(name or f"{prefix}_hit_rate", lambda: self.ratio(hits, hits, misses))
+
+    def ratio(self, numerator: str, *denominator: str) -> float:
+        """numerator / sum(denominator) over counters, 0.0 when empty"""
+        with self._lock:
+            total = sum(self._counters.get(name, 0) for name in denominator)
+            return round(self._counters.get(numerator, 0) / total, 4) if total else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current values of all metrics"""
+        with self._lock:
+            timings = {
+                name: {**summary, "avg": summary["sum"] / summary["count"] if summary["count"] else 0.0}
+                for name, summary in self._timings.items()
+            }
+            snapshot = {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": timings,
+            }
+
+        snapshot["derived"] = {name: fn() for name, fn in self._derived.items()}
+        return snapshot
+
+
+# Global instance
+metrics = Metrics()
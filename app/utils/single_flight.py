@@ -0,0 +1,142 @@
+"""
+Single-flight coalescing for expensive operations (quiz generation)
+"""
+import asyncio
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.config import settings
+from app.utils.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+# Delete the lock only if we still own it
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Ensures only one execution per key is in flight at a time
+
+    - Within a worker: callers for a key already in flight await the
+      leader's asyncio future instead of running the operation again
+    - Across workers: a Redis lock (SET NX PX) elects one leader; other
+      workers poll `lookup` until the leader's result becomes visible
+
+    If Redis is unavailable, coalescing degrades to per-worker only.
+    """
+
+    LOCK_PREFIX = "lock:singleflight:"
+
+    def __init__(self, redis_client, lock_ttl: int, poll_interval: float, wait_timeout: float):
+        self.redis_client = redis_client
+        self.lock_ttl_ms = lock_ttl * 1000
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        lookup: Optional[Callable[[], Awaitable[Optional[Any]]]] = None
+    ) -> Any:
+        """
+        Run `fn` once for all concurrent callers of `key`
+
+        Args:
+            key: Coalescing key (e.g. quiz variant hash)
+            fn: Coroutine function producing the result
+            lookup: Coroutine function returning an already published
+                result or None; used by cross-worker waiters
+
+        Returns:
+            Result of `fn` (or of `lookup` for waiters)
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            logger.info(f"Single-flight: joining in-flight execution for {key}")
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    # Leader was cancelled; take over
+                    return await self.do(key, fn, lookup)
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._run_exclusive(key, fn, lookup)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark as retrieved so an unobserved failure is not logged twice
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _run_exclusive(self, key, fn, lookup):
+        """Run `fn` while holding the cross-worker lock for `key`"""
+        if not self.redis_client:
+            return await fn()
+
+        loop = asyncio.get_running_loop()
+        lock_key = f"{self.LOCK_PREFIX}{key}"
+        token = uuid.uuid4().hex
+        deadline = loop.time() + self.wait_timeout
+
+        while True:
+            try:
+                acquired = self.redis_client.set(lock_key, token, nx=True, px=self.lock_ttl_ms)
+            except Exception as e:
+                logger.error(f"Single-flight lock error: {str(e)}")
+                return await fn()
+
+            if acquired:
+                try:
+                    # Another worker may have finished just before we got the lock
+                    if lookup:
+                        result = await lookup()
+                        if result is not None:
+                            return result
+                    return await fn()
+                finally:
+                    self._release(lock_key, token)
+
+            if lookup:
+                result = await lookup()
+                if result is not None:
+                    logger.info(f"Single-flight: result for {key} published by another worker")
+                    return result
+
+            if loop.time() >= deadline:
+                logger.warning(f"Single-flight: timed out waiting for {key}, running locally")
+                return await fn()
+
+            await asyncio.sleep(self.poll_interval)
+
+    def _release(self, lock_key: str, token: str) -> None:
+        try:
+            self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            logger.error(f"Single-flight unlock error: {str(e)}")
+
+
+# Global instance
+single_flight = SingleFlight(
+    redis_client=cache_service.redis_client,
+    lock_ttl=settings.QUIZ_GENERATION_LOCK_TTL,
+    poll_interval=settings.SINGLE_FLIGHT_POLL_INTERVAL,
+    wait_timeout=settings.SINGLE_FLIGHT_WAIT_TIMEOUT
+)
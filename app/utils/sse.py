@@ -0,0 +1,24 @@
+"""
+Server-Sent Events helpers
+"""
+import json
+from typing import Any
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx)
+}
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Format a single SSE message
+
+    Args:
+        event: Event name
+        data: JSON-serializable payload
+
+    Returns:
+        Wire-format SSE message
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Event loop responsiveness benchmark
+
+Measures /health latency while quiz generations are in flight. With blocking
+Gemini calls on the event loop, p99 of /health jumps to the duration of a
+generation; with the async Gemini path it should stay flat.
+
+Usage:
+    python bench_event_loop.py --chapter-id <uuid> [--generations 20]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def probe_health(client, stop_event, interval):
+    """Hit /health until stop_event is set, returning latencies in ms"""
+    latencies = []
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def generate(client, chapter_id, index):
+    """Request a quiz variant that is unlikely to be cached"""
+    payload = {
+        "difficulty": DIFFICULTIES[index % len(DIFFICULTIES)],
+        "num_mcq": 1 + (index % 10),
+        "num_short": 1 + (index // 10) % 10,
+        "num_numerical": 0,
+    }
+    start = time.perf_counter()
+    response = await client.post(f"/api/quizzes/generate/{chapter_id}", json=payload)
+    return response.status_code, time.perf_counter() - start
+
+
+def report(label, latencies):
+    print(
+        f"  {label:<12} n={len(latencies):<5} "
+        f"p50={percentile(latencies, 50):8.2f}ms "
+        f"p99={percentile(latencies, 99):8.2f}ms "
+        f"max={max(latencies, default=0.0):8.2f}ms"
+    )
+
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        # Baseline: idle server
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_health(client, stop, args.interval))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        baseline = await probe
+
+        # Load: N generations in flight while probing
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_health(client, stop, args.interval))
+        results = await asyncio.gather(
+            *(generate(client, args.chapter_id, i) for i in range(args.generations))
+        )
+        stop.set()
+        loaded = await probe
+
+    print("Health latency")
+    report("baseline", baseline)
+    report("under load", loaded)
+
+    statuses = [status for status, _ in results]
+    durations = [duration for _, duration in results]
+    print(f"Generations: {len(results)} (status codes: {sorted(set(statuses))})")
+    print(f"  mean duration: {statistics.mean(durations):.2f}s, max: {max(durations):.2f}s")
+
+    ratio = percentile(loaded, 99) / max(percentile(baseline, 99), 0.001)
+    print(f"p99 ratio (load / baseline): {ratio:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--chapter-id", required=True)
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--baseline-seconds", type=float, default=5.0)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,107 @@
+"""
+Tests for the versioned analytics response cache
+"""
+import pytest
+
+from app.services.attempt_stats_service import attempt_stats
+from app.utils.analytics_cache import AnalyticsCache, SCOPE_CHAPTER, SCOPE_USER
+from app.utils.events import event_bus, EventBus, ANALYTICS_REBUILT
+
+
+class FakeRedis:
+    """The subset of redis-py (decode_responses=True) AnalyticsCache uses"""
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def mget(self, *keys):
+        return [self.store.get(key) for key in keys]
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.store:
+            return None
+        self.store[key] = str(value)
+        return True
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+
+    def incr(self, key):
+        self.store[key] = str(int(self.store.get(key, 0)) + 1)
+        return int(self.store[key])
+
+    def pipeline(self, transaction=True):
+        redis_client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.keys = []
+
+            def incr(self, key):
+                self.keys.append(key)
+
+            def execute(self):
+                return [redis_client.incr(key) for key in self.keys]
+
+        return Pipeline()
+
+
+@pytest.fixture
+def cache():
+    return AnalyticsCache(FakeRedis(), ttl=60)
+
+
+def test_entries_are_served_until_their_scope_is_invalidated(cache):
+    version = cache.version(SCOPE_CHAPTER, "c1")
+    cache.set(SCOPE_CHAPTER, "c1", version, {"total_attempts": 3})
+
+    assert cache.version(SCOPE_CHAPTER, "c1") == version
+    assert cache.get(SCOPE_CHAPTER, "c1", version) == {"total_attempts": 3}
+
+    cache.on_attempts_changed(chapter_id="c1", user_ids=["u1"])
+
+    new_version = cache.version(SCOPE_CHAPTER, "c1")
+    assert new_version != version
+    assert cache.get(SCOPE_CHAPTER, "c1", new_version) is None
+
+
+def test_invalidate_all_changes_every_version_and_etag(cache):
+    chapter_version = cache.version(SCOPE_CHAPTER, "c1")
+    user_version = cache.version(SCOPE_USER, "u1")
+    etag = cache.etag(SCOPE_CHAPTER, chapter_version, "approx")
+
+    cache.invalidate_all()
+
+    assert cache.version(SCOPE_CHAPTER, "c1") != chapter_version
+    assert cache.version(SCOPE_USER, "u1") != user_version
+    assert cache.etag(SCOPE_CHAPTER, cache.version(SCOPE_CHAPTER, "c1"), "approx") != etag
+
+
+def test_analytics_rebuilt_event_bumps_the_epoch(cache):
+    bus = EventBus()
+    bus.subscribe(ANALYTICS_REBUILT, cache.on_analytics_rebuilt)
+    version = cache.version(SCOPE_USER, "u1")
+
+    bus.publish(ANALYTICS_REBUILT)
+
+    assert cache.version(SCOPE_USER, "u1") != version
+
+
+def test_rebuild_publishes_analytics_rebuilt(db, monkeypatch):
+    published = []
+    monkeypatch.setattr(event_bus, "publish", lambda event, **payload: published.append(event))
+
+    attempt_stats.rebuild(db)
+
+    assert published == [ANALYTICS_REBUILT]
+
+
+def test_without_redis_nothing_is_cached():
+    cache = AnalyticsCache(None, ttl=60)
+
+    assert cache.version(SCOPE_CHAPTER, "c1") is None
+    assert cache.etag(SCOPE_CHAPTER, None) is None
+    assert cache.get(SCOPE_CHAPTER, "c1", None) is None
@@ -0,0 +1,55 @@
+"""
+Query-count regression tests for analytics endpoints
+"""
+import uuid
+
+from app.models import Chapter, Quiz, QuizAttempt, UserProgress
+from app.services.analytics_service import analytics_service
+
+
+def _add_chapters(db, user_id, count):
+    for i in range(count):
+        chapter = Chapter(gemini_file_id=f"files/{uuid.uuid4()}", title=f"Chapter {i}")
+        db.add(chapter)
+        db.flush()
+        quiz = Quiz(chapter_id=chapter.id, difficulty="easy", questions=[])
+        db.add(quiz)
+        db.flush()
+        db.add(UserProgress(user_id=user_id, chapter_id=chapter.id, time_spent=60, scroll_progress=50))
+        db.add_all(
+            QuizAttempt(user_id=user_id, quiz_id=quiz.id, answers={}, scores={}, total_score=score)
+            for score in (40, 80)
+        )
+    db.commit()
+
+
+def _performance_queries(db, query_counter, user_id):
+    db.expire_all()
+    query_counter.count = 0
+    performance = analytics_service.get_user_performance(db, user_id)
+    return query_counter.count, performance
+
+
+def test_user_performance_query_count_is_independent_of_chapters(db, query_counter):
+    one, many = uuid.uuid4(), uuid.uuid4()
+    _add_chapters(db, one, 1)
+    _add_chapters(db, many, 8)
+
+    queries_one, performance_one = _performance_queries(db, query_counter, one)
+    queries_many, performance_many = _performance_queries(db, query_counter, many)
+
+    assert len(performance_one["chapter_progress"]) == 1
+    assert len(performance_many["chapter_progress"]) == 8
+    assert queries_many == queries_one
+
+
+def test_chapter_progress_details_aggregates_attempts_per_chapter(db):
+    user_id = uuid.uuid4()
+    _add_chapters(db, user_id, 2)
+
+    performance = analytics_service.get_user_performance(db, user_id)
+
+    assert performance["total_quiz_attempts"] == 4
+    for chapter in performance["chapter_progress"]:
+        assert chapter["quiz_attempts"] == 2
+        assert chapter["avg_quiz_score"] == 60.0
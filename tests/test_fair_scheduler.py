@@ -0,0 +1,102 @@
+"""
+Tests for the fair grading-call scheduler
+"""
+import asyncio
+
+import pytest
+
+from app.utils.fair_scheduler import FairScheduler, PRIORITY_INTERACTIVE, PRIORITY_REGRADE
+
+
+async def _run_queued(scheduler, requests, hold=0.0):
+    """
+    Occupy the only slot, queue `requests` (owner, priority) in order,
+    optionally wait `hold` seconds, then release; returns the order they ran in
+    """
+    order = []
+    release = asyncio.Event()
+
+    async def blocker():
+        async with scheduler.slot():
+            await release.wait()
+
+    async def request(owner, priority):
+        with scheduler.context(owner, priority):
+            async with scheduler.slot():
+                order.append(owner)
+
+    blocking = asyncio.create_task(blocker())
+    await asyncio.sleep(0)
+    tasks = []
+    for owner, priority in requests:
+        tasks.append(asyncio.create_task(request(owner, priority)))
+        await asyncio.sleep(0)
+
+    await asyncio.sleep(hold)
+    release.set()
+    await asyncio.gather(blocking, *tasks)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_interactive_lane_runs_before_regrade():
+    scheduler = FairScheduler(max_concurrent=1, max_wait=60.0)
+
+    order = await _run_queued(scheduler, [
+        ("regrade", PRIORITY_REGRADE),
+        ("user", PRIORITY_INTERACTIVE),
+    ])
+
+    assert order == ["user", "regrade"]
+
+
+@pytest.mark.asyncio
+async def test_aged_request_is_served_regardless_of_lane():
+    scheduler = FairScheduler(max_concurrent=1, max_wait=0.05)
+
+    order = await _run_queued(scheduler, [
+        ("regrade", PRIORITY_REGRADE),
+        ("user", PRIORITY_INTERACTIVE),
+    ], hold=0.1)
+
+    assert order == ["regrade", "user"]
+
+
+@pytest.mark.asyncio
+async def test_owners_interleave_within_a_lane():
+    scheduler = FairScheduler(max_concurrent=1, max_wait=60.0)
+
+    order = await _run_queued(scheduler, [
+        ("heavy", PRIORITY_INTERACTIVE),
+        ("heavy", PRIORITY_INTERACTIVE),
+        ("heavy", PRIORITY_INTERACTIVE),
+        ("light", PRIORITY_INTERACTIVE),
+    ])
+
+    assert order.index("light") == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    scheduler = FairScheduler(max_concurrent=1, max_wait=60.0)
+    release = asyncio.Event()
+
+    async def holder():
+        async with scheduler.slot():
+            await release.wait()
+
+    async def waiter():
+        async with scheduler.slot():
+            pass
+
+    holding = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    cancelled = asyncio.create_task(waiter())
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    release.set()
+    await holding
+    await asyncio.gather(cancelled, return_exceptions=True)
+
+    assert scheduler._in_flight == 0
+    await asyncio.wait_for(waiter(), timeout=1)
@@ -0,0 +1,83 @@
+"""
+Tests for streamed quiz generation
+"""
+import json
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from app.services.gemini_service import gemini_service
+
+QUESTIONS = [
+    {"q_id": "q1", "type": "mcq", "question": "Q1", "options": ["a", "b"], "correct_answer": 0},
+    {"q_id": "q2", "type": "mcq", "question": "Q2", "options": ["a", "b"], "correct_answer": 1},
+]
+
+
+class _Chunk:
+    def __init__(self, text=None):
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            # What the SDK does for chunks without text parts
+            raise ValueError("The `response.text` quick accessor requires a valid `Part`")
+        return self._text
+
+
+class _Stream:
+    def __init__(self, chunks, error=None):
+        self.chunks, self.error = chunks, error
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+        if self.error:
+            raise self.error
+
+
+@pytest.fixture
+def model(monkeypatch):
+    streams = []
+
+    async def generate_content_async(contents, stream=False):
+        return streams.pop(0)
+
+    monkeypatch.setattr(gemini_service.file_cache, "get", lambda file_id: file_id)
+    monkeypatch.setattr(gemini_service.model, "generate_content_async", generate_content_async, raising=False)
+    return streams
+
+
+async def _collect():
+    return [q async for q in gemini_service.stream_quiz_questions(
+        gemini_file_id="files/x", chapter_title="Optics", topics=[], difficulty="easy",
+        num_mcq=2, num_short=0, num_numerical=0,
+    )]
+
+
+@pytest.mark.asyncio
+async def test_chunks_without_text_are_skipped(model):
+    payload = json.dumps(QUESTIONS)
+    model.append(_Stream([_Chunk(payload[:10]), _Chunk(), _Chunk(payload[10:]), _Chunk()]))
+
+    assert await _collect() == QUESTIONS
+
+
+@pytest.mark.asyncio
+async def test_failure_before_any_question_falls_back(model):
+    model.append(_Stream([_Chunk("[")], error=RuntimeError("blocked")))
+
+    questions = await _collect()
+    assert len(questions) == 2
+    assert all(q.get("fallback") for q in questions)
+
+
+@pytest.mark.asyncio
+async def test_failure_after_a_question_is_raised(model):
+    payload = json.dumps(QUESTIONS)
+    model.append(_Stream([_Chunk(payload[:payload.index("}") + 2])], error=RuntimeError("reset")))
+
+    with pytest.raises(RuntimeError):
+        await _collect()
@@ -0,0 +1,102 @@
+"""
+Tests for the grading result cache
+"""
+import pytest
+
+from app.utils import grading_cache as grading_cache_module
+from app.utils.grading_cache import GradingCache
+from app.utils.metrics import Metrics
+
+QUESTION = "Why does a convex lens converge light?"
+KEY = "Refraction bends rays towards the axis"
+
+
+class FakeRedis:
+    """The subset of redis-py GradingCache uses"""
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(grading_cache_module, "metrics", metrics)
+    return lambda: metrics.snapshot()["counters"]
+
+
+@pytest.mark.parametrize("variant", [
+    "Refraction bends the rays",
+    "  refraction   BENDS the rays. ",
+    "Refraction, bends the rays!",
+])
+def test_trivially_different_answers_share_a_key(variant):
+    cache = GradingCache(redis_client=None, max_local=10, ttl=60)
+
+    assert cache.make_key(QUESTION, KEY, variant) == cache.make_key(QUESTION, KEY, "refraction bends the rays")
+
+
+@pytest.mark.parametrize("first, second", [
+    ("0.5 m", "05 m"),
+    ("x = -2", "x = 2"),
+    ("the rays bend", "the rays don't bend"),
+])
+def test_meaningful_differences_keep_separate_keys(first, second):
+    cache = GradingCache(redis_client=None, max_local=10, ttl=60)
+
+    assert cache.make_key(QUESTION, KEY, first) != cache.make_key(QUESTION, KEY, second)
+
+
+def test_key_depends_on_question_and_answer_key():
+    cache = GradingCache(redis_client=None, max_local=10, ttl=60)
+    key = cache.make_key(QUESTION, KEY, "refraction")
+
+    assert cache.make_key("Why does a concave lens diverge light?", KEY, "refraction") != key
+    assert cache.make_key(QUESTION, "Reflection", "refraction") != key
+
+
+def test_hits_and_misses_are_counted(counters):
+    cache = GradingCache(redis_client=None, max_local=10, ttl=60)
+    key = cache.make_key(QUESTION, KEY, "refraction")
+
+    assert cache.get(key) is None
+    cache.set(key, 0.8, "Mostly right")
+    assert cache.get(key) == (0.8, "Mostly right")
+
+    assert counters()["grading_cache_misses"] == 1
+    assert counters()["grading_cache_hits"] == 1
+    assert counters()["grading_cache_local_hits"] == 1
+
+
+def test_redis_hit_is_shared_across_workers(counters):
+    redis = FakeRedis()
+    writer = GradingCache(redis_client=redis, max_local=10, ttl=60)
+    reader = GradingCache(redis_client=redis, max_local=10, ttl=60)
+    key = writer.make_key(QUESTION, KEY, "refraction")
+
+    writer.set(key, 1.0, "Correct")
+
+    assert reader.get(key) == (1.0, "Correct")
+    assert reader.get(key) == (1.0, "Correct")
+    assert counters()["grading_cache_redis_hits"] == 1
+    assert counters()["grading_cache_local_hits"] == 1
+    assert "grading_cache_misses" not in counters()
+
+
+def test_local_entries_are_evicted_least_recently_used_first():
+    cache = GradingCache(redis_client=None, max_local=2, ttl=60)
+    first, second, third = (cache.make_key(QUESTION, KEY, answer) for answer in ("a", "b", "c"))
+
+    cache.set(first, 0.1, "")
+    cache.set(second, 0.2, "")
+    cache.get(first)
+    cache.set(third, 0.3, "")
+
+    assert cache.get(second) is None
+    assert cache.get(first) == (0.1, "")
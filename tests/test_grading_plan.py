@@ -0,0 +1,85 @@
+"""
+Tests for compiled grading plans and their cache
+"""
+import uuid
+
+import pytest
+
+from app.services import grading_plan as grading_plan_module
+from app.services.grading_plan import GradingPlanCache
+from app.utils.metrics import Metrics
+
+
+def _questions(correct_answer):
+    return [
+        {"q_id": "q1", "type": "mcq", "topic": "lenses", "question": "A convex lens is",
+         "options": ["converging", "diverging"], "correct_answer": correct_answer, "points": 1.0},
+        {"q_id": "q2", "type": "numerical", "topic": "lenses", "question": "Power of a 0.5 m lens?",
+         "correct_answer": "2 D", "points": 2.0},
+    ]
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(grading_plan_module, "metrics", metrics)
+    return lambda: metrics.snapshot()["counters"]
+
+
+def test_plan_is_reused_while_key_version_is_unchanged(counters):
+    plans = GradingPlanCache(max_size=10)
+    quiz_id = uuid.uuid4()
+
+    first = plans.get(quiz_id, _questions(0), 1)
+    second = plans.get(quiz_id, _questions(0), 1)
+
+    assert second is first
+    assert (first.total_points, first.questions[0].mcq_text) == (3.0, "converging")
+    assert counters()["grading_plan_cache_hits"] == 1
+    assert counters()["grading_plan_cache_misses"] == 1
+
+
+def test_bumped_key_version_recompiles_the_plan(counters):
+    plans = GradingPlanCache(max_size=10)
+    quiz_id = uuid.uuid4()
+    stale = plans.get(quiz_id, _questions(0), 1)
+
+    patched = plans.get(quiz_id, _questions(1), 2)
+
+    assert patched is not stale
+    assert (patched.version, patched.questions[0].mcq_index, patched.questions[0].mcq_text) == (2, 1, "diverging")
+    assert plans.get(quiz_id, _questions(1), 2) is patched
+    assert counters()["grading_plan_cache_misses"] == 2
+
+
+def test_plan_from_another_version_is_never_served(counters):
+    plans = GradingPlanCache(max_size=10)
+    quiz_id = uuid.uuid4()
+    plans.get(quiz_id, _questions(1), 2)
+
+    # A worker still holding the quiz row from before the patch
+    assert plans.get(quiz_id, _questions(0), 1).questions[0].mcq_index == 0
+    assert "grading_plan_cache_hits" not in counters()
+
+
+def test_invalidate_drops_the_plan():
+    plans = GradingPlanCache(max_size=10)
+    quiz_id = uuid.uuid4()
+    plan = plans.get(quiz_id, _questions(0), 1)
+
+    plans.invalidate(quiz_id)
+
+    assert plans.get(quiz_id, _questions(0), 1) is not plan
+
+
+def test_least_recently_used_plan_is_evicted():
+    plans = GradingPlanCache(max_size=2)
+    first, second, third = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    kept = plans.get(first, _questions(0), 1)
+    evicted = plans.get(second, _questions(0), 1)
+    plans.get(first, _questions(0), 1)
+
+    plans.get(third, _questions(0), 1)
+
+    assert plans.get(first, _questions(0), 1) is kept
+    assert plans.get(second, _questions(0), 1) is not evicted
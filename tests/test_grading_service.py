@@ -0,0 +1,125 @@
+"""
+Tests for model grading: batch calls and their per-item fallbacks
+"""
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from app.config import settings
+from app.services.gemini_service import gemini_service
+from app.services.grading_plan import GradingPlan
+from app.services.grading_service import grading_service
+
+BATCH_ITEMS = [
+    {"q_id": q_id, "question": f"Explain {q_id}", "correct_answer": "ref", "user_answer": "ans",
+     "question_type": "short", "topic": "optics"}
+    for q_id in ("q1", "q2", "q3", "q4")
+]
+
+
+def _short_questions(count):
+    return [
+        {"q_id": f"q{i + 1}", "type": "short", "topic": "optics", "points": 1.0,
+         "question": f"Explain phenomenon {i + 1}", "correct_answer": f"Reference explanation {i + 1}"}
+        for i in range(count)
+    ]
+
+
+def _unseen_answers(questions):
+    # Unique per test run, so the in-process grading cache never answers
+    return {q["q_id"]: f"partial thoughts {uuid.uuid4().hex}" for q in questions}
+
+
+@pytest.fixture
+def model_calls(monkeypatch):
+    """Record individual model grading calls; each question gets a distinct score"""
+    calls = []
+
+    async def grade_answer_async(**kwargs):
+        calls.append(kwargs["question"])
+        return float(kwargs["question"].split()[-1]) / 10, "graded individually"
+
+    monkeypatch.setattr(settings, "LEXICAL_PREGRADE_ENABLED", False)
+    monkeypatch.setattr(gemini_service, "grade_answer_async", grade_answer_async)
+    return calls
+
+
+def test_batch_response_keeps_only_well_formed_entries(monkeypatch):
+    response = [
+        {"q_id": "q1", "score": 0.8, "feedback": "fine"},
+        {"score": 1.0, "feedback": "no q_id"},
+        {"q_id": "q2", "score": "high"},
+        {"q_id": "q9", "score": 1.0},
+        5,
+        {"q_id": "q4", "score": 1.7},
+    ]
+    monkeypatch.setattr(gemini_service, "file_cache", SimpleNamespace(get=lambda file_id: file_id))
+    monkeypatch.setattr(gemini_service.model, "generate_content",
+                        lambda contents: SimpleNamespace(text=json.dumps(response)), raising=False)
+
+    results = gemini_service.grade_answers_batch("files/x", BATCH_ITEMS)
+
+    assert results == {"q1": (0.8, "fine"), "q4": (1.0, "No feedback provided")}
+
+
+@pytest.mark.asyncio
+async def test_items_missing_from_the_batch_are_graded_individually(monkeypatch, model_calls):
+    questions = _short_questions(3)
+
+    async def grade_answers_batch_async(gemini_file_id, items):
+        return {"q2": (0.5, "graded in batch")}
+
+    monkeypatch.setattr(gemini_service, "grade_answers_batch_async", grade_answers_batch_async)
+    _, breakdown, _, _ = await grading_service.grade_quiz(
+        questions, _unseen_answers(questions), "files/x", GradingPlan(None, questions)
+    )
+
+    assert sorted(model_calls) == ["Explain phenomenon 1", "Explain phenomenon 3"]
+    assert [item["feedback"] for item in breakdown] == [
+        "graded individually", "graded in batch", "graded individually"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_call_falls_back_for_every_item(monkeypatch, model_calls):
+    questions = _short_questions(3)
+
+    async def grade_answers_batch_async(gemini_file_id, items):
+        raise ValueError("Batch grading response is not a list")
+
+    monkeypatch.setattr(gemini_service, "grade_answers_batch_async", grade_answers_batch_async)
+    total, _, _, _ = await grading_service.grade_quiz(
+        questions, _unseen_answers(questions), "files/x", GradingPlan(None, questions)
+    )
+
+    assert len(model_calls) == 3
+    assert total == pytest.approx(0.6)
+
+
+@pytest.mark.asyncio
+async def test_breakdown_keeps_question_order_under_concurrent_grading(monkeypatch):
+    questions = _short_questions(4)
+    finished = []
+
+    async def grade_answer_async(**kwargs):
+        n = int(kwargs["question"].split()[-1])
+        # Earlier questions take longer, so grades complete in reverse order
+        await asyncio.sleep(0.01 * (5 - n))
+        finished.append(n)
+        return n / 10, f"graded {n}"
+
+    monkeypatch.setattr(settings, "LEXICAL_PREGRADE_ENABLED", False)
+    monkeypatch.setattr(settings, "GRADING_BATCH_ENABLED", False)
+    monkeypatch.setattr(gemini_service, "grade_answer_async", grade_answer_async)
+    _, breakdown, _, _ = await grading_service.grade_quiz(
+        questions, _unseen_answers(questions), "files/x", GradingPlan(None, questions)
+    )
+
+    assert finished == [4, 3, 2, 1]
+    assert [item["q_id"] for item in breakdown] == ["q1", "q2", "q3", "q4"]
+    assert [item["feedback"] for item in breakdown] == ["graded 1", "graded 2", "graded 3", "graded 4"]
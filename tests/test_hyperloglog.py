@@ -0,0 +1,82 @@
+"""
+Tests for HyperLogLog sketches
+"""
+import uuid
+
+import pytest
+
+from app.utils.hyperloglog import DEFAULT_PRECISION, HyperLogLog, relative_error
+
+
+def _sketch(values, precision=DEFAULT_PRECISION):
+    sketch = HyperLogLog(precision)
+    sketch.update(values)
+    return sketch
+
+
+def test_documented_error_bound():
+    assert relative_error() == pytest.approx(0.0081, abs=1e-4)
+
+
+@pytest.mark.parametrize("cardinality", [1_000, 20_000, 100_000])
+def test_estimates_within_three_standard_errors(cardinality):
+    values = [uuid.UUID(int=i) for i in range(cardinality)]
+    estimate = _sketch(values).count()
+
+    assert abs(estimate - cardinality) / cardinality < 3 * relative_error()
+
+
+def test_small_cardinalities_are_near_exact():
+    for cardinality in (0, 1, 10, 100):
+        assert _sketch(range(cardinality)).count() == cardinality
+
+
+def test_duplicates_do_not_change_the_sketch():
+    sketch = _sketch(range(500))
+
+    assert sketch.update(range(500)) is False
+    assert sketch.add(499) is False
+    assert sketch.count() == _sketch(range(500)).count()
+
+
+def test_merge_equals_sketch_of_the_union():
+    left, right = _sketch(range(0, 6000)), _sketch(range(4000, 10000))
+
+    assert left.merge(right) is True
+    assert left.registers == _sketch(range(10000)).registers
+    assert left.merge(right) is False
+
+
+def test_merge_rejects_other_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(14))
+
+
+def test_round_trip_through_bytes():
+    sketch = _sketch(str(uuid.uuid4()) for _ in range(5000))
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+
+    assert restored.precision == sketch.precision
+    assert restored.registers == sketch.registers
+    assert restored.count() == sketch.count()
+
+
+def test_sparse_sketches_encode_small():
+    assert len(_sketch(range(50)).to_bytes()) < 1024
+
+
+def test_from_bytes_rejects_bad_encodings():
+    encoded = _sketch(range(10)).to_bytes()
+    for data in (b"", b"\x02" + encoded[1:], encoded[:2] + b"\x78\x9c" + b"\x00" * 4):
+        with pytest.raises(ValueError):
+            HyperLogLog.from_bytes(data)
+
+
+def test_union_skips_missing_sketches():
+    encoded = [None, b"", _sketch(range(100)).to_bytes(), _sketch(range(50, 150)).to_bytes()]
+    assert HyperLogLog.union(encoded).count() == 150
+
+
+def test_values_hash_by_string_form():
+    user_id = uuid.uuid4()
+    assert _sketch([user_id]).registers == _sketch([str(user_id)]).registers
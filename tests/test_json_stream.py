@@ -0,0 +1,61 @@
+"""
+Tests for the streamed JSON array parser
+"""
+import json
+
+import pytest
+
+from app.utils.json_stream import JsonArrayStreamParser
+
+ITEMS = [
+    {"q_id": "q1", "question": "What is {x} in \"braces\" [and brackets]?", "options": ["a", "b]"]},
+    {"q_id": "q2", "question": "Escaped \\\" quote and backslash \\\\", "meta": {"nested": [1, {"deep": True}]}},
+    {"q_id": "q3", "question": "Unicode: π ≈ 3.14"},
+]
+PAYLOAD = "```json\n" + json.dumps(ITEMS, ensure_ascii=False, indent=2) + "\n```"
+
+
+def _feed_in_chunks(text, size):
+    parser = JsonArrayStreamParser()
+    emitted = []
+    for start in range(0, len(text), size):
+        emitted.extend(parser.feed(text[start:start + size]))
+    return parser, emitted
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(PAYLOAD)])
+def test_split_chunks_yield_every_object_once(size):
+    parser, emitted = _feed_in_chunks(PAYLOAD, size)
+
+    assert emitted == ITEMS
+    assert parser.done
+
+
+def test_objects_are_emitted_as_soon_as_they_close():
+    parser = JsonArrayStreamParser()
+    text = json.dumps(ITEMS)
+    first_end = text.index("}, {") + 1
+
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end]) == [ITEMS[0]]
+    assert parser.feed(text[first_end:]) == ITEMS[1:]
+
+
+def test_escape_split_across_chunks():
+    parser = JsonArrayStreamParser()
+    text = '[{"a": "x\\"}"}]'
+    split = text.index("\\") + 1
+
+    assert parser.feed(text[:split]) == []
+    assert parser.feed(text[split:]) == [{"a": 'x"}'}]
+
+
+def test_malformed_element_is_skipped():
+    parser = JsonArrayStreamParser()
+    assert parser.feed('[{"a": 1}, {"b": tru}, {"c": 3}]') == [{"a": 1}, {"c": 3}]
+
+
+def test_text_after_the_array_is_ignored():
+    parser = JsonArrayStreamParser()
+    assert parser.feed('[{"a": 1}] trailing {"b": 2}') == [{"a": 1}]
+    assert parser.feed('[{"c": 3}]') == []
@@ -0,0 +1,106 @@
+"""
+Tests for the lexical short-answer pre-grader
+"""
+import pytest
+
+from app.services.lexical_grader import LexicalGrader, _analyze_reference
+
+REFERENCE = "Light bends when it passes from one medium to another because its speed changes"
+QUESTION = {"question": "Why does light refract?", "correct_answer": REFERENCE}
+EARTH = "The Earth revolves around the Sun; the Earth rotates on its axis"
+
+
+@pytest.fixture
+def grader():
+    return LexicalGrader(accept_threshold=0.9, reject_threshold=0.05)
+
+
+def test_idf_weights_shared_terms_below_distinguishing_ones():
+    points, weights = _analyze_reference(EARTH)
+
+    assert len(points) == 2
+    assert weights["earth"] < weights["revolv"]
+    assert weights["revolv"] == pytest.approx(weights["axis"])
+
+
+def test_coverage_follows_idf_weights(grader):
+    # The term every key point shares is worth little on its own
+    assert grader.score(EARTH, "earth") < 0.15
+    assert grader.score(EARTH, "revolves sun rotates axis") > 0.7
+
+
+def test_reference_without_content_words_is_unscored(grader):
+    assert grader.score("It is the", "anything") is None
+
+
+def test_fuzzy_matching_tolerates_typos_in_long_words(grader):
+    assert grader._matches("speed", {"speeed"})
+    assert grader._matches("because", {"becuase"})
+    assert grader._matches("medium", {"medium"})
+    # Short words must match exactly
+    assert not grader._matches("mass", {"mars"})
+    # Length difference above 2 never matches
+    assert not grader._matches("speed", {"speedometer"})
+
+
+def test_accepts_answers_at_or_above_the_accept_threshold(grader):
+    answer = "light bends when passing from one medium to another because its speed changes"
+    score, _, is_correct = grader.grade(QUESTION, answer)
+
+    assert grader.score(REFERENCE, answer) >= 0.9
+    assert (score, is_correct) == (1.0, True)
+
+
+def test_accepts_near_verbatim_answers_with_typos(grader):
+    answer = "Light bends when it passes from one medium to another becuase its speeed changes"
+    assert grader.grade(QUESTION, answer)[2] is True
+
+
+def test_rejects_off_topic_answers(grader):
+    for answer in ("idk", "The mitochondria is the powerhouse of the cell"):
+        score, _, is_correct = grader.grade(QUESTION, answer)
+        assert (score, is_correct) == (0.0, False)
+
+
+def test_partial_answers_go_to_the_model(grader):
+    assert grader.grade(QUESTION, "light bends") is None
+    assert grader.grade(QUESTION, "Ligth bends because it's speed changs between mediums") is None
+
+
+def test_low_coverage_on_topic_answers_are_not_rejected():
+    # Coverage below the reject threshold, but the answer talks about the question
+    grader = LexicalGrader(accept_threshold=0.9, reject_threshold=0.3)
+    assert grader.grade(QUESTION, "refract") is None
+
+
+MIRROR = {"question": "What happens to light hitting a mirror?", "correct_answer": "The light is reflected back by the mirror"}
+
+
+def test_negated_answers_go_to_the_model(grader):
+    for answer in (
+        "The light is not reflected back by the mirror",
+        "The light isn't reflected back by the mirror",
+        "light is absorbed by the mirror, not reflected back",
+        "The light is never reflected back by the mirror",
+    ):
+        assert grader.grade(MIRROR, answer) is None, answer
+
+
+def test_dropping_a_negation_of_the_reference_goes_to_the_model(grader):
+    question = {"question": "Does oil mix with water?", "correct_answer": "Oil does not dissolve in water because it is nonpolar"}
+    assert grader.grade(question, "Oil does dissolve in water because it is nonpolar") is None
+    assert grader.grade(question, "Oil does not dissolve in water because it is nonpolar")[2] is True
+
+
+def test_keyword_stuffed_answers_go_to_the_model(grader):
+    for answer in (
+        "mirror light reflected back",
+        "light reflected back mirror absorbed refracted transmitted",
+        "The light is reflected back by the mirror and also refracted and absorbed",
+    ):
+        assert grader.score(MIRROR["correct_answer"], answer) == pytest.approx(1.0)
+        assert grader.grade(MIRROR, answer) is None, answer
+
+
+def test_verbatim_answer_with_other_stopwords_is_accepted(grader):
+    assert grader.grade(MIRROR, "the light was reflected back by a mirror")[2] is True
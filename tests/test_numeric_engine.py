@@ -0,0 +1,91 @@
+"""
+Tests for the local numeric answer engine
+"""
+import math
+
+import pytest
+
+from app.services.numeric_engine import numeric_engine
+
+
+def _value(raw):
+    quantity = numeric_engine.parse(raw)
+    assert quantity is not None, raw
+    return quantity.value
+
+
+def _compare(target, answer, rel_tol=0.02, min_sig_figs=3):
+    return numeric_engine.compare(
+        numeric_engine.parse(target), numeric_engine.parse(answer),
+        rel_tol=rel_tol, abs_tol=1e-9, min_sig_figs=min_sig_figs
+    )[0]
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("1,250", 1250.0),  # Thousands separator
+    ("1,250,000", 1250000.0),
+    ("1,5", 1.5),  # Decimal comma
+    ("3.2 x 10^4", 32000.0),
+    ("3.2×10⁴", 32000.0),
+    ("3.2e4", 32000.0),
+    ("2√3", 2 * math.sqrt(3)),
+    ("√2", math.sqrt(2)),
+    ("sqrt(2)/2", math.sqrt(2) / 2),
+    ("2π", 2 * math.pi),
+    ("1/3", 1 / 3),
+    ("1 1/2", 1.5),
+    ("-0.5", -0.5),
+    (7, 7.0),
+])
+def test_parses_numeric_notations(raw, expected):
+    assert _value(raw) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("raw, value, dimension", [
+    ("12 cm", 0.12, "length"),
+    ("0.12 m", 0.12, "length"),
+    ("5 min", 300.0, "time"),
+    ("36 km/h", 10.0, "speed"),
+    ("45%", 0.45, "ratio"),
+])
+def test_converts_units_to_si(raw, value, dimension):
+    quantity = numeric_engine.parse(raw)
+    assert quantity.value == pytest.approx(value)
+    assert quantity.dimension == dimension
+
+
+@pytest.mark.parametrize("raw", [
+    None, True, "", "abc", "__import__('os')", "(1).__class__", "9**9**9", "1/0", "x" * 200,
+])
+def test_rejects_non_numbers_and_unsafe_input(raw):
+    assert numeric_engine.parse(raw) is None
+
+
+@pytest.mark.parametrize("raw, sig_figs", [
+    ("3.14", 3), ("0.0120", 3), ("1200", 2), ("1,5", 2), ("3.2 x 10^4", None),
+])
+def test_sig_figs_of_plain_literals(raw, sig_figs):
+    assert numeric_engine.parse(raw).sig_figs == sig_figs
+
+
+def test_accepts_within_relative_tolerance():
+    assert _compare("100", "101.5") is True
+    assert _compare("100", "103") is False
+
+
+def test_accepts_correctly_rounded_answers_with_enough_sig_figs():
+    # Outside a tight tolerance, but 3.14 is pi to 3 significant figures
+    assert _compare("3.14159265", "3.14", rel_tol=1e-4) is True
+    assert _compare("3.14159265", "3.142", rel_tol=1e-4) is True
+    # Wrongly rounded, or too few significant figures
+    assert _compare("3.14159265", "3.15", rel_tol=1e-4) is False
+    assert _compare("3.14159265", "3.1", rel_tol=1e-4) is False
+
+
+def test_compares_across_units_of_one_dimension():
+    assert _compare("1.2 m", "120 cm") is True
+
+
+def test_unit_mismatch_is_ambiguous():
+    assert _compare("1.2 m", "1.2 kg") is None
+    assert _compare("12", "12 cm") is None
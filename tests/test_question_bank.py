@@ -0,0 +1,113 @@
+"""
+Tests for sampling quizzes from the question bank
+"""
+import uuid
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from app.models import Chapter
+from app.services.question_bank_service import question_bank_service
+
+
+def _question(q_type, topic, n):
+    return {"type": q_type, "topic": topic, "question": f"{topic} {q_type} question {n}", "points": 1.0}
+
+
+@pytest.fixture
+def chapter(db):
+    chapter = Chapter(gemini_file_id=f"files/{uuid.uuid4()}", title="Optics")
+    db.add(chapter)
+    db.flush()
+    questions = [_question("mcq", topic, n) for topic in ("lenses", "mirrors", "prisms") for n in range(6)]
+    questions += [_question("short", "lenses", n) for n in range(2)]
+    question_bank_service.add_questions(db, chapter.id, "easy", questions)
+    question_bank_service.add_questions(db, chapter.id, "hard", [_question("numerical", "waves", 0)])
+    db.commit()
+    return chapter
+
+
+def test_sample_spreads_picks_across_topics(db, chapter):
+    picked, shortfall, used_hashes = question_bank_service._sample_from_bank(
+        db, chapter.id, "easy", {"mcq": 6, "short": 0, "numerical": 0}
+    )
+
+    assert Counter(q["topic"] for q in picked["mcq"]) == {"lenses": 2, "mirrors": 2, "prisms": 2}
+    assert shortfall == {"mcq": 0, "short": 0, "numerical": 0}
+    assert used_hashes == {question_bank_service.content_hash(q) for q in picked["mcq"]}
+
+
+def test_sample_reports_shortfall_per_type(db, chapter):
+    picked, shortfall, _ = question_bank_service._sample_from_bank(
+        db, chapter.id, "easy", {"mcq": 2, "short": 5, "numerical": 1}
+    )
+
+    assert [len(picked[t]) for t in ("mcq", "short", "numerical")] == [2, 2, 0]
+    assert shortfall == {"mcq": 0, "short": 3, "numerical": 1}
+
+
+def test_covered_topics_per_difficulty(db, chapter):
+    assert question_bank_service.covered_topics(db, chapter.id, "easy") == {"lenses", "mirrors", "prisms"}
+    assert question_bank_service.covered_topics(db, chapter.id, "hard") == {"waves"}
+
+
+@pytest.mark.asyncio
+async def test_top_up_skips_questions_already_drawn_from_the_bank(db, chapter, monkeypatch):
+    from app.services import question_bank_service as module
+
+    async def generate(**kwargs):
+        # One repeat of a banked short question, then two new ones
+        return [_question("short", "lenses", n) for n in (0, 2, 3)]
+
+    monkeypatch.setattr(module.gemini_service, "generate_quiz_async", generate)
+    questions = await question_bank_service.build_questions(db, chapter, "easy", 0, 4, 0)
+
+    assert [q["q_id"] for q in questions] == ["q1", "q2", "q3", "q4"]
+    assert len({question_bank_service.content_hash(q) for q in questions}) == 4
+
+
+@pytest.mark.asyncio
+async def test_top_up_never_serves_fallback_questions(db, chapter, monkeypatch):
+    from app.services import question_bank_service as module
+
+    batches = [
+        [{**_question("short", "lenses", 9), "fallback": True}],
+        [_question("short", "lenses", 2)],
+    ]
+    calls = []
+
+    async def generate(**kwargs):
+        calls.append(kwargs["num_short"])
+        return batches[len(calls) - 1]
+
+    monkeypatch.setattr(module.gemini_service, "generate_quiz_async", generate)
+    questions = await question_bank_service.build_questions(db, chapter, "easy", 0, 3, 0)
+
+    assert calls == [1, 1]
+    assert len(questions) == 3
+    assert not any(q.get("fallback") for q in questions)
+
+
+@pytest.mark.asyncio
+async def test_top_up_fails_when_generation_keeps_falling_back(db, chapter, monkeypatch):
+    from app.services import question_bank_service as module
+
+    async def generate(**kwargs):
+        return [{**_question("short", "lenses", 9), "fallback": True}]
+
+    monkeypatch.setattr(module.gemini_service, "generate_quiz_async", generate)
+    with pytest.raises(RuntimeError):
+        await question_bank_service.build_questions(db, chapter, "easy", 0, 3, 0)
+
+
+def test_same_question_is_banked_per_difficulty(db, chapter):
+    question_bank_service.add_questions(db, chapter.id, "hard", [_question("mcq", "lenses", 0)])
+    db.commit()
+
+    picked, shortfall, _ = question_bank_service._sample_from_bank(
+        db, chapter.id, "hard", {"mcq": 1, "short": 0, "numerical": 0}
+    )
+    assert picked["mcq"][0]["question"] == "lenses mcq question 0"
+    assert shortfall["mcq"] == 0
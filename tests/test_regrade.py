@@ -0,0 +1,151 @@
+"""
+Tests for answer key patches and regrades
+"""
+import uuid
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from app.models import Chapter, Quiz, QuizAttempt, QuestionBankItem
+from app.schemas.quiz import QuizSubmission
+from app.services import regrade_service as regrade_module
+from app.services.grading_plan import grading_plans
+from app.services.grading_service import grading_service
+from app.services.question_bank_service import question_bank_service
+from app.services.regrade_service import regrade_service
+from app.services.submission_service import submission_service
+from app.utils.events import event_bus
+from app.utils.job_queue import job_queue
+
+SHARED = {"type": "mcq", "topic": "lenses", "question": "A convex lens is", "options": ["converging", "diverging"],
+          "correct_answer": 1, "points": 1.0}
+OTHER = {"type": "mcq", "topic": "mirrors", "question": "A plane mirror image is", "options": ["real", "virtual"],
+         "correct_answer": 1, "points": 1.0}
+
+
+@pytest.fixture(autouse=True)
+def quiet(monkeypatch):
+    monkeypatch.setattr(event_bus, "publish", lambda event, **payload: None)
+    monkeypatch.setattr(job_queue, "set_progress", lambda job_id, progress: None)
+
+
+@pytest.fixture
+def quizzes(db):
+    """A larger quiz and a smaller one holding the shared question under another q_id"""
+    chapter = Chapter(gemini_file_id=f"files/{uuid.uuid4()}", title="Optics")
+    db.add(chapter)
+    db.flush()
+    larger = Quiz(chapter_id=chapter.id, difficulty="easy", questions=[
+        {"q_id": "q1", **OTHER}, {"q_id": "q2", **SHARED}
+    ])
+    smaller = Quiz(chapter_id=chapter.id, difficulty="easy", questions=[{"q_id": "q1", **SHARED}])
+    unrelated = Quiz(chapter_id=chapter.id, difficulty="easy", questions=[{"q_id": "q1", **OTHER}])
+    db.add_all([larger, smaller, unrelated])
+    question_bank_service.add_questions(db, chapter.id, "easy", [SHARED, OTHER])
+    db.commit()
+    return larger, smaller, unrelated
+
+
+def _attempt(db, quiz, q_id, answer, status="completed"):
+    attempt = QuizAttempt(user_id=uuid.uuid4(), quiz_id=quiz.id, answers={q_id: answer}, grading_status=status)
+    db.add(attempt)
+    db.commit()
+    return attempt
+
+
+def test_patch_applies_to_every_quiz_sharing_the_question(db, quizzes):
+    larger, smaller, unrelated = quizzes
+
+    key_changed, patched = regrade_service.patch_question(db, larger, "q2", {"correct_answer": 0})
+
+    assert key_changed is True
+    assert patched == {str(larger.id): "q2", str(smaller.id): "q1"}
+    db.expire_all()
+    assert larger.questions[1]["correct_answer"] == 0
+    assert smaller.questions[0]["correct_answer"] == 0
+    assert (larger.key_version, smaller.key_version, unrelated.key_version) == (2, 2, 1)
+    bank = db.query(QuestionBankItem).filter(QuestionBankItem.content_hash == question_bank_service.content_hash(
+        {**SHARED, "correct_answer": 0}
+    )).one()
+    assert bank.question["correct_answer"] == 0
+
+
+@pytest.mark.asyncio
+async def test_regrade_job_covers_every_patched_quiz(db, session_factory, quizzes, monkeypatch):
+    larger, smaller, _ = quizzes
+    for quiz, q_id in ((larger, "q2"), (smaller, "q1")):
+        attempt = _attempt(db, quiz, q_id, 0)
+        plan = grading_plans.get(quiz.id, quiz.questions, quiz.key_version)
+        results = grading_service.grade_objective(plan, attempt.answers)
+        _, attempt.scores, attempt.weak_topics, attempt.feedback = grading_service.summarize(
+            plan, attempt.answers, results
+        )
+    db.commit()
+
+    key_changed, patched = regrade_service.patch_question(db, larger, "q2", {"correct_answer": 0})
+    monkeypatch.setattr(regrade_module, "SessionLocal", session_factory)
+    result = await regrade_service.run_regrade_job("job", {"quizzes": patched, "key_changed": key_changed})
+
+    assert result["attempts_processed"] == 2
+    assert result["attempts_changed"] == 2
+    db.expire_all()
+    assert sorted(float(a.total_score) for a in db.query(QuizAttempt)) == [1.0, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_key_patched_during_deferred_grading_is_applied(db, session_factory, quizzes, monkeypatch):
+    larger, _, _ = quizzes
+    attempt = _attempt(db, larger, "q2", 0, status="pending")
+    chapter = db.get(Chapter, larger.chapter_id)
+    grade_quiz = grading_service.grade_quiz
+    calls = []
+
+    async def grade_then_patch(**kwargs):
+        graded = await grade_quiz(**kwargs)
+        if not calls:
+            # An admin fixes the key while the model call is in flight
+            admin = session_factory()
+            try:
+                regrade_service.patch_question(admin, admin.get(Quiz, larger.id), "q2", {"correct_answer": 0})
+            finally:
+                admin.close()
+        calls.append(kwargs["plan"].version)
+        return graded
+
+    monkeypatch.setattr(grading_service, "grade_quiz", grade_then_patch)
+    await submission_service._complete_attempt(db, attempt, larger, chapter)
+
+    assert calls == [1, 2]
+    db.expire_all()
+    assert attempt.grading_status == "completed"
+    assert float(attempt.total_score) == 1.0
+
+
+@pytest.mark.asyncio
+async def test_key_patched_during_immediate_submit_is_applied(db, session_factory, quizzes, monkeypatch):
+    larger, _, _ = quizzes
+    chapter = db.get(Chapter, larger.chapter_id)
+    grade_quiz = grading_service.grade_quiz
+    calls = []
+
+    async def grade_then_patch(**kwargs):
+        graded = await grade_quiz(**kwargs)
+        if not calls:
+            admin = session_factory()
+            try:
+                regrade_service.patch_question(admin, admin.get(Quiz, larger.id), "q2", {"correct_answer": 0})
+            finally:
+                admin.close()
+        calls.append(kwargs["plan"].version)
+        return graded
+
+    monkeypatch.setattr(grading_service, "grade_quiz", grade_then_patch)
+    result = await submission_service.submit(
+        db, larger, chapter, QuizSubmission(user_id=uuid.uuid4(), answers={"q2": 0})
+    )
+
+    assert calls == [1, 2]
+    assert result["score"] == 1.0
+    db.expire_all()
+    assert float(db.query(QuizAttempt).one().total_score) == 1.0
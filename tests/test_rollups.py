@@ -0,0 +1,168 @@
+"""
+Tests for the incremental analytics rollups
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app.models import Chapter, ChapterRollupHourly, Quiz, QuizAttempt, RollupQueueEntry
+from app.models.chapter_rollup import ALL_TOPICS
+from app.services.analytics_service import analytics_service
+from app.services.attempt_stats_service import BACKFILL_ITEMS_SQL, attempt_stats
+from app.services.rollup_service import RollupService
+from app.utils.hyperloglog import HyperLogLog
+
+HOUR = datetime(2026, 1, 5, 10)
+
+
+@pytest.fixture
+def quiz(db):
+    chapter = Chapter(gemini_file_id=f"files/{uuid.uuid4()}", title="Optics")
+    db.add(chapter)
+    db.flush()
+    quiz = Quiz(chapter_id=chapter.id, difficulty="easy", questions=[])
+    db.add(quiz)
+    db.commit()
+    return quiz
+
+
+@pytest.fixture
+def rollup():
+    return RollupService(interval=0, batch_size=50)
+
+
+def _submit(db, quiz, created_at=None, score=1.0):
+    attempt = QuizAttempt(
+        user_id=uuid.uuid4(),
+        quiz_id=quiz.id,
+        answers={},
+        scores=[{"q_id": "q1", "topic": "refraction", "score": score, "max_score": 1}],
+        total_score=score * 80,
+        created_at=created_at,
+    )
+    db.add(attempt)
+    db.flush()
+    attempt_stats.record_attempt(db, db.merge(quiz), attempt)
+    return attempt
+
+
+def _chapter_row(db, quiz):
+    db.expire_all()
+    return db.query(ChapterRollupHourly).filter(
+        ChapterRollupHourly.chapter_id == quiz.chapter_id,
+        ChapterRollupHourly.bucket == HOUR,
+        ChapterRollupHourly.topic == ALL_TOPICS
+    ).one()
+
+
+def test_rollup_recomputes_queued_hour_and_day(db, quiz, rollup):
+    _submit(db, quiz, HOUR + timedelta(minutes=5), score=0.5)
+    _submit(db, quiz, HOUR + timedelta(minutes=50), score=1.0)
+    db.commit()
+
+    assert rollup.run_once(db) == {"hours": 1, "days": 1}
+
+    row = _chapter_row(db, quiz)
+    assert row.count == 2
+    assert row.sum_score == pytest.approx(120.0)
+    assert HyperLogLog.from_bytes(row.user_sketch).count() == 2
+    assert db.query(RollupQueueEntry).count() == 0
+
+
+def test_write_during_rollup_is_not_lost(session_factory, db, quiz, rollup):
+    # The hour is already queued by an earlier, committed attempt
+    _submit(db, quiz, HOUR + timedelta(minutes=5))
+    db.commit()
+
+    writer = session_factory()
+    roller = session_factory()
+    try:
+        # A second attempt in the same hour, written but not yet committed
+        _submit(writer, quiz, HOUR + timedelta(minutes=10))
+
+        # The rollup runs meanwhile: it must leave the writer's bucket queued
+        # rather than roll the hour up without the uncommitted items
+        roller.execute(text("SET lock_timeout = '5s'"))
+        rollup.run_once(roller)
+        writer.commit()
+
+        rollup.run_once(roller)
+    finally:
+        writer.close()
+        roller.close()
+
+    row = _chapter_row(db, quiz)
+    assert row.count == 2
+    assert HyperLogLog.from_bytes(row.user_sketch).count() == 2
+    assert db.query(RollupQueueEntry).count() == 0
+
+
+def test_windowed_and_all_time_chapter_totals_agree(db, quiz, rollup):
+    _submit(db, quiz, HOUR + timedelta(minutes=5), score=0.5)
+    _submit(db, quiz, HOUR + timedelta(minutes=20), score=1.0)
+    # Deferred attempt still waiting for grading: no items yet
+    db.add(QuizAttempt(
+        user_id=uuid.uuid4(),
+        quiz_id=quiz.id,
+        answers={},
+        scores=[{"q_id": "q1", "topic": "refraction", "pending": True}],
+        grading_status="pending",
+        created_at=HOUR + timedelta(minutes=30),
+    ))
+    db.commit()
+    rollup.run_once(db)
+
+    window = (HOUR - timedelta(days=2), HOUR + timedelta(days=2))
+    for approximate in (False, True):
+        all_time = analytics_service.get_chapter_analytics(db, quiz.chapter_id, approximate=approximate)
+        windowed = analytics_service.get_chapter_analytics(
+            db, quiz.chapter_id, *window, approximate=approximate
+        )
+
+        for field in ("total_attempts", "unique_users", "avg_score"):
+            assert all_time[field] == windowed[field], field
+        assert all_time["total_attempts"] == 2
+        assert all_time["unique_users"] == 2
+
+
+def test_server_time_zone_does_not_shift_buckets(db_engine, db, quiz, rollup):
+    database = db_engine.url.database
+    with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f'ALTER DATABASE "{database}" SET timezone = \'Asia/Kolkata\''))
+    db.commit()
+    db_engine.dispose()  # New connections pick up the server-side default
+    try:
+        # created_at from the NOW() server default
+        _submit(db, quiz)
+        db.commit()
+        rollup.run_once(db)
+
+        now = datetime.utcnow()
+        analytics = analytics_service.get_chapter_analytics(db, quiz.chapter_id, now - timedelta(hours=1))
+        assert analytics["total_attempts"] == 1
+    finally:
+        db.close()
+        with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f'ALTER DATABASE "{database}" RESET timezone'))
+        db_engine.dispose()
+
+
+def test_backfilled_empty_topic_rolls_up_as_general(db, quiz, rollup):
+    attempt = QuizAttempt(
+        user_id=uuid.uuid4(),
+        quiz_id=quiz.id,
+        answers={},
+        scores=[{"q_id": "q1", "topic": "", "score": 1.0, "max_score": 1}],
+        total_score=80,
+        created_at=HOUR + timedelta(minutes=5),
+    )
+    db.add(attempt)
+    db.flush()
+    db.execute(BACKFILL_ITEMS_SQL, {"attempt_ids": [attempt.id]})
+    attempt_stats.rebuild(db)
+
+    assert rollup.run_once(db) == {"hours": 1, "days": 1}
+    topics = {row.topic for row in db.query(ChapterRollupHourly).filter(ChapterRollupHourly.bucket == HOUR)}
+    assert topics == {ALL_TOPICS, "general"}
@@ -0,0 +1,152 @@
+"""
+Tests for single-flight coalescing
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.utils.single_flight import SingleFlight
+
+
+class FakeRedis:
+    """The subset of redis-py SingleFlight uses: SET NX PX and the release script"""
+
+    def __init__(self):
+        self.store = {}
+
+    def _live(self, key):
+        entry = self.store.get(key)
+        if entry and entry[1] <= time.monotonic():
+            del self.store[key]
+            entry = None
+        return entry
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and self._live(key):
+            return None
+        self.store[key] = (value, time.monotonic() + px / 1000)
+        return True
+
+    def get(self, key):
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    def eval(self, script, numkeys, key, token):
+        if self.get(key) == token:
+            del self.store[key]
+            return 1
+        return 0
+
+
+class BrokenRedis:
+    def set(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+
+def _flight(redis_client, lock_ttl=5.0, wait_timeout=2.0):
+    return SingleFlight(redis_client, lock_ttl=lock_ttl, poll_interval=0.01, wait_timeout=wait_timeout)
+
+
+def _counting(result="quiz", delay=0.05, error=None):
+    calls = []
+
+    async def fn():
+        calls.append(time.monotonic())
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return result
+
+    return fn, calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_execution():
+    flight = _flight(FakeRedis())
+    fn, calls = _counting()
+
+    results = await asyncio.gather(*(flight.do("key", fn) for _ in range(10)))
+
+    assert results == ["quiz"] * 10
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_leader_error_reaches_every_caller_and_is_not_cached():
+    redis_client = FakeRedis()
+    flight = _flight(redis_client)
+    failing, failed_calls = _counting(error=RuntimeError("gemini failed"))
+
+    results = await asyncio.gather(*(flight.do("key", failing) for _ in range(5)), return_exceptions=True)
+
+    assert len(failed_calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    # The lock is released and the next caller runs again
+    assert redis_client.store == {}
+    fn, calls = _counting()
+    assert await flight.do("key", fn) == "quiz"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_degrade_to_local_execution():
+    flight = _flight(BrokenRedis())
+    fn, calls = _counting()
+
+    assert await asyncio.gather(flight.do("key", fn), flight.do("key", fn)) == ["quiz", "quiz"]
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_lock_is_taken_over_and_not_released_by_the_old_owner():
+    redis_client = FakeRedis()
+    worker_a = _flight(redis_client, lock_ttl=0.05)
+    worker_b = _flight(redis_client, lock_ttl=5.0)
+    slow, slow_calls = _counting(result="a", delay=0.2)
+    fn, calls = _counting(result="b", delay=0.3)
+
+    task_a = asyncio.create_task(worker_a.do("key", slow))
+    await asyncio.sleep(0.1)  # A's lock has expired, A is still running
+    task_b = asyncio.create_task(worker_b.do("key", fn))
+
+    assert await task_a == "a"
+    # A's release must not delete the lock B now owns
+    assert redis_client.get("lock:singleflight:key") is not None
+    assert await task_b == "b"
+    assert len(slow_calls) == len(calls) == 1
+    assert redis_client.get("lock:singleflight:key") is None
+
+
+@pytest.mark.asyncio
+async def test_waiter_returns_result_published_by_lock_holder():
+    redis_client = FakeRedis()
+    worker_a, worker_b = _flight(redis_client), _flight(redis_client)
+    published = {}
+
+    async def generate():
+        await asyncio.sleep(0.1)
+        published["key"] = "quiz"
+        return "quiz"
+
+    async def lookup():
+        return published.get("key")
+
+    fn, calls = _counting(result="duplicate")
+    task_a = asyncio.create_task(worker_a.do("key", generate, lookup))
+    await asyncio.sleep(0.01)
+
+    assert await worker_b.do("key", fn, lookup) == "quiz"
+    assert await task_a == "quiz"
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_waiter_runs_locally_after_wait_timeout():
+    redis_client = FakeRedis()
+    redis_client.set("lock:singleflight:key", "stuck-owner", nx=True, px=60_000)
+    flight = _flight(redis_client, wait_timeout=0.1)
+    fn, calls = _counting()
+
+    assert await flight.do("key", fn) == "quiz"
+    assert len(calls) == 1
@@ -0,0 +1,149 @@
+"""
+Tests for storing and grading quiz submissions
+"""
+import json
+import uuid
+
+import pytest
+from sqlalchemy import event
+
+pytest.importorskip("google.generativeai")
+
+from app.api import quizzes as quizzes_api
+from app.config import settings
+from app.models import Chapter, Quiz, QuizAttempt
+from app.schemas.quiz import QuizSubmission
+from app.services import submission_service as submission_module
+from app.services.gemini_service import gemini_service
+from app.services.submission_service import submission_service
+from app.utils.events import event_bus
+from app.utils.job_queue import job_queue
+
+QUESTIONS = [
+    {"q_id": "q1", "type": "mcq", "topic": "lenses", "question": "A convex lens is",
+     "options": ["converging", "diverging"], "correct_answer": 0, "points": 1.0},
+    {"q_id": "q2", "type": "short", "topic": "mirrors", "question": "Why is a plane mirror image virtual?",
+     "correct_answer": "Reflected rays only appear to meet behind the mirror", "points": 2.0},
+]
+
+
+@pytest.fixture(autouse=True)
+def quiet(monkeypatch):
+    monkeypatch.setattr(event_bus, "publish", lambda event, **payload: None)
+    monkeypatch.setattr(settings, "LEXICAL_PREGRADE_ENABLED", False)
+
+
+@pytest.fixture
+def model_calls(monkeypatch):
+    """Record individual model grading calls; every answer earns 0.5"""
+    calls = []
+
+    async def grade_answer_async(**kwargs):
+        calls.append(kwargs["user_answer"])
+        return 0.5, "Partly right"
+
+    monkeypatch.setattr(gemini_service, "grade_answer_async", grade_answer_async)
+    return calls
+
+
+@pytest.fixture
+def quiz(db):
+    chapter = Chapter(gemini_file_id=f"files/{uuid.uuid4()}", title="Optics")
+    db.add(chapter)
+    db.flush()
+    quiz = Quiz(chapter_id=chapter.id, difficulty="easy", questions=QUESTIONS)
+    db.add(quiz)
+    db.commit()
+    return quiz
+
+
+def _answer(q2):
+    return QuizSubmission(user_id=uuid.uuid4(), answers={"q1": 0, "q2": q2})
+
+
+@pytest.mark.asyncio
+async def test_deferred_submit_returns_partial_result_then_job_completes_it(
+    db, session_factory, quiz, model_calls, monkeypatch
+):
+    enqueued = []
+    monkeypatch.setattr(job_queue, "redis_client", object())
+    monkeypatch.setattr(job_queue, "enqueue", lambda job_type, payload: enqueued.append(payload) or "job")
+
+    response = await quizzes_api.submit_quiz(
+        quiz.id, _answer(f"Rays seem to come from behind it {uuid.uuid4().hex}"), deferred=True, db=db
+    )
+
+    assert response.status_code == 202
+    body = json.loads(response.body)
+    assert body["grading_status"] == "pending"
+    assert body["score"] == 1.0
+    assert [item.get("pending", False) for item in body["breakdown"]] == [False, True]
+    assert body["status_url"].endswith(f"/attempts/{body['attempt_id']}")
+    assert enqueued == [{"attempt_id": body["attempt_id"]}]
+    assert model_calls == []
+
+    monkeypatch.setattr(submission_module, "SessionLocal", session_factory)
+    result = await submission_service.run_grading_job("job", enqueued[0])
+
+    assert result == {"attempt_id": body["attempt_id"], "grading_status": "completed", "total_score": 2.0}
+    assert len(model_calls) == 1
+    db.expire_all()
+    attempt = db.get(QuizAttempt, uuid.UUID(body["attempt_id"]))
+    assert attempt.grading_status == "completed"
+    assert not any(item.get("pending") for item in attempt.scores)
+    assert attempt.scores[1]["feedback"] == "Partly right"
+
+
+@pytest.mark.asyncio
+async def test_deferred_submit_grades_inline_when_enqueue_fails(db, quiz, model_calls, monkeypatch):
+    def enqueue(job_type, payload):
+        raise RuntimeError("Job queue unavailable (Redis not connected)")
+
+    monkeypatch.setattr(job_queue, "redis_client", object())
+    monkeypatch.setattr(job_queue, "enqueue", enqueue)
+
+    result = await quizzes_api.submit_quiz(
+        quiz.id, _answer(f"Rays seem to come from behind it {uuid.uuid4().hex}"), deferred=True, db=db
+    )
+
+    assert result.grading_status == "completed"
+    assert result.score == 2.0
+    assert len(model_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_submit_grades_identical_answers_once_and_inserts_in_one_statement(
+    db, db_engine, quiz, model_calls, monkeypatch
+):
+    batches = []
+
+    async def grade_answers_batch_async(gemini_file_id, items):
+        batches.append([item["user_answer"] for item in items])
+        return {item["q_id"]: (1.0, "Correct") for item in items}
+
+    inserts = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO quiz_attempts"):
+            inserts.append(statement)
+
+    monkeypatch.setattr(settings, "GRADING_BATCH_ENABLED", True)
+    monkeypatch.setattr(gemini_service, "grade_answers_batch_async", grade_answers_batch_async)
+    event.listen(db_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        run = uuid.uuid4().hex
+        results = await submission_service.submit_bulk(db, quiz, db.get(Chapter, quiz.chapter_id), [
+            _answer(f"Rays meet behind the mirror {run}"),
+            _answer(f"  rays MEET behind the mirror, {run}!"),
+            _answer(f"The image is behind the glass {run}"),
+        ])
+    finally:
+        event.remove(db_engine, "before_cursor_execute", before_cursor_execute)
+
+    assert len(batches) == 1
+    assert sorted(batches[0]) == sorted([f"Rays meet behind the mirror {run}", f"The image is behind the glass {run}"])
+    assert model_calls == []
+    assert [result["score"] for result in results] == [3.0, 3.0, 3.0]
+    assert len(inserts) == 1
+    assert db.query(QuizAttempt).count() == 3
+    assert {attempt.id for attempt in db.query(QuizAttempt)} == {result["attempt_id"] for result in results}